@@ -0,0 +1,4 @@
+"""
+ImaGen - Performance benchmarks
+Run from the repository root, e.g. python -m benchmarks.encode_formats
+"""
@@ -0,0 +1,67 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.generator import ImageGenerator
+
+from .quantization import psnr, ssim
+from .tiny_model import DEFAULT_TINY_MODEL_PATH, build_tiny_pipeline
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+SEED = 1234
+
+
+def parse_ints(value: str):
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DeepCache latency and similarity against the full UNet at high step counts")
+    parser.add_argument("--model", default="local", help="'local' for models/lcm_dreamshaper, 'tiny' for the offline stand-in, or a model_files path")
+    parser.add_argument("--steps", default="8,12,15", help="Comma-separated step counts")
+    parser.add_argument("--intervals", default="2,3,4", help="Comma-separated DeepCache refresh intervals")
+    parser.add_argument("--size", type=int, default=512, help="Square resolution")
+    parser.add_argument("--repeats", type=int, default=2, help="Timed generations per configuration")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    generator = ImageGenerator()
+    if args.model == "tiny":
+        generator.device = "cpu"
+        generator.model_path = build_tiny_pipeline(DEFAULT_TINY_MODEL_PATH)
+    elif args.model != "local":
+        generator.model_path = Path(args.model)
+    if not generator.load_model():
+        raise SystemExit("Failed to load model")
+    generator.deep_cache_min_steps = 0
+
+    def run(steps, interval):
+        generator.deep_cache_interval = interval
+        generator.generate_batch([PROMPT], [SEED], steps, 1.0, args.size, args.size)
+        latencies = []
+        image = None
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            image = generator.generate_batch([PROMPT], [SEED], steps, 1.0, args.size, args.size)[0]
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)[len(latencies) // 2], image
+
+    print(f"\n{'Steps':>6}{'Interval':>10}{'Latency (s)':>13}{'Speedup':>9}{'PSNR (dB)':>11}{'SSIM':>8}")
+    for steps in parse_ints(args.steps):
+        base_latency, base_image = run(steps, 0)
+        base_rgb, base_gray = np.asarray(base_image.convert("RGB")), np.asarray(base_image.convert("L"))
+        print(f"{steps:>6}{'off':>10}{base_latency:>13.2f}{1.0:>9.2f}{'-':>11}{'-':>8}")
+        for interval in parse_ints(args.intervals):
+            latency, image = run(steps, interval)
+            score_psnr = psnr(np.asarray(image.convert("RGB")), base_rgb)
+            score_ssim = ssim(np.asarray(image.convert("L")), base_gray)
+            print(f"{steps:>6}{interval:>10}{latency:>13.2f}{base_latency / latency:>9.2f}{score_psnr:>11.2f}{score_ssim:>8.3f}")
+    generator.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import io
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from src.image_writer import encode_options
+
+# (format, quality, png compress level) combinations to compare
+CONFIGS = [
+    ("png", None, 0),
+    ("png", None, 1),
+    ("png", None, 6),
+    ("png", None, 9),
+    ("webp", 75, None),
+    ("webp", 90, None),
+    ("webp", 100, None),
+    ("jpeg", 75, None),
+    ("jpeg", 90, None),
+    ("jpeg", 95, None)
+]
+
+
+def benchmark_encode(image: Image.Image, repeats: int = 5):
+    """Return (label, mean encode ms, size in KB) for every output config"""
+    rows = []
+    for fmt, quality, compress_level in CONFIGS:
+        kwargs = encode_options(fmt, quality or 90, compress_level if compress_level is not None else 6)
+        source = image.convert("RGB") if fmt == "jpeg" else image
+        size = 0
+        start = time.perf_counter()
+        for _ in range(repeats):
+            buffer = io.BytesIO()
+            source.save(buffer, **kwargs)
+            size = buffer.tell()
+        elapsed_ms = (time.perf_counter() - start) * 1000 / repeats
+        label = f"{fmt} compress_level={compress_level}" if fmt == "png" else f"{fmt} quality={quality}"
+        rows.append((label, elapsed_ms, size / 1024))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare encode time against file size for each output format")
+    parser.add_argument("--image", default="output/test_generation.png", help="Image to encode")
+    parser.add_argument("--size", type=int, default=None, help="Resize to SIZE x SIZE first (e.g. 768)")
+    parser.add_argument("--repeats", type=int, default=5, help="Encodes per format")
+    args = parser.parse_args()
+
+    image = Image.open(Path(args.image))
+    image.load()
+    if args.size:
+        image = image.resize((args.size, args.size), Image.LANCZOS)
+
+    print(f"\nEncoding {args.image} ({image.width}x{image.height}), {args.repeats} repeats")
+    print(f"{'Format':<26}{'Encode (ms)':>12}{'Size (KB)':>12}")
+    for label, elapsed_ms, size_kb in benchmark_encode(image, args.repeats):
+        print(f"{label:<26}{elapsed_ms:>12.1f}{size_kb:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
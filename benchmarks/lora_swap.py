@@ -0,0 +1,85 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import torch
+
+from src.generator import ImageGenerator
+
+from .suite import percentile
+from .tiny_model import DEFAULT_TINY_MODEL_PATH, build_tiny_pipeline
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+
+# Attention projections, the usual LoRA targets
+TARGET_SUFFIXES = ("attn1.to_q", "attn1.to_k", "attn1.to_v", "attn1.to_out.0",
+                   "attn2.to_q", "attn2.to_k", "attn2.to_v", "attn2.to_out.0")
+
+
+def build_random_lora(unet: torch.nn.Module, path: Path, rank: int = 4, seed: int = 0) -> Path:
+    """Write a random LoRA for ``unet`` in the diffusers format"""
+    from safetensors.torch import save_file
+
+    generator = torch.Generator().manual_seed(seed)
+    tensors = {}
+    for name, module in unet.named_modules():
+        if isinstance(module, torch.nn.Linear) and name.endswith(TARGET_SUFFIXES):
+            tensors[f"unet.{name}.lora.down.weight"] = torch.randn(rank, module.in_features, generator=generator) * 0.01
+            tensors[f"unet.{name}.lora.up.weight"] = torch.randn(module.out_features, rank, generator=generator) * 0.01
+    path.parent.mkdir(parents=True, exist_ok=True)
+    save_file(tensors, str(path))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LoRA swap cost: first (uncached) vs repeated (cached) use")
+    parser.add_argument("--model", default="tiny", help="'tiny' for the offline stand-in, 'local' for models/lcm_dreamshaper, or a model_files path")
+    parser.add_argument("--lora-dir", default="models/loras_bench", help="Where the random benchmark adapters are written")
+    parser.add_argument("--adapters", type=int, default=3, help="Number of adapters to rotate through")
+    parser.add_argument("--rounds", type=int, default=10, help="Rotations through all adapters once cached")
+    parser.add_argument("--size", type=int, default=256, help="Resolution of the generation after each swap")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    generator = ImageGenerator()
+    if args.model == "tiny":
+        generator.device = "cpu"
+        generator.model_path = build_tiny_pipeline(DEFAULT_TINY_MODEL_PATH)
+    elif args.model != "local":
+        generator.model_path = Path(args.model)
+    if not generator.load_model():
+        raise SystemExit("Failed to load model")
+
+    generator.adapters.lora_dir = Path(args.lora_dir)
+    names = [f"bench_{i}" for i in range(args.adapters)]
+    for i, name in enumerate(names):
+        build_random_lora(generator.model.unet, generator.adapters.lora_dir / f"{name}.safetensors", seed=i)
+
+    identity = generator.model_identity()
+
+    def swap(adapter):
+        start = time.perf_counter()
+        generator.adapters.apply(generator.model, identity, adapter)
+        return time.perf_counter() - start
+
+    uncached = [swap(name) for name in names]
+    cached = []
+    for _ in range(args.rounds):
+        for name in names + [None]:
+            cached.append(swap(name))
+
+    # Sanity check that a swapped UNet still generates
+    if generator.generate_batch([PROMPT], [0], 2, 1.0, args.size, args.size, adapter=names[0]) is None:
+        raise SystemExit("Generation with an adapter failed")
+    generator.cleanup()
+
+    print(f"\n{'Swap':<10}{'count':>7}{'p50 (ms)':>11}{'p90 (ms)':>11}")
+    for label, samples in (("uncached", uncached), ("cached", cached)):
+        print(f"{label:<10}{len(samples):>7}{percentile(samples, 50) * 1000:>11.2f}{percentile(samples, 90) * 1000:>11.2f}")
+    print(f"Adapter cache: {generator.adapters.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import io
+import multiprocessing as mp
+import resource
+import time
+
+import numpy as np
+from PIL import Image
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+SEED = 1234
+
+
+def _run_mode(mode, size, steps, repeats, results):
+    """Child process: load one mode, time generations, report peak RSS"""
+    from src.generator import ImageGenerator
+
+    generator = ImageGenerator()
+    generator.device = "cpu"
+    if not generator.load_model(quantize=mode):
+        results.put((mode, None))
+        return
+    generator.generate_batch([PROMPT], [SEED], steps, 1.0, size, size)
+
+    latencies = []
+    image = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        image = generator.generate_batch([PROMPT], [SEED], steps, 1.0, size, size)[0]
+        latencies.append(time.perf_counter() - start)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    # ru_maxrss is in KB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    # generator.quantize is the mode actually applied (weight_only falls back without torchao)
+    results.put((mode, (sorted(latencies)[len(latencies) // 2], peak_rss_mb, buffer.getvalue(), generator.quantize)))
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0 ** 2 / mse)
+
+
+def ssim(a: np.ndarray, b: np.ndarray, block: int = 8) -> float:
+    """Mean SSIM over non-overlapping blocks of the grayscale images"""
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    h, w = (a.shape[0] // block) * block, (a.shape[1] // block) * block
+    x = a[:h, :w].astype(np.float64).reshape(h // block, block, w // block, block)
+    y = b[:h, :w].astype(np.float64).reshape(h // block, block, w // block, block)
+    mx, my = x.mean(axis=(1, 3)), y.mean(axis=(1, 3))
+    vx, vy = x.var(axis=(1, 3)), y.var(axis=(1, 3))
+    cov = ((x - mx[:, None, :, None]) * (y - my[:, None, :, None])).mean(axis=(1, 3))
+    return float(np.mean(((2 * mx * my + c1) * (2 * cov + c2)) / ((mx ** 2 + my ** 2 + c1) * (vx + vy + c2))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency, peak RSS and similarity of int8 modes vs fp32")
+    parser.add_argument("--modes", default="dynamic,weight_only", help="Comma-separated quantization modes")
+    parser.add_argument("--size", type=int, default=512, help="Square resolution")
+    parser.add_argument("--steps", type=int, default=4, help="Inference steps")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed generations per mode")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    measurements = {}
+    for mode in [None] + args.modes.split(","):
+        results = ctx.Queue()
+        process = ctx.Process(target=_run_mode, args=(mode, args.size, args.steps, args.repeats, results))
+        process.start()
+        name, data = results.get()
+        process.join()
+        measurements[name] = data
+
+    if measurements[None] is None:
+        raise SystemExit("fp32 baseline failed")
+    baseline = Image.open(io.BytesIO(measurements[None][2]))
+    baseline_rgb = np.asarray(baseline.convert("RGB"))
+    baseline_gray = np.asarray(baseline.convert("L"))
+
+    print(f"\n{'Mode':<14}{'Latency (s)':>12}{'Peak RSS (MB)':>15}{'PSNR (dB)':>11}{'SSIM':>8}")
+    for mode, data in measurements.items():
+        if data is None:
+            print(f"{mode or 'fp32':<14}{'failed':>12}")
+            continue
+        latency, rss, png, applied = data
+        label = mode if applied == mode else f"{mode}->{applied}"
+        image = Image.open(io.BytesIO(png))
+        score_psnr = psnr(np.asarray(image.convert("RGB")), baseline_rgb)
+        score_ssim = ssim(np.asarray(image.convert("L")), baseline_gray)
+        print(f"{label or 'fp32':<14}{latency:>12.2f}{rss:>15.0f}{score_psnr:>11.2f}{score_ssim:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import psutil
+import torch
+
+from src.generator import ImageGenerator
+
+from .tiny_model import DEFAULT_TINY_MODEL_PATH, build_tiny_pipeline
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+
+# Metrics compared against the baseline, and whether higher is better
+REGRESSION_METRICS = {
+    "latency_p50_s": False,
+    "latency_p90_s": False,
+    "throughput_images_per_s": True,
+    "peak_rss_mb": False
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linear-interpolated percentile, q in [0, 100]"""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+class PeakRSSSampler:
+    """Samples this process's RSS on a background thread and keeps the peak"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.process = psutil.Process(os.getpid())
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+
+class StageTimer:
+    """Times the text encoder, each UNet call and the VAE decode via hooks"""
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+        self.samples: Dict[str, List[float]] = {"text_encoder": [], "unet_step": [], "vae_decode": []}
+        self._starts: Dict[str, float] = {}
+        self._handles = []
+        self._original_decode = None
+
+    def _pre(self, stage):
+        def hook(module, args, kwargs=None):
+            self._starts[stage] = time.perf_counter()
+        return hook
+
+    def _post(self, stage):
+        def hook(module, args, output):
+            self.samples[stage].append(time.perf_counter() - self._starts.pop(stage))
+        return hook
+
+    def __enter__(self):
+        for stage, module in (("text_encoder", self.pipeline.text_encoder), ("unet_step", self.pipeline.unet)):
+            self._handles.append(module.register_forward_pre_hook(self._pre(stage)))
+            self._handles.append(module.register_forward_hook(self._post(stage)))
+
+        vae = self.pipeline.vae
+        self._original_decode = vae.decode
+
+        def timed_decode(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return self._original_decode(*args, **kwargs)
+            finally:
+                self.samples["vae_decode"].append(time.perf_counter() - start)
+
+        vae.decode = timed_decode
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self.pipeline.vae.decode = self._original_decode
+
+
+def run_config(generator: ImageGenerator, size: int, steps: int, batch_size: int, threads: int, repeats: int, load_time: float) -> Dict:
+    """Benchmark one (size, steps, batch size, threads) configuration"""
+    torch.set_num_threads(threads)
+    prompts = [PROMPT] * batch_size
+    seeds = list(range(batch_size))
+
+    # Untimed warm-up so one-off allocation doesn't skew the percentiles
+    generator.generate_batch(prompts, seeds, steps, 1.0, size, size)
+
+    latencies = []
+    with PeakRSSSampler() as rss, StageTimer(generator.model) as stages:
+        for _ in range(repeats):
+            # Measure the text encoder too rather than serving it from cache
+            generator.prompt_cache.clear()
+            start = time.perf_counter()
+            if generator.generate_batch(prompts, seeds, steps, 1.0, size, size) is None:
+                raise RuntimeError(f"Generation failed for {size}x{size}, {steps} steps, batch {batch_size}")
+            latencies.append(time.perf_counter() - start)
+
+    result = {
+        "size": size,
+        "steps": steps,
+        "batch_size": batch_size,
+        "threads": threads,
+        "repeats": repeats,
+        "model_load_s": load_time,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p90_s": percentile(latencies, 90),
+        "latency_p99_s": percentile(latencies, 99),
+        "throughput_images_per_s": batch_size / percentile(latencies, 50),
+        "peak_rss_mb": rss.peak / (1024 * 1024),
+        "stages": {}
+    }
+    for stage, samples in stages.samples.items():
+        result["stages"][stage] = {
+            "p50_s": percentile(samples, 50),
+            "p90_s": percentile(samples, 90),
+            "p99_s": percentile(samples, 99),
+            "count": len(samples)
+        }
+    return result
+
+
+def config_key(result: Dict) -> str:
+    return f"{result['size']}px/{result['steps']}steps/batch{result['batch_size']}/{result['threads']}threads"
+
+
+def compare(results: List[Dict], baseline: List[Dict], threshold: float) -> List[str]:
+    """Describe every metric that regressed by more than ``threshold``"""
+    baseline_by_key = {config_key(entry): entry for entry in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline_by_key.get(config_key(result))
+        if reference is None:
+            continue
+        for metric, higher_is_better in REGRESSION_METRICS.items():
+            old, new = reference.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (not higher_is_better and change > threshold):
+                regressions.append(f"{config_key(result)} {metric}: {old:.4g} -> {new:.4g} ({change:+.1%})")
+    return regressions
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ImaGen benchmark suite")
+    parser.add_argument("--model", default="tiny", help="'tiny' for the offline stand-in, 'local' for models/lcm_dreamshaper, or a model_files path")
+    parser.add_argument("--sizes", default="256,512", help="Comma-separated square resolutions")
+    parser.add_argument("--steps", default="2,4", help="Comma-separated step counts")
+    parser.add_argument("--batch-sizes", default="1,4", help="Comma-separated batch sizes")
+    parser.add_argument("--threads", default=str(torch.get_num_threads()), help="Comma-separated intra-op thread counts")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per configuration")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write results")
+    parser.add_argument("--baseline", default=None, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write these results to --baseline instead of comparing")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    generator = ImageGenerator()
+    if args.model == "tiny":
+        generator.device = "cpu"
+        generator.model_path = build_tiny_pipeline(DEFAULT_TINY_MODEL_PATH)
+    elif args.model != "local":
+        generator.model_path = Path(args.model)
+
+    start = time.perf_counter()
+    if not generator.load_model():
+        raise SystemExit("Failed to load model")
+    load_time = time.perf_counter() - start
+    print(f"Model loaded in {load_time:.2f}s from {generator.model_path}")
+
+    results = []
+    configs = itertools.product(parse_ints(args.threads), parse_ints(args.sizes), parse_ints(args.steps), parse_ints(args.batch_sizes))
+    for threads, size, steps, batch_size in configs:
+        result = run_config(generator, size, steps, batch_size, threads, args.repeats, load_time)
+        results.append(result)
+        print(
+            f"{config_key(result):<36} p50 {result['latency_p50_s']:.3f}s  p90 {result['latency_p90_s']:.3f}s  "
+            f"{result['throughput_images_per_s']:.2f} img/s  peak RSS {result['peak_rss_mb']:.0f} MB"
+        )
+    generator.cleanup()
+
+    report = {
+        "meta": {
+            "model": str(generator.model_path),
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline and args.update_baseline:
+        Path(args.baseline).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated at {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
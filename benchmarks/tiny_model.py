@@ -0,0 +1,130 @@
+import json
+import logging
+from pathlib import Path
+
+import torch
+
+from src.model_files import build_manifest, write_manifest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TINY_MODEL_PATH = Path("models/tiny_lcm/model_files")
+
+# Special tokens go after the 256 byte symbols and their end-of-word forms
+_BOS_TOKEN = "<|startoftext|>"
+_EOS_TOKEN = "<|endoftext|>"
+
+
+def _bytes_to_unicode():
+    """CLIP's reversible byte -> printable unicode mapping"""
+    bs = list(range(ord("!"), ord("~") + 1)) + list(range(ord("¡"), ord("¬") + 1)) + list(range(ord("®"), ord("ÿ") + 1))
+    cs = bs[:]
+    n = 0
+    for b in range(2 ** 8):
+        if b not in bs:
+            bs.append(b)
+            cs.append(2 ** 8 + n)
+            n += 1
+    return [chr(c) for c in cs]
+
+
+def _write_tokenizer_files(directory: Path):
+    """Character-level CLIP vocabulary with no merges, so no download is needed"""
+    symbols = _bytes_to_unicode()
+    vocab = {symbol: i for i, symbol in enumerate(symbols)}
+    vocab.update({f"{symbol}</w>": len(symbols) + i for i, symbol in enumerate(symbols)})
+    vocab[_BOS_TOKEN] = len(vocab)
+    vocab[_EOS_TOKEN] = len(vocab)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "vocab.json", "w", encoding="utf-8") as f:
+        json.dump(vocab, f)
+    with open(directory / "merges.txt", "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    return vocab
+
+
+def build_tiny_pipeline(path: Path = DEFAULT_TINY_MODEL_PATH, seed: int = 0) -> Path:
+    """Save a randomly initialized, structurally complete LCM pipeline
+
+    Same layout and component classes as LCM Dreamshaper (VAE downscale
+    factor 8, guidance-embedding UNet) but a few hundred thousand
+    parameters, so benchmarks run on any CPU without network access. The
+    images are noise; only the timings mean anything.
+    """
+    from diffusers import AutoencoderKL, LatentConsistencyModelPipeline, LCMScheduler, UNet2DConditionModel
+    from transformers import CLIPTextConfig, CLIPTextModel, CLIPTokenizer
+
+    path = Path(path)
+    if (path / "model_index.json").exists():
+        return path
+
+    logger.info(f"Building tiny LCM pipeline at {path}")
+    torch.manual_seed(seed)
+
+    tokenizer_dir = path.parent / "tokenizer_source"
+    vocab = _write_tokenizer_files(tokenizer_dir)
+    tokenizer = CLIPTokenizer(
+        vocab_file=str(tokenizer_dir / "vocab.json"),
+        merges_file=str(tokenizer_dir / "merges.txt"),
+        bos_token=_BOS_TOKEN,
+        eos_token=_EOS_TOKEN,
+        pad_token=_EOS_TOKEN,
+        unk_token=_EOS_TOKEN,
+        model_max_length=77
+    )
+
+    text_encoder = CLIPTextModel(CLIPTextConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        intermediate_size=64,
+        num_attention_heads=4,
+        num_hidden_layers=2,
+        max_position_embeddings=77,
+        bos_token_id=vocab[_BOS_TOKEN],
+        eos_token_id=vocab[_EOS_TOKEN],
+        pad_token_id=vocab[_EOS_TOKEN]
+    ))
+    unet = UNet2DConditionModel(
+        sample_size=64,
+        in_channels=4,
+        out_channels=4,
+        block_out_channels=(8, 16),
+        layers_per_block=1,
+        down_block_types=("DownBlock2D", "CrossAttnDownBlock2D"),
+        up_block_types=("CrossAttnUpBlock2D", "UpBlock2D"),
+        cross_attention_dim=32,
+        attention_head_dim=4,
+        norm_num_groups=4,
+        time_cond_proj_dim=32
+    )
+    vae = AutoencoderKL(
+        in_channels=3,
+        out_channels=3,
+        block_out_channels=(4, 4, 8, 8),
+        down_block_types=("DownEncoderBlock2D",) * 4,
+        up_block_types=("UpDecoderBlock2D",) * 4,
+        latent_channels=4,
+        norm_num_groups=2,
+        sample_size=512
+    )
+    scheduler = LCMScheduler(
+        beta_start=0.00085,
+        beta_end=0.012,
+        beta_schedule="scaled_linear",
+        clip_sample=False,
+        set_alpha_to_one=True
+    )
+
+    pipeline = LatentConsistencyModelPipeline(
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        unet=unet,
+        scheduler=scheduler,
+        safety_checker=None,
+        feature_extractor=None,
+        requires_safety_checker=False
+    )
+    pipeline.save_pretrained(path, safe_serialization=True)
+    write_manifest(path, build_manifest(path))
+    return path
@@ -0,0 +1,64 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.generator import ImageGenerator
+from src.token_merging import parse_merge_ratios
+
+from .quantization import psnr, ssim
+from .tiny_model import DEFAULT_TINY_MODEL_PATH, build_tiny_pipeline
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+SEED = 1234
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Token merging latency and similarity against unmerged attention per resolution")
+    parser.add_argument("--model", default="local", help="'local' for models/lcm_dreamshaper, 'tiny' for the offline stand-in, or a model_files path")
+    parser.add_argument("--sizes", default="512,768,1024", help="Comma-separated square resolutions")
+    parser.add_argument("--ratios", default="0.3,0.5,0.6", help="Comma-separated merge ratios")
+    parser.add_argument("--steps", type=int, default=4, help="Inference steps")
+    parser.add_argument("--repeats", type=int, default=2, help="Timed generations per configuration")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    generator = ImageGenerator()
+    if args.model == "tiny":
+        generator.device = "cpu"
+        generator.model_path = build_tiny_pipeline(DEFAULT_TINY_MODEL_PATH)
+    elif args.model != "local":
+        generator.model_path = Path(args.model)
+    if not generator.load_model():
+        raise SystemExit("Failed to load model")
+
+    def run(size, ratio):
+        generator.token_merge_setting = str(ratio)
+        generator.token_merge_ratios = parse_merge_ratios(str(ratio))
+        generator.generate_batch([PROMPT], [SEED], args.steps, 1.0, size, size)
+        latencies = []
+        image = None
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            image = generator.generate_batch([PROMPT], [SEED], args.steps, 1.0, size, size)[0]
+            latencies.append(time.perf_counter() - start)
+        return sorted(latencies)[len(latencies) // 2], image
+
+    print(f"\n{'Size':>6}{'Ratio':>7}{'Latency (s)':>13}{'Speedup':>9}{'PSNR (dB)':>11}{'SSIM':>8}")
+    for size in [int(v) for v in args.sizes.split(",") if v]:
+        base_latency, base_image = run(size, 0)
+        base_rgb, base_gray = np.asarray(base_image.convert("RGB")), np.asarray(base_image.convert("L"))
+        print(f"{size:>6}{'off':>7}{base_latency:>13.2f}{1.0:>9.2f}{'-':>11}{'-':>8}")
+        for ratio in [float(v) for v in args.ratios.split(",") if v]:
+            latency, image = run(size, ratio)
+            score_psnr = psnr(np.asarray(image.convert("RGB")), base_rgb)
+            score_ssim = ssim(np.asarray(image.convert("L")), base_gray)
+            print(f"{size:>6}{ratio:>7.2f}{latency:>13.2f}{base_latency / latency:>9.2f}{score_psnr:>11.2f}{score_ssim:>8.3f}")
+    generator.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import argparse
+import multiprocessing as mp
+import time
+from pathlib import Path
+
+PROMPT = "a lighthouse on a cliff at sunset, digital art"
+SEED = 1234
+
+# A budget no single decode reaches, i.e. always decode the full batch at once
+UNLIMITED_BUDGET = 1 << 62
+
+
+def _run_size(model, width, height, batch, steps, budget_bytes, results):
+    """Child process: one generation at one size; reports the decode mode and RSS growth"""
+    from src.generator import ImageGenerator
+    from src.vae_decode import configure_vae_decode
+
+    from .suite import PeakRSSSampler
+    from .tiny_model import DEFAULT_TINY_MODEL_PATH, build_tiny_pipeline
+
+    generator = ImageGenerator()
+    if model == "tiny":
+        generator.device = "cpu"
+        generator.model_path = build_tiny_pipeline(DEFAULT_TINY_MODEL_PATH)
+    elif model != "local":
+        generator.model_path = Path(model)
+    if not generator.load_model():
+        results.put(None)
+        return
+    generator.vae_memory_budget = budget_bytes
+    mode = configure_vae_decode(generator.model.vae, width, height, batch, budget_bytes)
+
+    sampler = PeakRSSSampler()
+    baseline = sampler.process.memory_info().rss
+    start = time.perf_counter()
+    with sampler:
+        images = generator.generate_batch([PROMPT] * batch, [SEED + i for i in range(batch)], steps, 1.0, width, height)
+    elapsed = time.perf_counter() - start
+    if images is None:
+        results.put(None)
+        return
+    results.put((mode, elapsed, (sampler.peak - baseline) / (1024 * 1024)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Peak RSS of the VAE decode per resolution, budgeted vs full decode")
+    parser.add_argument("--model", default="tiny", help="'tiny' for the offline stand-in, 'local' for models/lcm_dreamshaper, or a model_files path")
+    parser.add_argument("--sizes", default="512x512,768x768,1024x1024,1536x1536", help="Comma-separated WIDTHxHEIGHT")
+    parser.add_argument("--batch-size", type=int, default=1, help="Images per pipeline call")
+    parser.add_argument("--steps", type=int, default=2, help="Inference steps")
+    parser.add_argument("--budget-mb", type=int, default=1024, help="VAE memory budget for the budgeted runs")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"\n{'Size':<12}{'Budget':<10}{'Decode':<9}{'Time (s)':>10}{'Peak RSS growth (MB)':>22}")
+    for size in args.sizes.split(","):
+        width, height = (int(v) for v in size.split("x"))
+        for label, budget in (("full", UNLIMITED_BUDGET), (f"{args.budget_mb}MB", args.budget_mb * 1024 * 1024)):
+            # A fresh process per run so one run's allocator high-water mark doesn't leak into the next
+            results = ctx.Queue()
+            process = ctx.Process(target=_run_size, args=(args.model, width, height, args.batch_size, args.steps, budget, results))
+            process.start()
+            data = results.get()
+            process.join()
+            if data is None:
+                print(f"{size:<12}{label:<10}{'failed':<9}")
+                continue
+            mode, elapsed, growth = data
+            print(f"{size:<12}{label:<10}{mode:<9}{elapsed:>10.2f}{growth:>22.0f}")
+
+
+if __name__ == "__main__":
+    main()
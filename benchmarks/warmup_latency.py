@@ -0,0 +1,51 @@
+import argparse
+import time
+
+from src.generator import ImageGenerator
+
+
+def time_generation(generator: ImageGenerator, size: int, steps: int) -> float:
+    """Seconds for one single-image generation"""
+    start = time.perf_counter()
+    if generator.generate_batch(["a lighthouse on a cliff, digital art"], [1234], steps, 1.0, size, size) is None:
+        raise RuntimeError(f"Generation failed at {size}x{size}")
+    return time.perf_counter() - start
+
+
+def run(generator: ImageGenerator, sizes, steps: int, optimize: bool, compile_modules: bool):
+    """Load the model in one mode and return {size: (first, steady)} latencies"""
+    generator.cleanup()
+    if not generator.load_model(optimize=optimize, compile_modules=compile_modules):
+        raise RuntimeError("Failed to load model")
+    if optimize:
+        start = time.perf_counter()
+        generator.warm_up(sizes, [steps])
+        print(f"Warm-up took {time.perf_counter() - start:.2f}s")
+    results = {}
+    for size in sizes:
+        first = time_generation(generator, size, steps)
+        steady = time_generation(generator, size, steps)
+        results[size] = (first, steady)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="First-request vs steady-state latency, eager vs optimized+warmed")
+    parser.add_argument("--sizes", default="256,512,768", help="Comma-separated square resolutions")
+    parser.add_argument("--steps", type=int, default=4, help="Inference steps")
+    parser.add_argument("--no-compile", action="store_true", help="Optimized mode without torch.compile")
+    args = parser.parse_args()
+    sizes = [int(v) for v in args.sizes.split(",")]
+
+    generator = ImageGenerator()
+    before = run(generator, sizes, args.steps, optimize=False, compile_modules=False)
+    after = run(generator, sizes, args.steps, optimize=True, compile_modules=not args.no_compile)
+    generator.cleanup()
+
+    print(f"\n{'Size':<10}{'Eager 1st (s)':>15}{'Eager 2nd (s)':>15}{'Opt 1st (s)':>14}{'Opt 2nd (s)':>14}")
+    for size in sizes:
+        print(f"{size}x{size:<6}{before[size][0]:>15.2f}{before[size][1]:>15.2f}{after[size][0]:>14.2f}{after[size][1]:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
 import gradio as gr
 import time
-from src.generator import ImageGenerator
+import threading
+import queue
+from src.scheduler import BatchScheduler, QueueFullError
+from src.result_cache import ResultCache, make_result_key
+from src.worker_pool import WorkerPool
+from src.image_writer import ImageWriter
+from src.output_store import OutputStore
+from src.startup import StartupReport
+from src.metrics import REGISTRY, start_metrics_server
+from src.utils import setup_queue_logging
+from src.model_files import discover_adapters, discover_models
+from src.adaptive_quality import AdaptiveQuality, QualityDecision
 import random
-from typing import List, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import logging
-import torch
 import os
+from PIL import Image
+
+# torch/diffusers are imported on the loader thread (via src.generator), not here
+STARTUP = StartupReport()
+STARTUP.mark("imports")
 
 # Custom CSS for modern dark theme
 CUSTOM_CSS = """
@@ -83,6 +98,43 @@ EXAMPLE_PROMPTS = [
     "Portrait of a futuristic robot with expressive eyes"
 ]
 
+# Micro-batching: concurrent requests with the same size/steps share one pipeline call
+MAX_BATCH_SIZE = int(os.environ.get("IMAGEN_MAX_BATCH_SIZE", "4"))
+MAX_BATCH_WAIT_MS = float(os.environ.get("IMAGEN_MAX_BATCH_WAIT_MS", "30"))
+CONCURRENCY_LIMIT = int(os.environ.get("IMAGEN_CONCURRENCY_LIMIT", "8"))
+
+# Admission control: queued work in 512x512-step units before new requests get a 429 (0 = unbounded),
+# and how long a request may wait and run before it is abandoned
+MAX_QUEUE_COST = float(os.environ.get("IMAGEN_MAX_QUEUE_COST", "400"))
+REQUEST_DEADLINE_S = float(os.environ.get("IMAGEN_REQUEST_DEADLINE_S", "300"))
+QUEUE_POLL_S = 0.5
+
+# Adaptive quality: under load, run fewer steps (and, if the request allows, a smaller size)
+# so the p95 latency stays under the target (0 = always run what was asked for)
+LATENCY_TARGET_S = float(os.environ.get("IMAGEN_LATENCY_TARGET_S", "0"))
+ADAPTIVE_MIN_STEPS = int(os.environ.get("IMAGEN_ADAPTIVE_MIN_STEPS", "4"))
+ADAPTIVE_MIN_SCALE = float(os.environ.get("IMAGEN_ADAPTIVE_MIN_SCALE", "0.5"))
+
+# Worker-pool mode: N pinned processes sharing memory-mapped weights (0 = in-process)
+NUM_WORKERS = int(os.environ.get("IMAGEN_WORKERS", "0"))
+
+# Seeded results are deterministic and served from cache/results when repeated
+RESULT_CACHE_DIR = os.environ.get("IMAGEN_RESULT_CACHE_DIR", "cache/results")
+RESULT_CACHE_MEMORY_ITEMS = int(os.environ.get("IMAGEN_RESULT_CACHE_ITEMS", "64"))
+RESULT_CACHE_DISK_MB = int(os.environ.get("IMAGEN_RESULT_CACHE_MB", "1024"))
+
+# Saved copies of generated images: png, webp or jpeg, written in the background
+OUTPUT_FORMAT = os.environ.get("IMAGEN_OUTPUT_FORMAT", "png")
+OUTPUT_QUALITY = int(os.environ.get("IMAGEN_OUTPUT_QUALITY", "90"))
+PNG_COMPRESS_LEVEL = int(os.environ.get("IMAGEN_PNG_COMPRESS_LEVEL", "6"))
+WRITER_THREADS = int(os.environ.get("IMAGEN_WRITER_THREADS", "2"))
+
+# Indexed output store (content-addressed blobs, thumbnails, SQLite index) with retention limits
+OUTPUT_STORE = os.environ.get("IMAGEN_OUTPUT_STORE", "0") == "1"
+OUTPUT_MAX_MB = int(os.environ.get("IMAGEN_OUTPUT_MAX_MB", "0"))
+OUTPUT_MAX_AGE_DAYS = float(os.environ.get("IMAGEN_OUTPUT_MAX_AGE_DAYS", "0"))
+HISTORY_PAGE_SIZE = 24
+
 # Style presets
 STYLE_PRESETS = {
     "Photorealistic": "photorealistic, highly detailed, 8k uhd",
@@ -91,25 +143,194 @@ STYLE_PRESETS = {
     "Abstract": "abstract art, modern, contemporary, artistic"
 }
 
+# Pre-compute text embeddings for the example/preset prompts at startup
+PREWARM_PROMPT_CACHE = os.environ.get("IMAGEN_PREWARM_PROMPT_CACHE", "1") == "1"
+
+# Image sizes offered in the UI (width x height); large ones decode tiled under the VAE memory budget
+SIZE_CHOICES = [
+    "256x256", "512x512", "768x768", "1024x1024", "1536x1536",
+    "768x512", "512x768", "1024x768", "768x1024", "1280x720", "720x1280"
+]
+
+# Optimized execution (channels_last + torch.compile) and per-resolution warm-up before "ready"
+OPTIMIZE_EXECUTION = os.environ.get("IMAGEN_OPTIMIZE", "0") == "1"
+COMPILE_MODULES = os.environ.get("IMAGEN_COMPILE", "1") == "1"
+WARMUP = OPTIMIZE_EXECUTION or os.environ.get("IMAGEN_WARMUP", "0") == "1"
+WARMUP_SIZES = [int(v) for v in os.environ.get("IMAGEN_WARMUP_SIZES", "256,512,768").split(",") if v]
+WARMUP_STEPS = [int(v) for v in os.environ.get("IMAGEN_WARMUP_STEPS", "4").split(",") if v]
+
+# Checkpoints under models/<name>/model_files (plus IMAGEN_MODELS), selectable per request
+MODEL_CHOICES = list(discover_models()) or ["lcm_dreamshaper"]
+DEFAULT_MODEL = os.environ.get("IMAGEN_DEFAULT_MODEL", "lcm_dreamshaper")
+if DEFAULT_MODEL not in MODEL_CHOICES:
+    DEFAULT_MODEL = MODEL_CHOICES[0]
+
+# LoRA style adapters (models/loras/<name>.safetensors), picked per request like the style presets
+LORA_DIR = os.environ.get("IMAGEN_LORA_DIR", "models/loras")
+NO_ADAPTER = "None"
+ADAPTER_CHOICES = [NO_ADAPTER] + list(discover_adapters(LORA_DIR))
+
+# Variations re-noise a previous result's cached latents and run only a few LCM steps
+VARIATION_STEPS = int(os.environ.get("IMAGEN_VARIATION_STEPS", "2"))
+
+# Int8 CPU inference for the UNet and text encoder: "", "dynamic" or "weight_only"
+QUANTIZE = os.environ.get("IMAGEN_QUANTIZE", "") or None
+
+# Prometheus-style /metrics endpoint served next to the Gradio app (0 disables it)
+METRICS_PORT = int(os.environ.get("IMAGEN_METRICS_PORT", "9464"))
+
+# How long a request waits for the model to finish loading before it is rejected
+READY_TIMEOUT = float(os.environ.get("IMAGEN_READY_TIMEOUT", "300"))
+
 class ImaGenInterface:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self.generator = None
+        self.scheduler = None
+        self.result_cache = ResultCache(
+            cache_dir=RESULT_CACHE_DIR,
+            max_memory_items=RESULT_CACHE_MEMORY_ITEMS,
+            max_disk_bytes=RESULT_CACHE_DISK_MB * 1024 * 1024
+        )
+        self.output_store = None
+        if OUTPUT_STORE:
+            self.output_store = OutputStore(
+                "output",
+                max_bytes=OUTPUT_MAX_MB * 1024 * 1024,
+                max_age_s=OUTPUT_MAX_AGE_DAYS * 86400
+            )
+        self.image_writer = ImageWriter(
+            output_dir="output",
+            fmt=OUTPUT_FORMAT,
+            quality=OUTPUT_QUALITY,
+            compress_level=PNG_COMPRESS_LEVEL,
+            max_workers=WRITER_THREADS,
+            store=self.output_store
+        )
+        self.quality = AdaptiveQuality(
+            lambda cost: self.scheduler.estimate_latency(cost) if self.scheduler is not None else None,
+            target_p95_s=LATENCY_TARGET_S,
+            min_steps=ADAPTIVE_MIN_STEPS,
+            min_scale=ADAPTIVE_MIN_SCALE
+        )
+        self.model_status = "loading"
+        self._register_metrics()
+        self._ready = threading.Event()
+        self._loader = None
+        self._first_image_served = False
+        self.start_background_load()
+
+    def _register_metrics(self):
+        """Expose readiness and cache counters as gauges on /metrics"""
+        REGISTRY.gauge_callback(
+            "imagen_model_ready",
+            "1 when the model is loaded and warmed up",
+            lambda: {(): 1 if self.model_status == "ready" else 0}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_result_cache",
+            "Result cache counters",
+            lambda: {(("counter", name),): value for name, value in self.result_cache.stats().items()}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_prompt_cache",
+            "Prompt-embedding cache counters (in-process generator only)",
+            lambda: {(("counter", name),): value for name, value in self.generator.prompt_cache.stats().items()}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_latent_cache",
+            "Variation source-latent cache counters (in-process generator only)",
+            lambda: {(("counter", name),): value for name, value in self.generator.latent_cache.stats().items()}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_adapter_cache",
+            "Fused LoRA delta cache counters (in-process generator only)",
+            lambda: {(("counter", name),): value for name, value in self.generator.adapters.stats().items()}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_output_store",
+            "Indexed output store size",
+            lambda: {(("counter", name),): value for name, value in self.output_store.stats().items()}
+        )
+        REGISTRY.gauge_callback(
+            "imagen_adaptive_quality",
+            "Request latency against the p95 target used by adaptive quality",
+            lambda: {(("value", name),): value for name, value in self.quality.stats().items()}
+        )
+
+    def start_background_load(self):
+        """Load the model on a background thread so the UI can come up first"""
+        if self._loader is not None and self._loader.is_alive():
+            return
+        self._ready.clear()
         self.model_status = "loading"
-        self.initialize_generator()
+        self._loader = threading.Thread(target=self._background_load, name="imagen-model-loader", daemon=True)
+        self._loader.start()
+
+    def _background_load(self):
+        try:
+            self.initialize_generator()
+        except Exception:
+            # initialize_generator has already logged and set the error status
+            pass
+        finally:
+            self._ready.set()
+
+    def wait_until_ready(self):
+        """Hold a request until the model is ready, or reject it"""
+        if self.model_status == "error":
+            self.start_background_load()
+        if not self._ready.wait(timeout=READY_TIMEOUT):
+            raise gr.Error(f"Model is still {self.model_status}, please try again shortly")
+        if self.model_status != "ready":
+            raise gr.Error("Model failed to load. Please run model_downloader.py first to download the model.")
 
     def initialize_generator(self):
         """Initialize the image generator with proper error handling"""
         try:
             self.model_status = "loading"
-            self.generator = ImageGenerator()
+            load_options = {
+                "optimize": OPTIMIZE_EXECUTION,
+                "compile_modules": COMPILE_MODULES,
+                "quantize": QUANTIZE
+            }
+            if NUM_WORKERS > 0:
+                if self.generator is not None:
+                    # A retry after a failed start: stop whatever the last pool left running
+                    self.generator.cleanup()
+                self.generator = WorkerPool(NUM_WORKERS, **load_options)
+                load_options = {}
+            else:
+                # ImageGenerator is a singleton, so a retry reloads the same instance
+                from src.generator import ImageGenerator
+                self.generator = ImageGenerator()
             
             # Try to load model
-            if not self.generator.load_model():
+            if not self.generator.load_model(**load_options):
                 self.model_status = "error"
                 raise gr.Error("Model files not found. Please run model_downloader.py first to download the model.")
+            STARTUP.mark("weights_loaded")
+            
+            self.model_status = "warming"
+            if PREWARM_PROMPT_CACHE:
+                self.generator.warm_prompt_cache(self.get_warmup_prompts())
+            if WARMUP:
+                self.generator.warm_up(WARMUP_SIZES, WARMUP_STEPS)
+            
+            if self.scheduler is not None:
+                self.scheduler.generator = self.generator
+            else:
+                self.scheduler = BatchScheduler(
+                    self.generator,
+                    max_batch_size=MAX_BATCH_SIZE,
+                    max_wait_ms=MAX_BATCH_WAIT_MS,
+                    num_dispatchers=max(1, NUM_WORKERS),
+                    max_queue_cost=MAX_QUEUE_COST
+                )
+                self.scheduler.start()
             
             self.model_status = "ready"
+            STARTUP.mark("ready")
             self.logger.info("Image generator initialized successfully")
             
         except Exception as e:
@@ -117,6 +338,14 @@ class ImaGenInterface:
             self.logger.error(f"Error initializing generator: {str(e)}")
             raise gr.Error(f"Failed to initialize image generator: {str(e)}")
 
+    def get_warmup_prompts(self) -> List[str]:
+        """Example prompts, alone and with each style preset suffix"""
+        prompts = list(EXAMPLE_PROMPTS)
+        for example in EXAMPLE_PROMPTS:
+            for suffix in STYLE_PRESETS.values():
+                prompts.append(f"{example}, {suffix}")
+        return prompts
+
     def _check_internet_connection(self) -> bool:
         """Check if we have internet connectivity"""
         try:
@@ -130,12 +359,71 @@ class ImaGenInterface:
         """Get HTML for status indicator"""
         status_colors = {
             "loading": ("status-loading", "⏳ Loading Model..."),
+            "warming": ("status-loading", "🔥 Warming Up..."),
             "ready": ("status-ready", "✅ Model Ready"),
             "error": ("status-error", "❌ Model Error")
         }
         color_class, message = status_colors.get(self.model_status, ("status-error", "Unknown Status"))
         return f'<div class="status-indicator {color_class}">{message}</div>'
 
+    def get_queue_html(self, tickets: List) -> str:
+        """Queue position and estimated wait of a request's pending scheduler tickets"""
+        pending = [ticket for ticket in tickets if not ticket.done.is_set()]
+        if not pending:
+            return self.get_status_html()
+        ahead, eta = max(self.scheduler.position(ticket) for ticket in pending)
+        if any(ticket.dispatched for ticket in pending) and ahead == 0:
+            message = "🎨 Generating..."
+        else:
+            message = f"⏳ Queued: {ahead} request(s) ahead"
+        if eta is not None:
+            message += f", ~{eta:.0f}s"
+        return f'<div class="status-indicator status-loading">{message}</div>'
+
+    def _wait_in_queue(
+        self,
+        work: Callable[[], object],
+        tickets: List,
+        previews: Optional[queue.Queue] = None
+    ) -> Iterator[Tuple[object, str]]:
+        """Run ``work`` on a thread, yielding (gallery, queue status HTML) until it returns its result
+        
+        The gallery is left as is unless a step preview arrived on ``previews``.
+        If the caller stops iterating early (the client disconnected), the
+        scheduler tickets ``work`` created are cancelled so the queue moves on.
+        """
+        outcome = {}
+        
+        def run():
+            try:
+                outcome["result"] = work()
+            except BaseException as e:
+                outcome["error"] = e
+        
+        thread = threading.Thread(target=run, name="imagen-request", daemon=True)
+        thread.start()
+        try:
+            while True:
+                gallery = gr.update()
+                if previews is None:
+                    thread.join(QUEUE_POLL_S)
+                else:
+                    try:
+                        gallery = previews.get(timeout=QUEUE_POLL_S)
+                    except queue.Empty:
+                        pass
+                if not thread.is_alive():
+                    break
+                yield gallery, self.get_queue_html(tickets)
+        finally:
+            if thread.is_alive():
+                self.logger.info("Client went away, cancelling its queued requests")
+                for ticket in list(tickets):
+                    self.scheduler.cancel(ticket)
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
     def map_quality_to_steps(self, quality: int) -> int:
         """Map quality (1-10) to number of steps (2-15)"""
         return max(2, min(15, int(2 + (quality - 1) * 1.5)))
@@ -147,13 +435,25 @@ class ImaGenInterface:
         size: str,
         guidance_scale: float,
         seed: int,
-        batch_count: int
-    ) -> Tuple[List[Tuple[str, str]], str]:
-        """Generate images with progress updates"""
+        batch_count: int,
+        live_preview: bool = False,
+        model: str = DEFAULT_MODEL,
+        adapter: str = NO_ADAPTER,
+        adaptive: bool = True,
+        allow_resize: bool = False
+    ) -> Iterator[Tuple[List[Tuple[Image.Image, str]], str, Dict]]:
+        """Generate images with progress updates
+        
+        With ``live_preview`` the gallery shows a cheap latent preview after
+        every denoising step before the final images arrive. The last output
+        describes the request so the Variations button can refer back to it.
+        With ``adaptive``, a busy server may run fewer steps (and with
+        ``allow_resize`` a smaller size) than asked; the status says so.
+        """
         try:
-            # Ensure generator is initialized
-            if self.generator is None or self.generator.model is None:
-                self.initialize_generator()
+            # Hold the request until the background load has finished
+            self.wait_until_ready()
+            request_start = time.perf_counter()
             
             if not prompt or not prompt.strip():
                 raise gr.Error("Please enter a prompt")
@@ -162,48 +462,225 @@ class ImaGenInterface:
             steps = self.map_quality_to_steps(quality)
             
             # Parse size
-            width = height = int(size.split('x')[0])
+            width, height = (int(v) for v in size.split('x'))
+            
+            # Add style preset if present
+            if any(style in prompt.lower() for style in STYLE_PRESETS.keys()):
+                style = next(style for style in STYLE_PRESETS.keys() if style.lower() in prompt.lower())
+                prompt = f"{prompt}, {STYLE_PRESETS[style]}"
             
-            # Set seed if provided
+            adapter = None if adapter in (None, NO_ADAPTER) else adapter
+            
+            # One seed per image so a fixed seed reproduces the whole batch
+            batch_count = int(batch_count)
             if seed != -1:
-                torch.manual_seed(seed)
+                seeds = [int(seed) + i for i in range(batch_count)]
+            else:
+                seeds = [random.randint(0, 2**32 - 1) for _ in range(batch_count)]
+            
+            identity = None
+            if seed != -1:
+                identity = self.generator.model_identity(model)
+                if adapter:
+                    identity = f"{identity}+lora:{adapter}"
+            
+            # Full-quality results that are already cached cost nothing to serve
+            if adaptive and not self._all_cached(prompt, seeds, steps, guidance_scale, width, height, identity):
+                decision = self.quality.choose(steps, width, height, batch_count, allow_resize=allow_resize)
+            else:
+                decision = QualityDecision(steps, width, height, steps, width, height)
+            steps, width, height = decision.steps, decision.width, decision.height
+            
+            last = {
+                "prompt": prompt,
+                "seeds": seeds,
+                "steps": steps,
+                "guidance_scale": guidance_scale,
+                "width": width,
+                "height": height,
+                "model": model,
+                "adapter": adapter
+            }
+            
+            tickets = []
             
-            # Generate batch of images
+            # Step callbacks can't cross into worker processes
+            live_preview = live_preview and NUM_WORKERS == 0
+            previews = queue.Queue() if live_preview else None
+            
+            def on_step(step: int, latents):
+                # Runs on the dispatcher thread, where torch is already loaded
+                if step < steps:
+                    from src.previews import latents_to_rgb
+                    previews.put([(image, f"Step {step}/{steps}") for image in latents_to_rgb(latents, width, height)])
+            
+            def run_batch(indices: List[int]):
+                # Queue the batch; the scheduler may merge it with other users' requests
+                ticket = self.scheduler.enqueue(
+                    prompts=[prompt] * len(indices),
+                    seeds=[seeds[i] for i in indices],
+                    steps=steps,
+                    guidance_scale=guidance_scale,
+                    width=width,
+                    height=height,
+                    model=model,
+                    adapter=adapter,
+                    deadline_s=REQUEST_DEADLINE_S,
+                    step_callback=on_step if live_preview else None
+                )
+                tickets.append(ticket)
+                return ticket.result()
+            
+            keys = None
+            if identity is not None:
+                keys = [
+                    make_result_key(prompt, s, steps, guidance_scale, width, height, identity)
+                    for s in seeds
+                ]
+            
+            if keys is not None:
+                # Fully determined output: serve repeats from cache, coalesce duplicates
+                # (with previews too; only the images actually generated stream their steps)
+                work = lambda: self.result_cache.get_or_generate(keys, run_batch)
+            else:
+                work = lambda: [(image, False) for image in (run_batch(list(range(batch_count))) or [])]
+            queue_status = self._wait_in_queue(work, tickets, previews)
+            try:
+                while True:
+                    gallery, status = next(queue_status)
+                    yield gallery, status, last
+            except StopIteration as done:
+                results = done.value
+            finally:
+                queue_status.close()
+            if not results:
+                raise Exception("Failed to generate images")
+            if not all(cached for _, cached in results):
+                self.quality.record(decision, time.perf_counter() - request_start)
+            
+            # Serve the in-memory images; fresh ones are saved in the background
+            detail = f", {steps} steps, {width}x{height}" if decision.reduced else ""
+            latency = time.perf_counter() - request_start
             images = []
-            for i in range(batch_count):
-                # Add style preset if present
-                if any(style in prompt.lower() for style in STYLE_PRESETS.keys()):
-                    style = next(style for style in STYLE_PRESETS.keys() if style.lower() in prompt.lower())
-                    prompt = f"{prompt}, {STYLE_PRESETS[style]}"
-                
-                try:
-                    image = self.generator.generate_image(
-                        prompt=prompt,
-                        steps=steps,
-                        guidance_scale=guidance_scale,
-                        width=width,
-                        height=height
-                    )
-                    
-                    if image:
-                        # Save image with timestamp
-                        timestamp = int(time.time())
-                        filename = f"output/generated_{timestamp}_{i}.png"
-                        image.save(filename)
-                        images.append((filename, f"Image {i+1}"))
-                    else:
-                        raise Exception("Failed to generate image")
-                except Exception as e:
-                    self.logger.error(f"Error generating image {i+1}: {str(e)}")
-                    raise gr.Error(f"Failed to generate image {i+1}: {str(e)}")
-            
-            return images, self.get_status_html()
+            for i, (image, cached) in enumerate(results):
+                if not cached:
+                    self.image_writer.submit(image, metadata={**last, "seed": seeds[i], "latency_seconds": latency})
+                images.append((image, f"Image {i+1} (seed {seeds[i]}{detail})"))
+            
+            if not self._first_image_served:
+                self._first_image_served = True
+                STARTUP.mark("first_image_latency", duration=time.perf_counter() - request_start)
             
+            status = self.get_status_html()
+            if decision.reduced:
+                status += (
+                    f'<div class="status-indicator status-loading">⚡ Busy: ran {steps} steps at {width}x{height} '
+                    f'(asked for {decision.requested_steps} at {decision.requested_width}x{decision.requested_height})</div>'
+                )
+            yield images, status, last
+            
+        except gr.Error:
+            raise
+        except QueueFullError as e:
+            retry = f", retry in ~{e.retry_after:.0f}s" if e.retry_after else ", please retry shortly"
+            raise gr.Error(f"Server busy (429): {str(e)}{retry}")
         except Exception as e:
-            self.model_status = "error"
+            # A failed request doesn't mean the model is broken; only a failed load sets "error"
             self.logger.error(f"Error generating images: {str(e)}")
             raise gr.Error(f"Failed to generate images: {str(e)}")
 
+    def _all_cached(
+        self,
+        prompt: str,
+        seeds: List[int],
+        steps: int,
+        guidance_scale: float,
+        width: int,
+        height: int,
+        identity: Optional[str]
+    ) -> bool:
+        """Whether every result of a seeded request is in the result cache"""
+        if identity is None:
+            return False
+        return all(
+            self.result_cache.get(make_result_key(prompt, s, steps, guidance_scale, width, height, identity)) is not None
+            for s in seeds
+        )
+
+    def generate_variations(self, last: Optional[Dict], strength: float) -> Iterator[Tuple[List[Tuple[Image.Image, str]], str, Dict]]:
+        """Variations of the previous result from its cached latents
+        
+        Queued through the scheduler like any request, so they are subject
+        to the same admission limit, deadline and cancellation.
+        """
+        try:
+            self.wait_until_ready()
+            if not last:
+                raise gr.Error("Generate an image first")
+            
+            prompts = [last["prompt"]] * len(last["seeds"])
+            params = {key: last[key] for key in ("steps", "guidance_scale", "width", "height", "model", "adapter")}
+            seeds = [random.randint(0, 2**32 - 1) for _ in prompts]
+            tickets = []
+            
+            def work():
+                if not self.generator.has_latents(prompts, last["seeds"], **params):
+                    # Served from the result cache or evicted since: run it once more to get latents
+                    ticket = self.scheduler.enqueue(prompts=prompts, seeds=last["seeds"], deadline_s=REQUEST_DEADLINE_S, **params)
+                    tickets.append(ticket)
+                    ticket.result()
+                ticket = self.scheduler.enqueue_variations(
+                    prompts,
+                    last["seeds"],
+                    seeds,
+                    strength=strength,
+                    variation_steps=VARIATION_STEPS,
+                    deadline_s=REQUEST_DEADLINE_S,
+                    **params
+                )
+                tickets.append(ticket)
+                return ticket.result()
+            
+            queue_status = self._wait_in_queue(work, tickets)
+            try:
+                while True:
+                    _, status = next(queue_status)
+                    yield gr.update(), status, last
+            except StopIteration as done:
+                images = done.value
+            finally:
+                queue_status.close()
+            if not images:
+                raise Exception("Failed to generate variations")
+            
+            for image, seed in zip(images, seeds):
+                self.image_writer.submit(image, prefix="variation", metadata={**last, "seed": seed})
+            gallery = [(image, f"Variation {i+1} (seed {seeds[i]})") for i, image in enumerate(images)]
+            yield gallery, self.get_status_html(), {**last, "seeds": seeds}
+            
+        except gr.Error:
+            raise
+        except QueueFullError as e:
+            raise gr.Error(f"Server busy (429): {str(e)}, please retry shortly")
+        except Exception as e:
+            self.logger.error(f"Error generating variations: {str(e)}")
+            raise gr.Error(f"Failed to generate variations: {str(e)}")
+
+    def browse_history(self, prompt: str, page: int) -> Tuple[List[Tuple[str, str]], str]:
+        """A page of saved images from the output store, as thumbnails"""
+        if self.output_store is None:
+            return [], "Output store is disabled"
+        prompt = (prompt or "").strip() or None
+        page = max(0, int(page or 0))
+        records = self.output_store.query(prompt=prompt, page=page, page_size=HISTORY_PAGE_SIZE)
+        gallery = [
+            (record["thumbnail"], f"{record['prompt'] or record['kind']} (seed {record['seed']}, {record['steps']} steps)")
+            for record in records
+        ]
+        total = self.output_store.count(prompt)
+        pages = max(1, -(-total // HISTORY_PAGE_SIZE))
+        return gallery, f"Page {page + 1} of {pages} ({total} images)"
+
     def create_interface(self):
         """Create the Gradio interface"""
         with gr.Blocks(css=CUSTOM_CSS) as interface:
@@ -231,10 +708,23 @@ class ImaGenInterface:
                             label="Quality (1=Fast, 10=Best)"
                         )
                         size = gr.Dropdown(
-                            choices=["256x256", "512x512", "768x768"],
+                            choices=SIZE_CHOICES,
                             value="512x512",
                             label="Image Size"
                         )
+                        model = gr.Dropdown(
+                            choices=MODEL_CHOICES,
+                            value=DEFAULT_MODEL,
+                            label="Model",
+                            visible=len(MODEL_CHOICES) > 1
+                        )
+                        adapter = gr.Dropdown(
+                            choices=ADAPTER_CHOICES,
+                            value=NO_ADAPTER,
+                            label="Style LoRA",
+                            # Adapters can't patch int8-quantized weights
+                            visible=len(ADAPTER_CHOICES) > 1 and not QUANTIZE
+                        )
                     
                     # Advanced settings
                     with gr.Accordion("Advanced Settings", open=False):
@@ -256,6 +746,22 @@ class ImaGenInterface:
                             step=1,
                             label="Number of Images"
                         )
+                        live_preview = gr.Checkbox(
+                            value=False,
+                            label="Live preview (show each step)",
+                            # Worker processes can't stream their steps back
+                            visible=NUM_WORKERS == 0
+                        )
+                        adaptive = gr.Checkbox(
+                            value=True,
+                            label="Fewer steps when the server is busy",
+                            visible=LATENCY_TARGET_S > 0
+                        )
+                        allow_resize = gr.Checkbox(
+                            value=False,
+                            label="Also allow a smaller size when busy",
+                            visible=LATENCY_TARGET_S > 0
+                        )
                     
                     # Style presets
                     with gr.Row():
@@ -267,8 +773,18 @@ class ImaGenInterface:
                                 outputs=[prompt]
                             )
                     
-                    # Generate button
-                    generate_btn = gr.Button("✨ Generate", variant="primary")
+                    # Generate button, and variations of the last result
+                    with gr.Row():
+                        generate_btn = gr.Button("✨ Generate", variant="primary")
+                        variation_btn = gr.Button("🔁 Variations")
+                    variation_strength = gr.Slider(
+                        minimum=0.1,
+                        maximum=0.9,
+                        value=0.4,
+                        step=0.05,
+                        label="Variation strength (low = closer to the original)"
+                    )
+                    last_request = gr.State(None)
                     
                     # Output gallery
                     gallery = gr.Gallery(
@@ -288,6 +804,20 @@ class ImaGenInterface:
                         label="Example Prompts"
                     )
                     
+                    # Saved images, browsed by thumbnail from the output store index
+                    with gr.Accordion("History", open=False, visible=self.output_store is not None):
+                        with gr.Row():
+                            history_prompt = gr.Textbox(label="Prompt (exact match, empty for all)", scale=3)
+                            history_page = gr.Number(value=0, precision=0, minimum=0, label="Page (from 0)")
+                            history_btn = gr.Button("Show")
+                        history_info = gr.Markdown()
+                        history_gallery = gr.Gallery(columns=6, object_fit="contain", height="auto", show_label=False)
+                    history_btn.click(
+                        fn=self.browse_history,
+                        inputs=[history_prompt, history_page],
+                        outputs=[history_gallery, history_info]
+                    )
+                    
                     # Connect generate button
                     generate_btn.click(
                         fn=self.generate_images,
@@ -297,31 +827,50 @@ class ImaGenInterface:
                             size,
                             guidance_scale,
                             seed,
-                            batch_count
+                            batch_count,
+                            live_preview,
+                            model,
+                            adapter,
+                            adaptive,
+                            allow_resize
                         ],
-                        outputs=[gallery, status_html]
+                        outputs=[gallery, status_html, last_request],
+                        concurrency_limit=CONCURRENCY_LIMIT
                     )
+                    variation_btn.click(
+                        fn=self.generate_variations,
+                        inputs=[last_request, variation_strength],
+                        outputs=[gallery, status_html, last_request],
+                        concurrency_limit=CONCURRENCY_LIMIT
+                    )
+            
+            # Keep the status indicator current while the model loads in the background
+            interface.load(fn=self.get_status_html, outputs=status_html, every=2)
             
             return interface
 
 def main():
-    # Setup logging
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('debug.log'),
-            logging.StreamHandler()
-        ]
-    )
+    # Setup logging; records are written by a background listener thread
+    log_listener = setup_queue_logging('debug.log')
+    
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
     
     # Create output directory if it doesn't exist
     os.makedirs("output", exist_ok=True)
     
-    # Create and launch interface
+    # Create and launch interface; the model keeps loading in the background
     interface = ImaGenInterface()
     app = interface.create_interface()
-    app.launch(share=True)
+    app.launch(share=True, prevent_thread_lock=True)
+    STARTUP.mark("port_open")
+    try:
+        app.block_thread()
+    finally:
+        interface.image_writer.shutdown()
+        if interface.output_store is not None:
+            interface.output_store.close()
+        log_listener.stop()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,9 +1,42 @@
-import os
-import torch
-from pathlib import Path
-from diffusers import DiffusionPipeline
+import argparse
+import hashlib
 import logging
+import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Optional
+
+import requests
+
+from src.model_files import MANIFEST_NAME, build_manifest, read_manifest, sha256_file, write_manifest
+
+MODEL_REPO = "SimianLuo/LCM_Dreamshaper_v7"
+DEFAULT_MIRROR = f"https://huggingface.co/{MODEL_REPO}/resolve/main"
+DEFAULT_MODEL_PATH = Path("models/lcm_dreamshaper/model_files")
+
+# Component files the pipeline loads, used when the mirror has no manifest
+PIPELINE_FILES = [
+    "model_index.json",
+    "scheduler/scheduler_config.json",
+    "text_encoder/config.json",
+    "text_encoder/model.safetensors",
+    "tokenizer/merges.txt",
+    "tokenizer/special_tokens_map.json",
+    "tokenizer/tokenizer_config.json",
+    "tokenizer/vocab.json",
+    "unet/config.json",
+    "unet/diffusion_pytorch_model.safetensors",
+    "vae/config.json",
+    "vae/diffusion_pytorch_model.safetensors",
+    "feature_extractor/preprocessor_config.json",
+    "safety_checker/config.json",
+    "safety_checker/model.safetensors"
+]
+
+CHUNK_SIZE = 1024 * 1024
+RETRIES = 5
 
 def setup_logging():
     """Setup logging configuration"""
@@ -17,43 +50,161 @@ def setup_logging():
     )
     return logging.getLogger(__name__)
 
-def download_model():
-    """Download the LCM Dreamshaper model and save it locally"""
-    logger = setup_logging()
-    
-    # Define model paths
-    base_path = Path("models/lcm_dreamshaper")
-    model_path = base_path / "model_files"
-    
-    # Create directories if they don't exist
+logger = logging.getLogger(__name__)
+
+def fetch_manifest(session: requests.Session, mirror: str) -> Dict[str, Dict]:
+    """File list with sizes and hashes from the mirror
+
+    A mirror serving a model_files directory publishes manifest.json at its
+    root. For the Hugging Face Hub, sizes and LFS SHA-256s come from the tree
+    API; small non-LFS files have no published SHA-256 and are checked by size.
+    """
+    response = session.get(f"{mirror}/{MANIFEST_NAME}", timeout=30)
+    if response.status_code == 200:
+        logger.info(f"Using {MANIFEST_NAME} from {mirror}")
+        return response.json()["files"]
+
+    if mirror != DEFAULT_MIRROR:
+        raise RuntimeError(f"Mirror {mirror} has no {MANIFEST_NAME} (HTTP {response.status_code})")
+
+    files = {}
+    for directory in sorted({os.path.dirname(name) for name in PIPELINE_FILES}):
+        response = session.get(f"https://huggingface.co/api/models/{MODEL_REPO}/tree/main/{directory}", timeout=30)
+        response.raise_for_status()
+        for entry in response.json():
+            if entry.get("path") in PIPELINE_FILES:
+                lfs = entry.get("lfs") or {}
+                files[entry["path"]] = {"size": lfs.get("size", entry.get("size")), "sha256": lfs.get("oid")}
+    missing = set(PIPELINE_FILES) - set(files)
+    if missing:
+        raise RuntimeError(f"Files not found on the Hub: {', '.join(sorted(missing))}")
+    return files
+
+def download_file(mirror: str, name: str, expected: Dict, model_path: Path) -> str:
+    """Stream one file to disk, resuming a partial download; returns its SHA-256"""
+    session = requests.Session()
+    target = model_path / name
+    part = target.with_name(f".{target.name}.part")
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    if target.exists() and target.stat().st_size == expected["size"]:
+        digest = sha256_file(target)
+        if expected.get("sha256") in (None, digest):
+            logger.info(f"{name}: already present")
+            return digest
+        logger.warning(f"{name}: checksum mismatch, downloading again")
+
+    for attempt in range(1, RETRIES + 1):
+        try:
+            digest = hashlib.sha256()
+            offset = part.stat().st_size if part.exists() else 0
+            if offset == expected["size"]:
+                # Fully downloaded before an interruption; a Range request would get a 416
+                existing = sha256_file(part)
+                if expected.get("sha256") in (None, existing):
+                    os.replace(part, target)
+                    logger.info(f"{name}: {offset / (1024 * 1024):.1f} MB verified from partial download")
+                    return existing
+                logger.warning(f"{name}: partial download fails its checksum, downloading again")
+                offset = 0
+            if offset > expected["size"]:
+                offset = 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            with session.get(f"{mirror}/{name}", headers=headers, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                if offset and response.status_code != 206:
+                    # Server ignored the Range header (e.g. python -m http.server); start over
+                    offset = 0
+                with open(part, "r+b" if offset else "wb") as f:
+                    if offset:
+                        # Hash what's already on disk, then keep hashing as new bytes arrive
+                        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                            digest.update(chunk)
+                        f.seek(offset)
+                        f.truncate()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+                        digest.update(chunk)
+
+            size = part.stat().st_size
+            if size != expected["size"]:
+                raise IOError(f"got {size} bytes, expected {expected['size']}")
+            if expected.get("sha256") and digest.hexdigest() != expected["sha256"]:
+                part.unlink()
+                raise IOError("SHA-256 mismatch")
+            os.replace(part, target)
+            logger.info(f"{name}: {size / (1024 * 1024):.1f} MB verified")
+            return digest.hexdigest()
+        except (requests.RequestException, IOError) as e:
+            if attempt == RETRIES:
+                raise
+            logger.warning(f"{name}: attempt {attempt} failed ({str(e)}), retrying")
+            time.sleep(min(2 ** attempt, 30))
+
+def download_model(
+    mirror: Optional[str] = None,
+    model_path: Path = DEFAULT_MODEL_PATH,
+    workers: int = 4
+) -> bool:
+    """Fetch the model files from a mirror straight into ``model_path``
+
+    Files download in parallel, resume from ``.part`` files after an
+    interruption and are checked against the mirror's sizes and SHA-256s.
+    A manifest of what was written is stored next to them for
+    ImageGenerator to verify on load.
+    """
+    mirror = (mirror or os.environ.get("IMAGEN_MODEL_MIRROR") or DEFAULT_MIRROR).rstrip("/")
+    model_path = Path(model_path)
     model_path.mkdir(parents=True, exist_ok=True)
-    
-    logger.info(f"Model will be saved to: {model_path}")
-    
+    logger.info(f"Downloading from {mirror} into {model_path}")
+
     try:
-        # Download model
-        logger.info("Downloading LCM Dreamshaper model...")
-        model = DiffusionPipeline.from_pretrained(
-            "SimianLuo/LCM_Dreamshaper_v7",
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            use_safetensors=True
-        )
-        
-        # Save model locally
-        logger.info("Saving model locally...")
-        model.save_pretrained(model_path)
-        
-        logger.info("Model downloaded and saved successfully!")
+        files = fetch_manifest(requests.Session(), mirror)
+        start = time.perf_counter()
+        hashes = {}
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {
+                executor.submit(download_file, mirror, name, expected, model_path): name
+                for name, expected in files.items()
+            }
+            for future in as_completed(futures):
+                hashes[futures[future]] = future.result()
+
+        write_manifest(model_path, {name: {"size": files[name]["size"], "sha256": hashes[name]} for name in files})
+        total = sum(entry["size"] for entry in files.values())
+        elapsed = time.perf_counter() - start
+        logger.info(f"Model downloaded and verified: {total / (1024 ** 3):.2f} GB in {elapsed:.0f}s")
         return True
-        
+
     except Exception as e:
         logger.error(f"Error downloading model: {str(e)}")
         logger.error("Full traceback:", exc_info=True)
         return False
 
-if __name__ == "__main__":
-    if download_model():
+def main():
+    parser = argparse.ArgumentParser(description="Download the LCM Dreamshaper model files")
+    parser.add_argument("--mirror", default=None, help=f"Base URL serving the model files (default: IMAGEN_MODEL_MIRROR or {DEFAULT_MIRROR})")
+    parser.add_argument("--output", default=str(DEFAULT_MODEL_PATH), help="Directory for the model files")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel downloads")
+    parser.add_argument("--write-manifest", action="store_true", help=f"Hash an existing model directory into {MANIFEST_NAME} (e.g. to serve it as a mirror) and exit")
+    args = parser.parse_args()
+
+    setup_logging()
+    if args.write_manifest:
+        files = build_manifest(Path(args.output))
+        path = write_manifest(Path(args.output), files)
+        print(f"Wrote {path} ({len(files)} files)")
+        return
+
+    if read_manifest(Path(args.output)) is None and (Path(args.output) / "model_index.json").exists():
+        logger.info("Existing files without a manifest; they will be verified against the mirror")
+
+    if download_model(args.mirror, Path(args.output), args.workers):
         print("\nLCM Dreamshaper model downloaded successfully!")
         print("You can now run the application and it will use the local model.")
     else:
-        print("\nFailed to download model. Please check the logs for details.") 
\ No newline at end of file
+        print("\nFailed to download model. Please check the logs for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
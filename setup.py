@@ -1,8 +1,6 @@
 import os
 import subprocess
 import sys
-import webbrowser
-from pathlib import Path
 import logging
 
 # Setup logging
@@ -30,8 +28,11 @@ def install_requirements():
         "diffusers>=0.33.1",
         "transformers>=4.36.0",
         "accelerate>=0.25.0",
+        "peft>=0.7.0",
         "gradio>=3.41.2",
-        "pillow>=10.0.0"
+        "pillow>=10.0.0",
+        "requests>=2.28.0",
+        "psutil>=5.9.0"
     ]
     
     logger.info("Installing requirements...")
@@ -47,11 +48,9 @@ def create_run_script():
     """Create a run.py script that launches the application"""
     run_script = """
 import os
-import webbrowser
 import time
 import subprocess
 import sys
-from pathlib import Path
 
 def run_app():
     # Get the directory of run.py
@@ -84,45 +83,6 @@ if __name__ == "__main__":
         f.write(run_script)
     logger.info("Created run.py script")
 
-def create_model_downloader():
-    """Create the model downloader script"""
-    downloader_script = """
-import os
-import logging
-from huggingface_hub import snapshot_download
-from pathlib import Path
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-def download_model():
-    model_id = "SimianLuo/LCM_Dreamshaper_v7"
-    local_dir = "models/lcm_dreamshaper"
-    
-    logger.info(f"Downloading model {model_id}...")
-    try:
-        snapshot_download(
-            repo_id=model_id,
-            local_dir=local_dir,
-            local_dir_use_symlinks=False
-        )
-        logger.info("Model downloaded successfully!")
-    except Exception as e:
-        logger.error(f"Failed to download model: {str(e)}")
-        raise
-
-if __name__ == "__main__":
-    download_model()
-"""
-    
-    with open("model_downloader.py", "w") as f:
-        f.write(downloader_script)
-    logger.info("Created model_downloader.py script")
-
 def main():
     """Main setup function"""
     try:
@@ -137,9 +97,6 @@ def main():
         # Create run script
         create_run_script()
         
-        # Create model downloader
-        create_model_downloader()
-        
         # Download the model
         logger.info("Downloading model...")
         subprocess.check_call([sys.executable, "model_downloader.py"])
@@ -0,0 +1,131 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from .metrics import QUALITY_REDUCED
+from .scheduler import request_cost
+
+# Resolution steps tried when a request allows a smaller size
+SCALE_STEP = 0.125
+
+
+class QualityDecision(NamedTuple):
+    """Settings a request is run with, next to what it asked for"""
+    steps: int
+    width: int
+    height: int
+    requested_steps: int
+    requested_width: int
+    requested_height: int
+    predicted_s: Optional[float] = None
+
+    @property
+    def reduced(self) -> bool:
+        return (self.steps, self.width, self.height) != (self.requested_steps, self.requested_width, self.requested_height)
+
+
+def scale_size(width: int, height: int, scale: float, multiple: int = 64, minimum: int = 256) -> Tuple[int, int]:
+    """``width`` x ``height`` scaled down, keeping the aspect ratio on a ``multiple`` grid"""
+    def side(value: int) -> int:
+        scaled = max(minimum, int(value * scale) // multiple * multiple)
+        return min(value, scaled)
+    return side(width), side(height)
+
+
+class AdaptiveQuality:
+    """Lowers steps, then resolution, under load so requests meet a p95 latency target
+
+    A request's latency is predicted by ``estimate_latency(cost)``: the work
+    already queued or running plus its own, at the recently measured speed.
+    The prediction is scaled by how actual latencies compared with earlier
+    predictions. While the measured p95 is over the target, the budget
+    shrinks by the same ratio, so the policy gets stricter until it catches
+    up. The highest quality predicted to fit wins, which is full quality
+    whenever the server is quiet.
+    """
+
+    def __init__(
+        self,
+        estimate_latency: Callable[[float], Optional[float]],
+        target_p95_s: float = 30.0,
+        min_steps: int = 4,
+        min_scale: float = 0.5,
+        window: int = 200
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.estimate_latency = estimate_latency
+        # 0 disables adaptation
+        self.target_p95_s = max(0.0, float(target_p95_s))
+        self.min_steps = max(1, int(min_steps))
+        self.min_scale = min(1.0, max(SCALE_STEP, float(min_scale)))
+        self._latencies = deque(maxlen=window)
+        # Moving average of actual / predicted latency
+        self._calibration = 1.0
+        self._lock = threading.Lock()
+
+    def p95(self) -> Optional[float]:
+        with self._lock:
+            if not self._latencies:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def record(self, decision: QualityDecision, latency_s: float):
+        """Report how long a generated (not cached) request actually took"""
+        with self._lock:
+            self._latencies.append(latency_s)
+            if decision.predicted_s:
+                ratio = min(10.0, max(0.1, latency_s / decision.predicted_s))
+                self._calibration = 0.8 * self._calibration + 0.2 * ratio
+
+    def _budget(self) -> float:
+        p95 = self.p95()
+        if p95 is None or p95 <= self.target_p95_s:
+            return self.target_p95_s
+        return self.target_p95_s * self.target_p95_s / p95
+
+    def _predict(self, steps: int, width: int, height: int, count: int) -> Optional[float]:
+        estimate = self.estimate_latency(request_cost(steps, width, height, count))
+        return None if estimate is None else estimate * self._calibration
+
+    def choose(self, steps: int, width: int, height: int, count: int, allow_resize: bool = False) -> QualityDecision:
+        """The best steps and size for a request that should finish within the target"""
+        requested = (steps, width, height)
+        predicted = self._predict(steps, width, height, count)
+        if not self.target_p95_s or predicted is None:
+            return QualityDecision(*requested, *requested, predicted)
+
+        budget = self._budget()
+        candidates = [(s, width, height) for s in range(steps, min(steps, self.min_steps) - 1, -1)]
+        if allow_resize:
+            floor = candidates[-1][0]
+            scale = 1.0 - SCALE_STEP
+            while scale >= self.min_scale - 1e-6:
+                size = scale_size(width, height, scale)
+                if size != candidates[-1][1:]:
+                    candidates.append((floor, *size))
+                scale -= SCALE_STEP
+
+        # Falls through to the cheapest allowed option if nothing fits
+        for candidate in candidates:
+            predicted = self._predict(*candidate, count)
+            if predicted is not None and predicted <= budget:
+                break
+        decision = QualityDecision(*candidate, *requested, predicted)
+        if decision.reduced:
+            if decision.steps != steps:
+                QUALITY_REDUCED.inc(kind="steps")
+            if (decision.width, decision.height) != (width, height):
+                QUALITY_REDUCED.inc(kind="resolution")
+            self.logger.info(f"Load: running {steps} steps at {width}x{height} as {decision.steps} steps at {decision.width}x{decision.height} (predicted {predicted:.1f}s, budget {budget:.1f}s)")
+        return decision
+
+    def stats(self) -> Dict[str, float]:
+        p95 = self.p95()
+        return {
+            "target_p95_seconds": self.target_p95_s,
+            "p95_seconds": p95 if p95 is not None else 0.0,
+            "calibration": self._calibration,
+            "samples": len(self._latencies)
+        }
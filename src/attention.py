@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import platform
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import psutil
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Tried in this order when a shape has no measurements yet: fastest first
+ATTENTION_BACKENDS = ("sdpa", "full", "sliced")
+
+# Fraction of the currently free memory an attention choice may plan to use
+MEMORY_HEADROOM = 0.8
+
+# SD 1.x UNet: 8 heads everywhere, 320 channels at the full-latent-resolution level
+_HEADS = 8
+_CHANNELS = 320
+
+
+def available_backends() -> List[str]:
+    if hasattr(torch.nn.functional, "scaled_dot_product_attention"):
+        return list(ATTENTION_BACKENDS)
+    return [b for b in ATTENTION_BACKENDS if b != "sdpa"]
+
+
+def host_key(device: str) -> str:
+    """Identify the kind of machine a measurement was taken on"""
+    total_gb = round(psutil.virtual_memory().total / (1024 ** 3))
+    if device == "cuda":
+        return f"{torch.cuda.get_device_name()}-{round(torch.cuda.mem_get_info()[1] / (1024 ** 3))}GB"
+    return f"{platform.machine()}-{os.cpu_count()}cpu-{total_gb}GB"
+
+
+def free_memory_bytes(device: str) -> int:
+    if device == "cuda":
+        return torch.cuda.mem_get_info()[0]
+    return psutil.virtual_memory().available
+
+
+def estimate_attention_bytes(backend: str, width: int, height: int, batch: int, element_size: int = 4) -> int:
+    """Approximate peak memory of the largest UNet self-attention
+
+    Full attention materializes the (tokens x tokens) scores and their
+    softmax for every head at once; sliced attention does one head at a
+    time; SDPA's fused kernel never holds the whole score matrix.
+    """
+    tokens = (width // 8) * (height // 8)
+    if backend == "full":
+        return tokens * tokens * batch * _HEADS * element_size * 2
+    if backend == "sliced":
+        return tokens * tokens * element_size * 2
+    return tokens * batch * _CHANNELS * element_size * 4
+
+
+def apply_attention_backend(pipeline, backend: str):
+    """Switch the UNet and VAE attention processors in place"""
+    from diffusers.models.attention_processor import AttnProcessor, AttnProcessor2_0
+
+    processor = AttnProcessor2_0() if "sdpa" in available_backends() else AttnProcessor()
+    if backend == "full":
+        processor = AttnProcessor()
+    pipeline.vae.set_attn_processor(processor)
+    if backend == "sliced":
+        # One head at a time: the smallest attention footprint diffusers offers
+        pipeline.unet.set_attention_slice("max")
+    else:
+        pipeline.unet.set_attn_processor(processor)
+
+
+class PeakMemory:
+    """Peak memory growth over a block: allocator stats on CUDA, sampled RSS on CPU"""
+
+    def __init__(self, device: str, interval: float = 0.01):
+        self.device = device
+        self.interval = interval
+        self.peak_bytes = 0
+        self._process = psutil.Process(os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = 0
+
+    def __enter__(self):
+        if self.device == "cuda":
+            torch.cuda.reset_peak_memory_stats()
+            self._start = torch.cuda.memory_allocated()
+            return self
+        self._start = self._process.memory_info().rss
+        self._peak = self._start
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name="imagen-peak-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device == "cuda":
+            self.peak_bytes = torch.cuda.max_memory_allocated() - self._start
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(0, self._peak - self._start)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self._peak = max(self._peak, self._process.memory_info().rss)
+            time.sleep(self.interval)
+
+
+class AttentionSelector:
+    """Chooses an attention backend per (host, model, resolution, batch)
+
+    Measured seconds-per-step and peak memory growth are kept in a JSON
+    profile. For a shape with measurements, the fastest backend whose
+    measured peak fits in the free memory wins; otherwise the first
+    backend whose estimate fits is used and measured on that call.
+    """
+
+    def __init__(self, profile_path: str = "cache/attention_profile.json", forced: Optional[str] = None):
+        self.profile_path = Path(profile_path)
+        self.forced = forced if forced in ATTENTION_BACKENDS else None
+        self._lock = threading.Lock()
+        self._profile: Dict[str, Dict[str, Dict[str, float]]] = self._load()
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.profile_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable attention profile {self.profile_path}: {str(e)}")
+            return {}
+
+    def _save(self):
+        self.profile_path.parent.mkdir(parents=True, exist_ok=True)
+        # Merge with what other processes may have written since we loaded
+        on_disk = self._load()
+        for key, entries in self._profile.items():
+            on_disk.setdefault(key, {}).update(entries)
+        self._profile = on_disk
+        tmp_path = self.profile_path.with_name(f".{self.profile_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._profile, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.profile_path)
+
+    @staticmethod
+    def shape_key(device: str, model: str, width: int, height: int, batch: int) -> str:
+        return f"{host_key(device)}|{model}|{width}x{height}x{batch}"
+
+    def measurements(self, key: str) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return dict(self._profile.get(key, {}))
+
+    def choose(self, key: str, device: str, width: int, height: int, batch: int, element_size: int = 4) -> str:
+        if self.forced:
+            return self.forced
+        budget = free_memory_bytes(device) * MEMORY_HEADROOM
+        measured = self.measurements(key)
+        fitting = [b for b in available_backends() if b in measured and measured[b]["peak_bytes"] <= budget]
+        if fitting:
+            return min(fitting, key=lambda b: measured[b]["seconds_per_step"])
+        for backend in available_backends():
+            if backend not in measured and estimate_attention_bytes(backend, width, height, batch, element_size) <= budget:
+                return backend
+        return "sliced"
+
+    def record(self, key: str, backend: str, seconds_per_step: float, peak_bytes: int):
+        with self._lock:
+            self._profile.setdefault(key, {})[backend] = {
+                "seconds_per_step": round(seconds_per_step, 5),
+                "peak_bytes": int(peak_bytes)
+            }
+            try:
+                self._save()
+            except Exception as e:
+                logger.error(f"Error saving attention profile: {str(e)}")
+        logger.info(f"Attention profile {key}: {backend} {seconds_per_step:.3f}s/step, peak +{peak_bytes / (1024 * 1024):.0f}MB")
@@ -0,0 +1,271 @@
+import argparse
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .image_writer import OUTPUT_EXTENSIONS, encode_options
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+class BulkItem:
+    """One prompt line from the input file with its resolved parameters"""
+
+    def __init__(self, line: int, record: Dict, prompt_field: str, defaults: Dict, base_seed: int):
+        self.line = line
+        self.id = str(record.get("id", line))
+        self.prompt = str(record[prompt_field])
+        self.steps = int(record.get("steps", defaults["steps"]))
+        self.guidance_scale = float(record.get("guidance_scale", defaults["guidance_scale"]))
+        self.width = int(record.get("width", defaults["width"]))
+        self.height = int(record.get("height", defaults["height"]))
+        self.model = record.get("model", defaults.get("model"))
+        self.adapter = record.get("adapter", defaults.get("adapter"))
+        # Derived from the line number so a resumed run reproduces the same images
+        self.seed = int(record.get("seed", base_seed + line))
+
+    @property
+    def bucket(self) -> Tuple[Optional[str], Optional[str], int, int, int, float]:
+        return (self.model, self.adapter, self.width, self.height, self.steps, self.guidance_scale)
+
+
+def read_completed(manifest_path: Path) -> Set[int]:
+    """Input line numbers already recorded in the manifest"""
+    completed = set()
+    if not manifest_path.exists():
+        return completed
+    with open(manifest_path, encoding="utf-8") as f:
+        for raw in f:
+            try:
+                completed.add(json.loads(raw)["line"])
+            except (ValueError, KeyError, TypeError):
+                # A torn final line from an interrupted run; that item is redone
+                continue
+    return completed
+
+
+def iter_items(
+    input_path: Path,
+    prompt_field: str,
+    defaults: Dict,
+    base_seed: int,
+    completed: Set[int]
+) -> Iterator[BulkItem]:
+    """Stream not-yet-completed items from a JSONL file"""
+    with open(input_path, encoding="utf-8") as f:
+        for line, raw in enumerate(f):
+            if line in completed or not raw.strip():
+                continue
+            try:
+                record = json.loads(raw)
+                if not isinstance(record, dict):
+                    raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+                item = BulkItem(line, record, prompt_field, defaults, base_seed)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                # e.g. a missing prompt or "seed": null
+                logger.error(f"Skipping line {line}: {str(e)}")
+                continue
+            yield item
+
+
+class BulkRunner:
+    """Headless generation of a JSONL prompt file into sharded outputs
+
+    Items are grouped by (model, adapter, width, height, steps, guidance
+    scale) and sent to ``ImageGenerator.generate_batch`` in full batches.
+    Images are saved on a thread pool as ``<output_dir>/shard_<n>/<line>.<ext>``;
+    once an image is on disk its entry is appended to ``manifest.jsonl``, which doubles as
+    the checkpoint: rerunning with the same output directory skips every
+    line already listed.
+    """
+
+    def __init__(
+        self,
+        generator,
+        output_dir: str,
+        batch_size: int = 4,
+        shard_size: int = 1000,
+        fmt: str = "png",
+        quality: int = 90,
+        compress_level: int = 6,
+        writer_threads: int = 2
+    ):
+        self.generator = generator
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = max(1, int(batch_size))
+        self.shard_size = max(1, int(shard_size))
+        self.fmt = fmt.lower()
+        self.save_kwargs = encode_options(self.fmt, quality, compress_level)
+        self.extension = OUTPUT_EXTENSIONS[self.fmt]
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(writer_threads)), thread_name_prefix="imagen-bulk-writer")
+        self._pending: List[Future] = []
+        self._manifest = None
+        self.generated = 0
+        self.failed = 0
+
+    def _path_for(self, item: BulkItem) -> Path:
+        shard = self.output_dir / f"shard_{item.line // self.shard_size:05d}"
+        return shard / f"{item.line:08d}.{self.extension}"
+
+    def _save(self, item: BulkItem, image) -> Dict:
+        path = self._path_for(item)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        if self.fmt == "jpeg" and image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(tmp_path, **self.save_kwargs)
+        os.replace(tmp_path, path)
+        return {
+            "line": item.line,
+            "id": item.id,
+            "prompt": item.prompt,
+            "seed": item.seed,
+            "steps": item.steps,
+            "guidance_scale": item.guidance_scale,
+            "width": item.width,
+            "height": item.height,
+            "model": item.model,
+            "adapter": item.adapter,
+            "path": str(path.relative_to(self.output_dir))
+        }
+
+    def _drain(self, wait: bool):
+        """Append finished saves to the manifest (in completion order)"""
+        still_pending = []
+        for future in self._pending:
+            if not wait and not future.done():
+                still_pending.append(future)
+                continue
+            try:
+                entry = future.result()
+                self._manifest.write(json.dumps(entry) + "\n")
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Error saving image: {str(e)}")
+        self._pending = still_pending
+        self._manifest.flush()
+        os.fsync(self._manifest.fileno())
+
+    def _run_batch(self, items: List[BulkItem]):
+        model, adapter, width, height, steps, guidance_scale = items[0].bucket
+        images = self.generator.generate_batch(
+            prompts=[item.prompt for item in items],
+            seeds=[item.seed for item in items],
+            steps=steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height,
+            model=model,
+            adapter=adapter
+        )
+        if not images:
+            self.failed += len(items)
+            logger.error(f"Batch of {len(items)} failed (lines {items[0].line}..{items[-1].line}); they will be retried on resume")
+            return
+        for item, image in zip(items, images):
+            self._pending.append(self._executor.submit(self._save, item, image))
+        self.generated += len(items)
+        self._drain(wait=False)
+
+    def run(
+        self,
+        input_path: str,
+        prompt_field: str = "prompt",
+        defaults: Optional[Dict] = None,
+        base_seed: int = 0,
+        limit: Optional[int] = None
+    ) -> Dict[str, int]:
+        """Generate every outstanding item; returns generated/failed/skipped counts"""
+        defaults = {"steps": 4, "guidance_scale": 1.0, "width": 512, "height": 512, **(defaults or {})}
+        completed = read_completed(self.manifest_path)
+        if completed:
+            logger.info(f"Resuming: {len(completed)} item(s) already in {self.manifest_path}")
+
+        # Buckets fill as the file streams; each is flushed as soon as it holds a full batch
+        buckets: "OrderedDict[Tuple, List[BulkItem]]" = OrderedDict()
+        start = time.perf_counter()
+        seen = 0
+        self._manifest = open(self.manifest_path, "a", encoding="utf-8")
+        if self._manifest.tell() > 0:
+            with open(self.manifest_path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn final line so new entries start cleanly
+                    self._manifest.write("\n")
+        try:
+            for item in iter_items(Path(input_path), prompt_field, defaults, base_seed, completed):
+                if limit is not None and seen >= limit:
+                    break
+                seen += 1
+                bucket = buckets.setdefault(item.bucket, [])
+                bucket.append(item)
+                if len(bucket) >= self.batch_size:
+                    self._run_batch(buckets.pop(item.bucket))
+                    elapsed = time.perf_counter() - start
+                    logger.info(f"{self.generated} generated, {self.failed} failed, {self.generated / elapsed:.2f} images/s")
+
+            # Remaining partial batches
+            for items in buckets.values():
+                self._run_batch(items)
+        finally:
+            self._drain(wait=True)
+            self._manifest.close()
+            self._executor.shutdown(wait=True)
+
+        summary = {"generated": self.generated, "failed": self.failed, "skipped": len(completed)}
+        logger.info(f"Bulk run finished: {summary}")
+        return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate images for every prompt in a JSONL file")
+    parser.add_argument("input", help="JSONL file, one object per line with at least a prompt")
+    parser.add_argument("output_dir", help="Directory for shards and manifest.jsonl (reuse it to resume)")
+    parser.add_argument("--prompt-field", default="prompt", help="Key holding the prompt text")
+    parser.add_argument("--batch-size", type=int, default=4, help="Images per pipeline call")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Input lines per output shard directory")
+    parser.add_argument("--steps", type=int, default=4, help="Default steps when a line has none")
+    parser.add_argument("--guidance-scale", type=float, default=1.0, help="Default guidance scale")
+    parser.add_argument("--width", type=int, default=512, help="Default width")
+    parser.add_argument("--height", type=int, default=512, help="Default height")
+    parser.add_argument("--model", default=None, help="Default checkpoint name when a line has none")
+    parser.add_argument("--adapter", default=None, help="Default LoRA adapter when a line has none")
+    parser.add_argument("--seed", type=int, default=0, help="Base seed; line N without a seed uses seed+N")
+    parser.add_argument("--format", default="png", choices=list(OUTPUT_EXTENSIONS), help="Output image format")
+    parser.add_argument("--quality", type=int, default=90, help="WebP/JPEG quality")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many new items")
+    args = parser.parse_args()
+
+    from .generator import ImageGenerator
+    from .utils import setup_queue_logging
+
+    listener = setup_queue_logging('bulk.log')
+    try:
+        generator = ImageGenerator()
+        if not generator.load_model():
+            raise SystemExit("Failed to load model. Please run model_downloader.py first.")
+        runner = BulkRunner(generator, args.output_dir, batch_size=args.batch_size, shard_size=args.shard_size, fmt=args.format, quality=args.quality)
+        runner.run(
+            args.input,
+            prompt_field=args.prompt_field,
+            defaults={"steps": args.steps, "guidance_scale": args.guidance_scale, "width": args.width, "height": args.height, "model": args.model, "adapter": args.adapter},
+            base_seed=args.seed,
+            limit=args.limit
+        )
+        generator.cleanup()
+    finally:
+        listener.stop()
+
+
+if __name__ == "__main__":
+    main()
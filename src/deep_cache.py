@@ -0,0 +1,92 @@
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+class DeepCache:
+    """Reuse the deep UNet features of a full step on the steps after it (DeepCache)
+
+    Every ``interval`` steps the UNet runs in full and the outputs of every
+    block except the shallowest down and up blocks are kept. On the steps in
+    between those blocks return their kept outputs without computing, so
+    only ``conv_in``, the first down block, the last up block and
+    ``conv_out`` run. The last up block combines the stale deep features
+    with fresh shallow skip connections. Installed for the length of one
+    pipeline call, since the kept features belong to that call's latents.
+    """
+
+    def __init__(self, unet: torch.nn.Module, interval: int):
+        self.unet = unet
+        self.interval = max(1, int(interval))
+        self.full_steps = 0
+        self.partial_steps = 0
+        self._step = 0
+        self._reuse = False
+        self._outputs: Dict[str, object] = {}
+        self._originals: List[Tuple[torch.nn.Module, Optional[object]]] = []
+        self._hook = None
+
+    def _cached_blocks(self) -> Dict[str, torch.nn.Module]:
+        blocks = {f"down_blocks.{i}": block for i, block in enumerate(self.unet.down_blocks) if i > 0}
+        if self.unet.mid_block is not None:
+            blocks["mid_block"] = self.unet.mid_block
+        blocks.update({f"up_blocks.{i}": block for i, block in enumerate(self.unet.up_blocks[:-1])})
+        return blocks
+
+    def _wrap(self, name: str, module: torch.nn.Module):
+        # An instance-level forward (another wrapper) is restored as is; otherwise the class's
+        self._originals.append((module, module.__dict__.get("forward")))
+        original = module.forward
+
+        def forward(*args, **kwargs):
+            if self._reuse:
+                return self._outputs[name]
+            output = original(*args, **kwargs)
+            self._outputs[name] = output
+            return output
+
+        module.forward = forward
+
+    def _before_step(self, module, args):
+        self._reuse = self._step % self.interval != 0
+        self._step += 1
+        if self._reuse:
+            self.partial_steps += 1
+        else:
+            self.full_steps += 1
+
+    def install(self):
+        for name, module in self._cached_blocks().items():
+            self._wrap(name, module)
+        self._hook = self.unet.register_forward_pre_hook(self._before_step)
+
+    def remove(self):
+        if self._hook is not None:
+            self._hook.remove()
+            self._hook = None
+        for module, forward in self._originals:
+            if forward is None:
+                del module.forward
+            else:
+                module.forward = forward
+        self._originals = []
+        self._outputs = {}
+
+
+@contextmanager
+def deep_cache(unet: torch.nn.Module, interval: int):
+    """DeepCache on ``unet`` for the duration of the block; a no-op for ``interval`` <= 1"""
+    if interval <= 1:
+        yield None
+        return
+    cache = DeepCache(unet, interval)
+    cache.install()
+    try:
+        yield cache
+    finally:
+        cache.remove()
+        logger.debug(f"DeepCache: {cache.full_steps} full, {cache.partial_steps} partial UNet step(s)")
@@ -1,11 +1,29 @@
 import torch
 import logging
+import queue
+import random
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from diffusers import DiffusionPipeline, LatentConsistencyModelPipeline
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from PIL import Image
+from .prompt_cache import PromptEmbeddingCache, normalize_prompt
+from .tensor_cache import TensorCache
+from .previews import latents_to_rgb
+from .metrics import GENERATION_ERRORS, GENERATIONS_CANCELLED, IMAGES_GENERATED, observe_stage, timed
+from .vae_decode import configure_vae_decode
+from .model_files import verify_model_files
+from .lora import AdapterManager
+from .attention import AttentionSelector, PeakMemory, apply_attention_backend, available_backends
+from .thread_tuning import ThreadTuner
+from .deep_cache import deep_cache
+from .token_merging import merge_ratio_for, parse_merge_ratios, token_merging
 import os
-import sys
-import gradio as gr
+
+class GenerationCancelled(Exception):
+    """Raised from the step callback to abort a pipeline call nobody is waiting for"""
+
 
 class ImageGenerator:
     _instance = None
@@ -20,29 +38,22 @@ class ImageGenerator:
         if self._initialized:
             return
             
-        # Setup logging
+        # Setup logging; handlers are configured once by the application
+        # (see utils.setup_queue_logging) so records are written off-thread
         self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG)
-        
-        # Create formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        
-        # Create console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setFormatter(formatter)
-        self.logger.addHandler(console_handler)
-        
-        # Create file handler
-        file_handler = logging.FileHandler('debug.log')
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
         
         self.logger.info("ImageGenerator initialized")
         
-        # Initialize paths
+        # Initialize paths; model_path follows the active model once a registry is loaded
         self.base_model_path = Path("models/lcm_dreamshaper")
         self.model_path = self.base_model_path / "model_files"
         
+        # Checkpoints by name, loaded on demand within IMAGEN_MODEL_MEMORY_MB
+        self.registry = None
+        self.default_model = None
+        self.active_model = None
+        self._load_options = {}
+        
         # Set device
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.logger.debug(f"Device: {self.device}")
@@ -50,47 +61,137 @@ class ImageGenerator:
         # Initialize model as None
         self.model = None
         
+        # Uncompiled (unet, vae decoder) per model name, kept for fallback when optimizing
+        self._eager_modules = {}
+        self._optimized = set()
+        
+        # Int8 quantization mode of the loaded model, if any
+        self.quantize = None
+        
+        # Pipeline calls mutate scheduler state, so only one may run at a time
+        self._pipeline_lock = threading.Lock()
+        
+        # Above this estimated decode footprint the VAE switches to sliced/tiled decoding
+        self.vae_memory_budget = int(os.environ.get("IMAGEN_VAE_MEMORY_BUDGET_MB", "1024")) * 1024 * 1024
+        
+        # Attention backend per batch shape; "auto" picks from measured/estimated memory and speed
+        self.attention = AttentionSelector(
+            profile_path=os.environ.get("IMAGEN_ATTENTION_PROFILE", "cache/attention_profile.json"),
+            forced=os.environ.get("IMAGEN_ATTENTION", "auto").lower()
+        )
+        self._attention_backend = None
+        self._attention_override = None
+        
+        # Tuned CPU thread settings for this host: IMAGEN_THREAD_TUNING=off, auto (tune once) or retune
+        self.thread_tuning = os.environ.get("IMAGEN_THREAD_TUNING", "off").lower()
+        self.thread_tuner = ThreadTuner(os.environ.get("IMAGEN_THREAD_PROFILE", "cache/thread_profile.json"))
+        self.thread_profile = None
+        
+        # DeepCache: the full UNet runs every N steps and deep block outputs are reused
+        # in between (0 or 1 = off), for calls of at least IMAGEN_DEEPCACHE_MIN_STEPS steps
+        self.deep_cache_interval = int(os.environ.get("IMAGEN_DEEPCACHE_INTERVAL", "0"))
+        self.deep_cache_min_steps = int(os.environ.get("IMAGEN_DEEPCACHE_MIN_STEPS", "8"))
+        
+        # Token merging for UNet self-attention, ratio by image size, e.g. "768:0.3,1024:0.5" (unset = off)
+        self.token_merge_setting = os.environ.get("IMAGEN_TOME_RATIO", "").strip()
+        self.token_merge_ratios = parse_merge_ratios(self.token_merge_setting)
+        
+        # LoRA style adapters, applied to the UNet in place from cached fused deltas
+        self.adapters = AdapterManager(
+            lora_dir=Path(os.environ.get("IMAGEN_LORA_DIR", "models/loras")),
+            max_bytes=int(os.environ.get("IMAGEN_LORA_CACHE_MB", "1024")) * 1024 * 1024
+        )
+        
+        # Final latents of recent seeded results, for cheap variations
+        self.latent_cache = TensorCache(
+            max_bytes=int(os.environ.get("IMAGEN_LATENT_CACHE_MB", "64")) * 1024 * 1024
+        )
+        self._img2img = None
+        
+        # Text-encoder outputs keyed by (model identity, normalized prompt)
+        self.prompt_cache = PromptEmbeddingCache(
+            max_bytes=int(os.environ.get("IMAGEN_PROMPT_CACHE_MB", "64")) * 1024 * 1024
+        )
+        
         self._initialized = True
     
-    def _verify_model_files(self) -> bool:
-        """Verify if model files exist in the local directory"""
-        required_files = [
-            "model_index.json",
-            "scheduler/scheduler_config.json",
-            "text_encoder/config.json",
-            "tokenizer/vocab.json",
-            "unet/config.json",
-            "vae/config.json"
-        ]
+    def _verify_model_files(self, model_path: Optional[Path] = None) -> bool:
+        """Check the model files against the manifest written by model_downloader.py
         
+        Sizes are always compared; set IMAGEN_VERIFY_HASHES=1 to re-hash
+        every file as well.
+        """
         self.logger.debug("Verifying model files...")
-        for file in required_files:
-            exists = (self.model_path / file).exists()
-            self.logger.debug(f"Checking {file}: {'✓' if exists else '✗'}")
-            if not exists:
-                self.logger.error(f"Missing required file: {file}")
-                return False
-        return True
+        problems = verify_model_files(model_path or self.model_path, check_hashes=os.environ.get("IMAGEN_VERIFY_HASHES", "0") == "1")
+        for problem in problems:
+            self.logger.error(f"Model file check failed: {problem}")
+        return not problems
     
-    def load_model(self) -> bool:
-        """Load the model from local files"""
+    def load_model(
+        self,
+        mmap_weights: bool = False,
+        optimize: bool = False,
+        compile_modules: bool = True,
+        quantize: Optional[str] = None
+    ) -> bool:
+        """Load the model from local files
+        
+        With ``mmap_weights`` (CPU only) the UNet, VAE and text encoder
+        tensors are views into memory-mapped safetensors files, so several
+        processes loading the same model share one copy in RAM.
+        
+        ``optimize`` switches the UNet and VAE to channels_last and, with
+        ``compile_modules``, wraps them in torch.compile. Call warm_up()
+        afterwards so compilation happens before the first real request.
+        
+        ``quantize`` ("dynamic" or "weight_only", CPU only) swaps in int8
+        UNet and text encoder modules, converted once and cached on disk.
+        """
         try:
-            if not self._verify_model_files():
-                self.logger.error("Model files not found. Please run model_downloader.py first.")
-                return False
+            from .model_files import discover_models
+            from .model_registry import ModelRegistry
             
-            self.logger.info("Loading model from local files...")
-            self.model = LatentConsistencyModelPipeline.from_pretrained(
-                self.model_path,
-                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
-                local_files_only=True
-            )
+            self.quantize = None
+            if quantize and self.device == "cpu":
+                from .quantization import effective_mode
+                # The mode actually applied names the cache and the model identity
+                self.quantize = effective_mode(quantize)
+            elif quantize:
+                self.logger.warning("Int8 quantization is CPU-only, loading the full-precision model")
+            self._load_options = {"mmap_weights": mmap_weights, "optimize": optimize, "compile_modules": compile_modules}
+            self._tune_threads()
+            
+            # Swapping the registry under the lock keeps a reload from pulling the model
+            # out from under a batch that is still running
+            with self._pipeline_lock:
+                if self.registry is not None:
+                    self.registry.clear()
+                self.registry = ModelRegistry(
+                    self._load_pipeline,
+                    memory_budget_bytes=int(os.environ.get("IMAGEN_MODEL_MEMORY_MB", "0")) * 1024 * 1024,
+                    fingerprint_suffix=f":int8-{self.quantize}" if self.quantize else "",
+                    on_evict=self._forget_model
+                )
+                # model_path as set before loading is the default model; others are found under models/
+                self.default_model = self.model_path.parent.name
+                for name, path in discover_models(self.base_model_path.parent).items():
+                    self.registry.register(name, path)
+                self.registry.register(self.default_model, self.model_path)
+                self.default_model = os.environ.get("IMAGEN_DEFAULT_MODEL", self.default_model)
+            
+                self.model = None
+                self.active_model = None
+                self.prompt_cache.clear()
+                self._eager_modules = {}
+                self._optimized = set()
+                if not self._activate(self.default_model):
+                    return False
             
-            if self.device == "cuda":
-                self.model = self.model.to("cuda")
+                # Start from the backend the default 512x512 single-image shape would use
+                self._select_attention(512, 512, 1)
             
             # LCM doesn't need eval() mode
-            self.logger.info("Model loaded successfully")
+            self.logger.info(f"Model loaded successfully ({len(self.registry.names())} available: {', '.join(self.registry.names())})")
             return True
             
         except Exception as e:
@@ -98,46 +199,595 @@ class ImageGenerator:
             self.logger.error("Full traceback:", exc_info=True)
             return False
     
+    def _tune_threads(self):
+        """Apply this host's tuned thread settings, tuning first if it has none
+        
+        Runs before the model is loaded, since inter-op threads can only be
+        set before PyTorch's first parallel op.
+        """
+        if self.device != "cpu" or self.thread_tuning not in ("auto", "retune") or self.thread_profile is not None:
+            return
+        entry = None if self.thread_tuning == "retune" else self.thread_tuner.profile()
+        if entry is None:
+            sizes = [int(v) for v in os.environ.get("IMAGEN_THREAD_TUNING_SIZES", "256,512,768").split(",") if v]
+            self.logger.info(f"Tuning CPU thread settings for {self.thread_tuner.host} at {sizes}, this takes a few minutes")
+            entry = self.thread_tuner.tune(self.model_path / "unet" / "config.json", sizes)
+        if entry is not None:
+            self.thread_tuner.apply_process(entry)
+            self.thread_profile = entry
+    
+    def _load_pipeline(self, model_path: Path, components: Dict[str, torch.nn.Module]):
+        """Build one checkpoint's pipeline; ``components`` are already-loaded shared modules"""
+        if not self._verify_model_files(Path(model_path)):
+            raise FileNotFoundError(f"Model files not found in {model_path}. Please run model_downloader.py first.")
+        
+        self.logger.info(f"Loading model from {model_path}...")
+        components = dict(components)
+        if self.quantize and not all(name in components for name in ("unet", "text_encoder")):
+            from .quantization import load_quantized_components
+            for name, module in load_quantized_components(model_path, self.quantize).items():
+                components.setdefault(name, module)
+        
+        if self._load_options.get("mmap_weights") and self.device == "cpu":
+            from .mmap_loader import load_pipeline_mmap
+            pipeline = load_pipeline_mmap(model_path, dtype=torch.float32, overrides=components)
+        else:
+            # diffusers is slow to import, so only pay for it when loading
+            from diffusers import LatentConsistencyModelPipeline
+            pipeline = LatentConsistencyModelPipeline.from_pretrained(
+                model_path,
+                torch_dtype=torch.float16 if self.device == "cuda" else torch.float32,
+                local_files_only=True,
+                **components
+            )
+        
+        if self.device == "cuda":
+            pipeline = pipeline.to("cuda")
+        return pipeline
+    
+    def _activate(self, name: str) -> bool:
+        """Make ``name`` the pipeline used by the next call; caller holds the pipeline lock"""
+        if name == self.active_model and self.model is not None:
+            return True
+        try:
+            self.model = self.registry.get(name)
+        except FileNotFoundError as e:
+            self.logger.error(str(e))
+            return False
+        self.active_model = name
+        self.model_path = self.registry.path(name)
+        self._attention_backend = None
+        if self._load_options.get("optimize") and name not in self._optimized:
+            self._optimize_execution(self._load_options.get("compile_modules", True))
+            self._optimized.add(name)
+        return True
+    
+    def _forget_model(self, name: str):
+        """Registry eviction callback: drop per-model optimization state"""
+        self._eager_modules.pop(name, None)
+        self._optimized.discard(name)
+        self._img2img = None
+        if name == self.active_model:
+            self.model = None
+            self.active_model = None
+    
+    def list_models(self) -> List[str]:
+        """Names of the checkpoints that can be requested"""
+        return self.registry.names() if self.registry is not None else []
+    
+    def _optimize_execution(self, compile_modules: bool):
+        """Apply channels_last and optionally torch.compile to the UNet and VAE"""
+        # channels_last copies conv weights, so mmap-shared weights become private
+        self.model.unet.to(memory_format=torch.channels_last)
+        self.model.vae.to(memory_format=torch.channels_last)
+        self.logger.info("Using channels_last memory format for UNet and VAE")
+        
+        if not compile_modules:
+            return
+        if not hasattr(torch, "compile"):
+            self.logger.warning("torch.compile not available, running eagerly")
+            return
+        try:
+            self._eager_modules[self.active_model] = (self.model.unet, self.model.vae.decoder)
+            self.model.unet = torch.compile(self.model.unet)
+            self.model.vae.decoder = torch.compile(self.model.vae.decoder)
+            self.logger.info("Compiled UNet and VAE decoder with torch.compile")
+        except Exception as e:
+            self.logger.warning(f"torch.compile failed, running eagerly: {str(e)}")
+            self._restore_eager_modules()
+    
+    def _restore_eager_modules(self):
+        """Undo torch.compile, keeping the channels_last layout"""
+        if self.active_model not in self._eager_modules:
+            return
+        self.model.unet, self.model.vae.decoder = self._eager_modules.pop(self.active_model)
+    
+    def _select_attention(self, width: int, height: int, batch: int) -> Tuple[str, str]:
+        """Apply the attention backend for this shape; returns (backend, profile key)"""
+        key = self.attention.shape_key(self.device, self.model_identity(), width, height, batch)
+        backend = self._attention_override or self.attention.choose(
+            key, self.device, width, height, batch, element_size=next(self.model.unet.parameters()).element_size()
+        )
+        if backend != self._attention_backend:
+            apply_attention_backend(self.model, backend)
+            self.logger.info(f"Using {backend} attention for {batch}x {width}x{height}")
+            self._attention_backend = backend
+        return backend, key
+    
+    def profile_attention(self, width: int, height: int, batch: int = 1, steps: int = 4):
+        """Measure every attention backend not yet profiled for this shape
+        
+        Backends that failed (e.g. ran out of memory) are skipped; the next
+        choose() then only considers the ones that were measured.
+        """
+        key = self.attention.shape_key(self.device, self.model_identity(), width, height, batch)
+        measured = self.attention.measurements(key)
+        for backend in available_backends():
+            if backend in measured:
+                continue
+            self._attention_override = backend
+            try:
+                self.generate_batch(["warm-up"] * batch, list(range(batch)), steps, 1.0, width, height)
+            finally:
+                self._attention_override = None
+    
+    def warm_up(self, sizes: Sequence[int] = (256, 512, 768), steps: Sequence[int] = (4,)) -> bool:
+        """Run one generation per resolution/step count so kernels, allocator
+        state and compiled graphs are ready before the first user request
+        
+        If a compiled module fails during warm-up, the generator falls back to
+        eager execution and warms up again.
+        """
+        if self.model is None:
+            self.logger.error("Model not loaded")
+            return False
+        for size in sizes:
+            for step_count in steps:
+                start = time.perf_counter()
+                images = self.generate_batch(["warm-up"], [0], step_count, 1.0, size, size)
+                if images is None and self.active_model in self._eager_modules:
+                    self.logger.warning(f"Compiled execution failed at {size}x{size}, falling back to eager")
+                    self._restore_eager_modules()
+                    return self.warm_up(sizes, steps)
+                if images is None:
+                    return False
+                if not self.attention.forced:
+                    self.profile_attention(size, size, 1, step_count)
+                self.logger.info(f"Warm-up {size}x{size}, {step_count} steps: {time.perf_counter() - start:.2f}s")
+        return True
+    
     def generate_image(
         self,
         prompt: str,
         steps: int = 4,  # LCM is fast, we can use fewer steps
         guidance_scale: float = 1.0,  # Optimized for LCM
         width: int = 512,
-        height: int = 512
+        height: int = 512,
+        seed: Optional[int] = None
     ) -> Image.Image:
         """Generate an image from a prompt"""
+        images = self.generate_batch(
+            prompts=[prompt],
+            seeds=[seed],
+            steps=steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height
+        )
+        return images[0] if images else None
+    
+    def _make_generators(self, seeds: Sequence[Optional[int]]) -> List[torch.Generator]:
+        """Create one torch.Generator per image so every seed stays reproducible"""
+        generators = []
+        for seed in seeds:
+            if seed is None or seed < 0:
+                seed = random.randint(0, 2**32 - 1)
+            generators.append(torch.Generator(device=self.device).manual_seed(int(seed)))
+        return generators
+    
+    def model_identity(self, name: Optional[str] = None) -> str:
+        """Identify a model's weights for cache keys (the active model by default)"""
+        model_path = self.registry.path(name) if name else self.model_path
+        dtype = torch.float16 if self.device == "cuda" else torch.float32
+        identity = f"{model_path.resolve()}:{dtype}"
+        if self.deep_cache_interval > 1:
+            # Feature reuse changes the output of long runs
+            identity = f"{identity}:deepcache-{self.deep_cache_interval}-{self.deep_cache_min_steps}"
+        if self.token_merge_ratios:
+            identity = f"{identity}:tome-{self.token_merge_setting}"
+        return f"{identity}:int8-{self.quantize}" if self.quantize else identity
+    
+    def text_encoder_identity(self) -> str:
+        """Identify the active text encoder: weights, dtype and quantization only
+        
+        Unlike model_identity it leaves out UNet-only options (DeepCache,
+        token merging), which don't change prompt embeddings.
+        """
+        dtype = torch.float16 if self.device == "cuda" else torch.float32
+        identity = f"{self.model_path.resolve()}:{dtype}"
+        return f"{identity}:int8-{self.quantize}" if self.quantize else identity
+    
+    def encode_prompts(self, prompts: Sequence[str]) -> torch.Tensor:
+        """Return prompt_embeds for a batch, reusing cached text-encoder outputs
+        
+        Each distinct prompt is encoded at most once per batch, and not at all
+        if it is already in the LRU cache.
+        """
+        identity = self.text_encoder_identity()
+        embeds = {}
+        for prompt in prompts:
+            key = (identity, normalize_prompt(prompt))
+            if key in embeds:
+                continue
+            cached = self.prompt_cache.get(key)
+            if cached is None:
+                with timed("text_encode"), torch.no_grad():
+                    cached, _ = self.model.encode_prompt(
+                        key[1],
+                        self.device,
+                        1,
+                        False
+                    )
+                self.prompt_cache.put(key, cached)
+            embeds[key] = cached
+        return torch.cat([embeds[(identity, normalize_prompt(p))] for p in prompts])
+    
+    def warm_prompt_cache(self, prompts: Sequence[str]) -> int:
+        """Pre-compute embeddings for frequently used prompts; returns count"""
+        if self.model is None:
+            self.logger.error("Model not loaded")
+            return 0
+        try:
+            self.encode_prompts(prompts)
+            self.logger.info(f"Prompt cache warmed with {len(prompts)} prompt(s): {self.prompt_cache.stats()}")
+            return len(prompts)
+        except Exception as e:
+            self.logger.error(f"Error warming prompt cache: {str(e)}")
+            return 0
+    
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        step_callback: Optional[Callable[[int, torch.Tensor], None]] = None,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None,
+        should_abort: Optional[Callable[[], bool]] = None
+    ) -> List[Image.Image]:
+        """Generate one image per prompt in a single batched pipeline call
+        
+        All prompts go through the text encoder, UNet and VAE as one tensor
+        batch. ``seeds`` must match ``prompts`` in length; ``None`` or a
+        negative value picks a random seed for that image. ``step_callback``
+        is called after every step with the step number and the current
+        denoised latents. ``model`` names the checkpoint to use (the default
+        model if omitted); it is loaded first if it isn't resident.
+        ``adapter`` names a LoRA under IMAGEN_LORA_DIR to apply to the UNet.
+        If ``should_abort`` returns True after a step, the call stops there
+        (skipping the VAE decode) and returns None.
+        """
         try:
             if self.model is None:
                 self.logger.error("Model not loaded")
                 return None
             
-            self.logger.info(f"Generating image with prompt: {prompt}")
-            self.logger.debug(f"Parameters: steps={steps}, guidance_scale={guidance_scale}, size={width}x{height}")
+            prompts = list(prompts)
+            if not prompts:
+                return []
+            if seeds is None:
+                seeds = [None] * len(prompts)
+            if len(seeds) != len(prompts):
+                raise ValueError(f"Got {len(seeds)} seeds for {len(prompts)} prompts")
             
-            # Generate image
-            with torch.no_grad():
-                image = self.model(
-                    prompt=prompt,
-                    num_inference_steps=steps,
-                    guidance_scale=guidance_scale,
-                    width=width,
-                    height=height
-                ).images[0]
+            self.logger.info(f"Generating batch of {len(prompts)} image(s)")
+            self.logger.debug(f"Parameters: steps={steps}, guidance_scale={guidance_scale}, size={width}x{height}, seeds={list(seeds)}")
+            
+            step_clock = {"last": None, "denoised": None}
+            
+            def on_step_end(pipe, step, timestep, tensors):
+                # One denoising step: UNet forward plus the scheduler update
+                now = time.perf_counter()
+                observe_stage("unet_step", now - step_clock["last"])
+                step_clock["last"] = now
+                step_clock["denoised"] = tensors["denoised"]
+                if step_callback is not None:
+                    step_callback(step + 1, tensors["denoised"])
+                if should_abort is not None and should_abort():
+                    raise GenerationCancelled(f"Abandoned after step {step + 1}/{steps}")
+                return {}
+            
+            # Generate images
+            with self._pipeline_lock, torch.no_grad(), timed("generate"):
+                prompt_embeds, backend, attention_key = self._prepare_call(prompts, width, height, model, adapter)
+                reuse_interval = self._deep_cache_interval(steps)
+                merge_ratio = self._token_merge_ratio(width, height)
+                # First use of a backend at this shape: measure it for the profile (unmodified UNet only)
+                measure = backend not in self.attention.measurements(attention_key) and reuse_interval <= 1 and not merge_ratio
+                step_clock["last"] = time.perf_counter()
+                step_clock["first"] = step_clock["last"]
+                with PeakMemory(self.device) if measure else nullcontext() as peak, \
+                        deep_cache(self.model.unet, reuse_interval), \
+                        token_merging(self.model.unet, width, height, merge_ratio):
+                    images = self.model(
+                        prompt_embeds=prompt_embeds,
+                        num_inference_steps=steps,
+                        guidance_scale=guidance_scale,
+                        width=width,
+                        height=height,
+                        generator=self._make_generators(seeds),
+                        callback_on_step_end=on_step_end,
+                        callback_on_step_end_tensor_inputs=["latents", "denoised"]
+                    ).images
+                # Everything after the last step: VAE decode, safety check, conversion to PIL
+                observe_stage("decode", time.perf_counter() - step_clock["last"])
+                if measure:
+                    seconds_per_step = (step_clock["last"] - step_clock["first"]) / max(1, steps)
+                    self.attention.record(attention_key, backend, seconds_per_step, peak.peak_bytes)
+                self._store_latents(prompts, seeds, step_clock["denoised"], steps, guidance_scale, width, height, adapter)
+            IMAGES_GENERATED.inc(len(images))
             
-            self.logger.info("Image generated successfully")
-            return image
+            self.logger.info(f"Generated {len(images)} image(s) successfully")
+            return images
             
+        except GenerationCancelled as e:
+            GENERATIONS_CANCELLED.inc(stage="running")
+            self.logger.info(f"Generation cancelled: {str(e)}")
+            return None
         except Exception as e:
-            self.logger.error(f"Error generating image: {str(e)}")
+            GENERATION_ERRORS.inc()
+            self.logger.error(f"Error generating images: {str(e)}")
             self.logger.error("Full traceback:", exc_info=True)
             return None
     
+    def _prepare_call(
+        self,
+        prompts: List[str],
+        width: int,
+        height: int,
+        model: Optional[str],
+        adapter: Optional[str]
+    ) -> Tuple[torch.Tensor, str, str]:
+        """Per-call setup under the pipeline lock: model, adapter, decode mode,
+        attention backend and prompt embeddings"""
+        if not self._activate(model or self.default_model):
+            raise RuntimeError(f"Model {model or self.default_model} could not be loaded")
+        if adapter and self.quantize:
+            # The quantized Linear layers have no float weights for the deltas to patch
+            raise ValueError(f"Adapter {adapter} can't be applied to an int8-quantized UNet (IMAGEN_QUANTIZE={self.quantize})")
+        with timed("adapter_swap"):
+            if self.adapters.apply(self.model, self.model_identity(), adapter):
+                self.logger.debug(f"Switched UNet adapter to {adapter or 'none'}")
+        prompt_embeds = self.encode_prompts(prompts)
+        decode_mode = configure_vae_decode(self.model.vae, width, height, len(prompts), self.vae_memory_budget)
+        if decode_mode != "full":
+            self.logger.debug(f"Using {decode_mode} VAE decode for {len(prompts)}x {width}x{height}")
+        backend, attention_key = self._select_attention(width, height, len(prompts))
+        if self.thread_profile is not None:
+            threads = self.thread_tuner.intra_threads(self.thread_profile, width, height)
+            if threads != torch.get_num_threads():
+                torch.set_num_threads(threads)
+        return prompt_embeds, backend, attention_key
+    
+    def _deep_cache_interval(self, steps: int) -> int:
+        """DeepCache refresh interval for a call of ``steps`` steps; 0 runs the full UNet every step"""
+        if self.deep_cache_interval <= 1 or steps < self.deep_cache_min_steps:
+            return 0
+        if hasattr(self.model.unet, "_orig_mod"):
+            # A compiled UNet wouldn't see the block wrappers
+            self.logger.debug("DeepCache skipped for a compiled UNet")
+            return 0
+        return self.deep_cache_interval
+    
+    def _token_merge_ratio(self, width: int, height: int) -> float:
+        """Token merging ratio for this image size; 0 leaves self-attention as is"""
+        ratio = merge_ratio_for(self.token_merge_ratios, width, height)
+        if ratio and hasattr(self.model.unet, "_orig_mod"):
+            # A compiled UNet wouldn't see the attention wrappers
+            self.logger.debug("Token merging skipped for a compiled UNet")
+            return 0.0
+        return ratio
+    
+    def _latent_key(
+        self,
+        prompt: str,
+        seed: int,
+        steps: int,
+        guidance_scale: float,
+        width: int,
+        height: int,
+        adapter: Optional[str],
+        model: Optional[str] = None
+    ) -> Tuple:
+        identity = self.model_identity(model) if model else self.model_identity()
+        return (identity, adapter, normalize_prompt(prompt), int(seed), int(steps), float(guidance_scale), int(width), int(height))
+    
+    def _store_latents(self, prompts, seeds, denoised, steps, guidance_scale, width, height, adapter):
+        """Keep each seeded image's final latents so it can be varied later"""
+        if denoised is None:
+            return
+        for i, (prompt, seed) in enumerate(zip(prompts, seeds)):
+            if seed is None or seed < 0:
+                continue
+            key = self._latent_key(prompt, seed, steps, guidance_scale, width, height, adapter)
+            self.latent_cache.put(key, denoised[i:i + 1].detach().clone())
+    
+    def has_latents(
+        self,
+        prompts: Sequence[str],
+        seeds: Sequence[int],
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None
+    ) -> bool:
+        """Whether every (prompt, seed) result is still in the latent cache"""
+        model = model or self.default_model
+        return all(
+            self.latent_cache.get(self._latent_key(prompt, seed, steps, guidance_scale, width, height, adapter, model)) is not None
+            for prompt, seed in zip(prompts, seeds)
+        )
+    
+    def _img2img_pipeline(self):
+        """LCM img2img view of the active pipeline, sharing all its modules"""
+        if self._img2img is None or self._img2img[0] is not self.model:
+            from diffusers import LatentConsistencyModelImg2ImgPipeline
+            if hasattr(LatentConsistencyModelImg2ImgPipeline, "from_pipe"):
+                pipeline = LatentConsistencyModelImg2ImgPipeline.from_pipe(self.model)
+            else:
+                # diffusers < 0.28 has no from_pipe; the two pipelines take the same modules
+                pipeline = LatentConsistencyModelImg2ImgPipeline(**self.model.components)
+            self._img2img = (self.model, pipeline)
+        return self._img2img[1]
+    
+    def generate_variations(
+        self,
+        prompts: Sequence[str],
+        source_seeds: Sequence[int],
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        strength: float = 0.4,
+        variation_steps: int = 2,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None
+    ) -> List[Image.Image]:
+        """Vary earlier results by re-noising their cached final latents
+        
+        ``prompts``, ``source_seeds`` and the size/steps/guidance/model/adapter
+        identify results produced by generate_batch. Their final latents
+        are noised to ``strength`` and denoised in ``variation_steps`` LCM
+        steps: img2img that starts from latents, so there is no VAE encode.
+        The variations are cached under their own ``seeds`` and the same
+        parameters, so they can be varied in turn.
+        """
+        try:
+            if self.model is None:
+                self.logger.error("Model not loaded")
+                return None
+            
+            prompts = list(prompts)
+            if seeds is None:
+                seeds = [random.randint(0, 2**32 - 1) for _ in prompts]
+            seeds = [random.randint(0, 2**32 - 1) if seed is None or seed < 0 else int(seed) for seed in seeds]
+            if not (len(prompts) == len(source_seeds) == len(seeds)):
+                raise ValueError(f"Got {len(source_seeds)} source seeds and {len(seeds)} seeds for {len(prompts)} prompts")
+            
+            self.logger.info(f"Generating {len(prompts)} variation(s), strength {strength}, {variation_steps} step(s)")
+            final = {"denoised": None}
+            
+            def on_step_end(pipe, step, timestep, tensors):
+                final["denoised"] = tensors["denoised"]
+                return {}
+            
+            with self._pipeline_lock, torch.no_grad(), timed("variation"):
+                sources = [
+                    self.latent_cache.get(self._latent_key(prompt, seed, steps, guidance_scale, width, height, adapter, model or self.default_model))
+                    for prompt, seed in zip(prompts, source_seeds)
+                ]
+                if any(source is None for source in sources):
+                    raise ValueError("Source latents are no longer cached; generate the image again first")
+                prompt_embeds, _, _ = self._prepare_call(prompts, width, height, model, adapter)
+                images = self._img2img_pipeline()(
+                    prompt_embeds=prompt_embeds,
+                    # 4-channel input is taken as latents, skipping the VAE encoder
+                    image=torch.cat(sources),
+                    strength=strength,
+                    num_inference_steps=max(1, int(variation_steps)),
+                    guidance_scale=guidance_scale,
+                    generator=self._make_generators(seeds),
+                    callback_on_step_end=on_step_end,
+                    callback_on_step_end_tensor_inputs=["latents", "denoised"]
+                ).images
+                self._store_latents(prompts, seeds, final["denoised"], steps, guidance_scale, width, height, adapter)
+            IMAGES_GENERATED.inc(len(images))
+            return images
+            
+        except Exception as e:
+            GENERATION_ERRORS.inc()
+            self.logger.error(f"Error generating variations: {str(e)}")
+            self.logger.error("Full traceback:", exc_info=True)
+            return None
+    
+    def generate_batch_stream(
+        self,
+        prompts: Sequence[str],
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None
+    ) -> Iterator[Tuple[int, List[Image.Image], bool]]:
+        """Like generate_batch, but yield ``(step, images, final)`` as it goes
+        
+        Intermediate images are linear latent-to-RGB previews rather than VAE
+        decodes. The last item has ``final`` set and carries the real images
+        (or ``None`` if generation failed).
+        """
+        updates = queue.Queue()
+        abandoned = threading.Event()
+        
+        def on_step(step: int, latents: torch.Tensor):
+            if step < steps:
+                updates.put((step, latents_to_rgb(latents, width, height), False))
+        
+        def run():
+            images = self.generate_batch(
+                prompts=prompts,
+                seeds=seeds,
+                steps=steps,
+                guidance_scale=guidance_scale,
+                width=width,
+                height=height,
+                step_callback=on_step,
+                model=model,
+                adapter=adapter,
+                should_abort=abandoned.is_set
+            )
+            updates.put((steps, images, True))
+        
+        threading.Thread(target=run, name="imagen-stream", daemon=True).start()
+        try:
+            while True:
+                update = updates.get()
+                yield update
+                if update[2]:
+                    return
+        finally:
+            # Closed early (e.g. the client disconnected): stop at the next step
+            abandoned.set()
+    
+    def generate_image_stream(
+        self,
+        prompt: str,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        seed: Optional[int] = None
+    ) -> Iterator[Tuple[int, Image.Image, bool]]:
+        """Single-image form of generate_batch_stream"""
+        for step, images, final in self.generate_batch_stream([prompt], [seed], steps, guidance_scale, width, height):
+            yield step, images[0] if images else None, final
+    
     def cleanup(self):
         """Clean up resources"""
         try:
             if self.model is not None:
                 self.model = None
+                self.active_model = None
+                if self.registry is not None:
+                    self.registry.clear()
+                self.prompt_cache.clear()
                 if torch.cuda.is_available():
                     torch.cuda.empty_cache()
                 self.logger.info("Model resources cleaned up")
@@ -0,0 +1,123 @@
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from .metrics import timed
+
+# Supported output formats -> file extension
+OUTPUT_EXTENSIONS = {
+    "png": "png",
+    "webp": "webp",
+    "jpeg": "jpg"
+}
+
+
+def encode_options(fmt: str, quality: int = 90, compress_level: int = 6) -> Dict:
+    """PIL save() keyword arguments for an output format"""
+    fmt = fmt.lower()
+    if fmt == "png":
+        return {"format": "PNG", "compress_level": int(compress_level)}
+    if fmt == "webp":
+        return {"format": "WEBP", "quality": int(quality), "method": 4}
+    if fmt == "jpeg":
+        return {"format": "JPEG", "quality": int(quality), "optimize": True}
+    raise ValueError(f"Unsupported output format: {fmt} (expected one of {', '.join(OUTPUT_EXTENSIONS)})")
+
+
+class ImageWriter:
+    """Persist generated images on a background thread pool
+
+    ``submit`` picks a collision-free filename immediately and returns it;
+    encoding and the disk write happen later, so the caller can serve the
+    in-memory image without waiting on either. With a ``store``, images go
+    into the indexed OutputStore with their metadata instead, where the
+    file name depends on the content and isn't known up front.
+    """
+
+    def __init__(
+        self,
+        output_dir: str = "output",
+        fmt: str = "png",
+        quality: int = 90,
+        compress_level: int = 6,
+        max_workers: int = 2,
+        store=None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt.lower()
+        self.save_kwargs = encode_options(self.fmt, quality, compress_level)
+        self.extension = OUTPUT_EXTENSIONS[self.fmt]
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="imagen-writer")
+        self._counter = itertools.count()
+        self._pending: List[Future] = []
+        self._lock = threading.Lock()
+
+    def _next_path(self, prefix: str) -> Path:
+        """Millisecond timestamp plus process id and a counter, so names never repeat"""
+        return self.output_dir / f"{prefix}_{int(time.time() * 1000)}_{os.getpid()}_{next(self._counter)}.{self.extension}"
+
+    def _write(self, image: Image.Image, path: Path):
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            if self.fmt == "jpeg" and image.mode != "RGB":
+                image = image.convert("RGB")
+            with timed("image_save"):
+                image.save(tmp_path, **self.save_kwargs)
+                os.replace(tmp_path, path)
+        except Exception as e:
+            self.logger.error(f"Error saving {path}: {str(e)}")
+            raise
+
+    def _write_to_store(self, image: Image.Image, metadata: Dict):
+        try:
+            start = time.perf_counter()
+            if self.fmt == "jpeg" and image.mode != "RGB":
+                image = image.convert("RGB")
+            with timed("image_save"):
+                buffer = BytesIO()
+                image.save(buffer, **self.save_kwargs)
+                encode_seconds = time.perf_counter() - start
+                self.store.add(buffer.getvalue(), self.extension, image, {**metadata, "encode_seconds": encode_seconds})
+        except Exception as e:
+            self.logger.error(f"Error storing image: {str(e)}")
+            raise
+
+    def submit(self, image: Image.Image, prefix: str = "generated", metadata: Optional[Dict] = None) -> Optional[Path]:
+        """Queue an image for saving and return the path it will be written to (None with a store)"""
+        if self.store is not None:
+            path = None
+            future = self._executor.submit(self._write_to_store, image, {"kind": prefix, **(metadata or {})})
+        else:
+            path = self._next_path(prefix)
+            future = self._executor.submit(self._write, image, path)
+        with self._lock:
+            self._pending = [f for f in self._pending if not f.done()]
+            self._pending.append(future)
+        return path
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def shutdown(self):
+        """Finish outstanding writes and stop the thread pool"""
+        self.flush()
+        self._executor.shutdown(wait=True)
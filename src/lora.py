@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import torch
+
+from .model_files import DEFAULT_LORA_DIR, discover_adapters
+
+logger = logging.getLogger(__name__)
+
+
+def _unwrap(module: torch.nn.Module) -> torch.nn.Module:
+    """The eager module behind a torch.compile wrapper"""
+    return getattr(module, "_orig_mod", module)
+
+
+def compute_unet_deltas(pipeline, path: Path, scale: float = 1.0) -> Dict[str, torch.Tensor]:
+    """Dense UNet weight deltas of a LoRA file, keyed by parameter name
+
+    diffusers/peft parse the file (kohya and diffusers formats alike) and
+    wrap the target layers; each layer's merged delta is read out and the
+    wrappers are removed again, leaving the UNet as it was.
+    """
+    from peft.tuners.lora import LoraLayer
+
+    adapter = "imagen_delta"
+    compiled_unet = pipeline.unet
+    pipeline.unet = _unwrap(compiled_unet)
+    try:
+        pipeline.load_lora_weights(str(path), adapter_name=adapter)
+        deltas = {}
+        for name, module in pipeline.unet.named_modules():
+            if isinstance(module, LoraLayer) and adapter in module.lora_A:
+                with torch.no_grad():
+                    deltas[f"{name}.weight"] = (module.get_delta_weight(adapter) * scale).detach().clone()
+        return deltas
+    finally:
+        pipeline.unload_lora_weights()
+        pipeline.unet = compiled_unet
+
+
+class AdapterManager:
+    """Applies LoRA adapters to a UNet in place from a bounded delta cache
+
+    Fused deltas are cached per (model, adapter) up to ``max_bytes``, least
+    recently used evicted first. The first time an adapter touches a UNet
+    parameter, the original values are kept, so switching adapters is
+    ``param = base + delta`` for the parameters involved. The base model is
+    never reloaded and repeated swaps don't accumulate rounding error.
+    """
+
+    def __init__(self, lora_dir: Path = DEFAULT_LORA_DIR, max_bytes: int = 1024 * 1024 * 1024):
+        self.lora_dir = Path(lora_dir)
+        self.max_bytes = max(0, int(max_bytes))
+        self._deltas: "OrderedDict[Tuple[str, str], Dict[str, torch.Tensor]]" = OrderedDict()
+        self._bytes = 0
+        # Per UNet: {"adapter": name or None, "base": {param name: original tensor}}
+        self._unet_state: "weakref.WeakKeyDictionary[torch.nn.Module, Dict]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def adapters(self) -> List[str]:
+        return list(discover_adapters(self.lora_dir))
+
+    def _get_deltas(self, pipeline, model: str, adapter: str) -> Dict[str, torch.Tensor]:
+        key = (model, adapter)
+        if key in self._deltas:
+            self._deltas.move_to_end(key)
+            self.hits += 1
+            return self._deltas[key]
+
+        path = discover_adapters(self.lora_dir).get(adapter)
+        if path is None:
+            raise ValueError(f"Unknown adapter: {adapter} (available: {', '.join(self.adapters()) or 'none'})")
+        start = time.perf_counter()
+        deltas = compute_unet_deltas(pipeline, path)
+        size = sum(delta.numel() * delta.element_size() for delta in deltas.values())
+        self.misses += 1
+        logger.info(f"Fused adapter {adapter}: {len(deltas)} layers, {size / (1024 ** 2):.1f} MB in {time.perf_counter() - start:.2f}s")
+
+        self._deltas[key] = deltas
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._deltas) > 1:
+            evicted_key, evicted = self._deltas.popitem(last=False)
+            self._bytes -= sum(delta.numel() * delta.element_size() for delta in evicted.values())
+            logger.debug(f"Evicted adapter deltas {evicted_key}")
+        return deltas
+
+    def apply(self, pipeline, model: str, adapter: Optional[str]) -> bool:
+        """Put ``adapter`` (or no adapter) on the pipeline's UNet; returns True if weights changed"""
+        unet = _unwrap(pipeline.unet)
+        with self._lock:
+            state = self._unet_state.setdefault(unet, {"adapter": None, "base": {}})
+            if state["adapter"] == adapter:
+                return False
+
+            deltas = self._get_deltas(pipeline, model, adapter) if adapter else {}
+            params = dict(unet.named_parameters())
+            base = state["base"]
+            with torch.no_grad():
+                # Restore what the previous adapter touched and this one doesn't
+                for name in list(base):
+                    if name not in deltas:
+                        params[name].copy_(base.pop(name))
+                skipped = 0
+                for name, delta in deltas.items():
+                    param = params.get(name)
+                    if param is None:
+                        # e.g. an int8 layer, which has no float weight to patch
+                        skipped += 1
+                        continue
+                    if name not in base:
+                        base[name] = param.detach().clone()
+                    torch.add(base[name], delta.to(param.dtype), out=param.data)
+            if skipped:
+                logger.warning(f"Adapter {adapter}: {skipped} of {len(deltas)} layer(s) have no float weight and were left unpatched")
+            state["adapter"] = adapter
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._deltas), "bytes": self._bytes, "max_bytes": self.max_bytes}
@@ -0,0 +1,218 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets (seconds) wide enough for a 256px UNet step and a 768px batch
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+# Set in worker processes: every update is also kept here to be replayed in the parent
+_recorded: Optional[List[Tuple[str, float, Dict[str, str]]]] = None
+
+
+def record_updates():
+    """Keep every metric update of this process for ``drain_updates``"""
+    global _recorded
+    _recorded = []
+
+
+def drain_updates() -> List[Tuple[str, float, Dict[str, str]]]:
+    """Metric updates kept since the last call, as (name, value, labels)"""
+    global _recorded
+    if _recorded is None:
+        return []
+    updates, _recorded = _recorded, []
+    return updates
+
+
+def _record(name: str, value: float, labels: Dict[str, str]):
+    if _recorded is not None:
+        _recorded.append((name, value, labels))
+
+
+class Counter:
+    """Monotonic counter, optionally labelled"""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+        _record(self.name, amount, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(dict(key))} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally labelled"""
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+        _record(self.name, value, labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Registry:
+    """Holds metrics and gauge callbacks and renders Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[Tuple, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help_text, buckets))
+
+    def gauge_callback(self, name: str, help_text: str, callback: Callable[[], Dict[Tuple, float]]):
+        """Register a gauge read at scrape time; callback returns {label items: value}"""
+        with self._lock:
+            self._gauges[name] = (help_text, callback)
+
+    def replay(self, updates: Sequence[Tuple[str, float, Dict[str, str]]]):
+        """Apply updates drained in another process to the metrics of the same name"""
+        for name, value, labels in updates:
+            with self._lock:
+                metric = self._metrics.get(name)
+            if isinstance(metric, Counter):
+                metric.inc(value, **labels)
+            elif isinstance(metric, Histogram):
+                metric.observe(value, **labels)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            gauges = list(self._gauges.items())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, (help_text, callback) in gauges:
+            try:
+                values = callback()
+            except Exception:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in values.items():
+                lines.append(f"{name}{_format_labels(dict(key))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "imagen_stage_seconds",
+    "Time spent in each generation stage (queue_wait, text_encode, unet_step, decode, generate, image_save)"
+)
+IMAGES_GENERATED = REGISTRY.counter("imagen_images_generated_total", "Images produced by the pipeline")
+GENERATION_ERRORS = REGISTRY.counter("imagen_generation_errors_total", "Failed pipeline calls")
+REQUESTS_REJECTED = REGISTRY.counter("imagen_requests_rejected_total", "Requests turned away because the queue was full")
+QUALITY_REDUCED = REGISTRY.counter("imagen_quality_reduced_total", "Requests run below their requested quality to meet the latency target, by kind (steps, resolution)")
+GENERATIONS_CANCELLED = REGISTRY.counter("imagen_generations_cancelled_total", "Requests abandoned by a disconnect or deadline, by stage (queued, running)")
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record one stage duration"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the enclosed block as ``stage``"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are frequent; keep them out of the application log
+        pass
+
+
+def start_metrics_server(port: int = 9464, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """Serve /metrics on a daemon thread; returns None if the port is taken"""
+    logger = logging.getLogger(__name__)
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Could not start metrics server on port {port}: {str(e)}")
+        return None
+    threading.Thread(target=server.serve_forever, name="imagen-metrics", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
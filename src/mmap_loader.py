@@ -0,0 +1,131 @@
+import importlib
+import json
+import logging
+import struct
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+from accelerate import init_empty_weights
+from diffusers import LatentConsistencyModelPipeline
+
+logger = logging.getLogger(__name__)
+
+# safetensors dtype tags -> torch dtypes
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool
+}
+
+
+def load_safetensors_mmap(path: Path, dtype: torch.dtype = None) -> Dict[str, torch.Tensor]:
+    """Return tensors that are views into a private mmap of a safetensors file
+
+    Pages come from the OS page cache, so every process mapping the same
+    file shares one physical copy of the weights. Tensors whose dtype differs
+    from ``dtype`` (or whose offset is misaligned) are copied instead.
+    """
+    with open(path, "rb") as f:
+        header_size = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(header_size))
+    data_start = 8 + header_size
+    storage = torch.UntypedStorage.from_file(str(path), False, path.stat().st_size)
+
+    tensors = {}
+    for name, info in header.items():
+        if name == "__metadata__":
+            continue
+        file_dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        offset = data_start + begin
+        element_size = torch.empty((), dtype=file_dtype).element_size()
+        if offset % element_size:
+            raw = torch.empty(0, dtype=torch.uint8).set_(storage, offset, (end - begin,))
+            tensor = raw.clone().view(file_dtype).reshape(info["shape"])
+        else:
+            tensor = torch.empty(0, dtype=file_dtype).set_(
+                storage, offset // element_size, info["shape"]
+            )
+        if dtype is not None and tensor.is_floating_point() and tensor.dtype != dtype:
+            tensor = tensor.to(dtype)
+        tensors[name] = tensor
+    return tensors
+
+
+def _weight_files(component_dir: Path) -> List[Path]:
+    """Full-precision safetensors shards of a component, ignoring variants"""
+    return sorted(
+        path for path in component_dir.glob("*.safetensors")
+        if len(path.name.split(".")) == 2
+    )
+
+
+def _load_module(component_dir: Path, cls, dtype: torch.dtype) -> torch.nn.Module:
+    """Build a module on the meta device and assign mmap-backed weights"""
+    with init_empty_weights():
+        if hasattr(cls, "load_config"):
+            module = cls.from_config(cls.load_config(component_dir))
+        else:
+            module = cls(cls.config_class.from_pretrained(component_dir))
+
+    state_dict = {}
+    for path in _weight_files(component_dir):
+        state_dict.update(load_safetensors_mmap(path, dtype))
+    result = module.load_state_dict(state_dict, strict=False, assign=True)
+    if result.unexpected_keys:
+        logger.debug(f"{component_dir.name}: ignoring unexpected keys {result.unexpected_keys}")
+
+    still_meta = [name for name, param in module.named_parameters() if param.is_meta]
+    if still_meta:
+        raise RuntimeError(f"{component_dir.name}: no weights for {still_meta[:5]}")
+    return module.eval()
+
+
+def load_pipeline_mmap(
+    model_path: Path,
+    dtype: torch.dtype = torch.float32,
+    overrides: Dict[str, torch.nn.Module] = None
+) -> LatentConsistencyModelPipeline:
+    """Assemble the LCM pipeline with memory-mapped, read-only weights
+
+    Components in ``overrides`` (e.g. quantized modules) are used as given.
+    """
+    overrides = overrides or {}
+    model_path = Path(model_path)
+    with open(model_path / "model_index.json") as f:
+        model_index = json.load(f)
+
+    components = {}
+    for name, spec in model_index.items():
+        if name.startswith("_") or not isinstance(spec, list):
+            continue
+        if name in overrides:
+            components[name] = overrides[name]
+            continue
+        library, class_name = spec
+        if library is None or class_name is None:
+            components[name] = None
+            continue
+        # Pipeline modules are registered as e.g. "stable_diffusion"
+        if "." not in library and library not in ("diffusers", "transformers"):
+            library = f"diffusers.pipelines.{library}"
+        cls = getattr(importlib.import_module(library), class_name)
+
+        component_dir = model_path / name
+        if issubclass(cls, torch.nn.Module) and _weight_files(component_dir):
+            components[name] = _load_module(component_dir, cls, dtype)
+        else:
+            components[name] = cls.from_pretrained(component_dir)
+        logger.debug(f"Loaded component {name} ({class_name})")
+
+    if components.get("safety_checker") is None:
+        components["requires_safety_checker"] = False
+    return LatentConsistencyModelPipeline(**components)
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# LoRA style adapters, one .safetensors file each
+DEFAULT_LORA_DIR = Path("models/loras")
+
+# Written next to the model files; a mirror serves the same file at its root
+MANIFEST_NAME = "manifest.json"
+
+# Checked when a model directory predates manifests
+LEGACY_REQUIRED_FILES = [
+    "model_index.json",
+    "scheduler/scheduler_config.json",
+    "text_encoder/config.json",
+    "tokenizer/vocab.json",
+    "unet/config.json",
+    "vae/config.json"
+]
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def build_manifest(model_dir: Path) -> Dict[str, Dict]:
+    """Size and SHA-256 of every file under ``model_dir`` (keys are posix relative paths)"""
+    model_dir = Path(model_dir)
+    files = {}
+    for path in sorted(model_dir.rglob("*")):
+        relative = path.relative_to(model_dir).as_posix()
+        if not path.is_file() or relative == MANIFEST_NAME or path.name.startswith("."):
+            continue
+        files[relative] = {"size": path.stat().st_size, "sha256": sha256_file(path)}
+    return files
+
+
+def write_manifest(model_dir: Path, files: Dict[str, Dict]) -> Path:
+    """Atomically write the manifest for ``model_dir``"""
+    path = Path(model_dir) / MANIFEST_NAME
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "files": files}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_manifest(model_dir: Path) -> Optional[Dict[str, Dict]]:
+    """The stored {relative path: {size, sha256}} map, or None if there is no manifest"""
+    path = Path(model_dir) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["files"]
+
+
+def verify_model_files(model_dir: Path, check_hashes: bool = False) -> List[str]:
+    """Problems with ``model_dir`` compared to its manifest (empty if it's intact)
+
+    Sizes are always checked; ``check_hashes`` also re-hashes every file,
+    which reads the whole model from disk.
+    """
+    model_dir = Path(model_dir)
+    files = read_manifest(model_dir)
+    if files is None:
+        logger.warning(f"No {MANIFEST_NAME} in {model_dir}; only checking that the config files exist")
+        return [f"missing {name}" for name in LEGACY_REQUIRED_FILES if not (model_dir / name).exists()]
+
+    problems = []
+    for name, expected in files.items():
+        path = model_dir / name
+        if not path.exists():
+            problems.append(f"missing {name}")
+        elif path.stat().st_size != expected["size"]:
+            problems.append(f"{name}: size {path.stat().st_size}, expected {expected['size']}")
+        elif check_hashes and sha256_file(path) != expected["sha256"]:
+            problems.append(f"{name}: SHA-256 mismatch")
+    return problems
+
+
+def discover_models(root: str = "models") -> Dict[str, Path]:
+    """Every ``<root>/<name>/model_files`` directory holding a pipeline, plus IMAGEN_MODELS
+
+    IMAGEN_MODELS adds or overrides entries as ``name=path`` pairs separated
+    by commas.
+    """
+    models = {}
+    root = Path(root)
+    if root.is_dir():
+        for model_index in sorted(root.glob("*/model_files/model_index.json")):
+            models[model_index.parent.parent.name] = model_index.parent
+    for entry in os.environ.get("IMAGEN_MODELS", "").split(","):
+        if "=" in entry:
+            name, path = entry.split("=", 1)
+            models[name.strip()] = Path(path.strip())
+    return models
+
+
+def discover_adapters(lora_dir: Path = DEFAULT_LORA_DIR) -> Dict[str, Path]:
+    """LoRA files under ``lora_dir``, by file stem"""
+    lora_dir = Path(lora_dir)
+    if not lora_dir.is_dir():
+        return {}
+    return {path.stem: path for path in sorted(lora_dir.glob("*.safetensors"))}
@@ -0,0 +1,182 @@
+import hashlib
+import itertools
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import torch
+
+from .model_files import read_manifest
+
+logger = logging.getLogger(__name__)
+
+# Heavy pipeline components that are shared between checkpoints when identical
+SHARED_COMPONENTS = ("unet", "vae", "text_encoder", "safety_checker")
+
+
+def component_fingerprint(model_path: Path, component: str) -> str:
+    """Content identity of a component: the manifest hashes of its files
+
+    Checkpoints that ship a byte-identical VAE or text encoder get the same
+    fingerprint. Without a manifest, only the same directory matches.
+    """
+    files = read_manifest(model_path)
+    if not files:
+        return str((Path(model_path) / component).resolve())
+    entries = sorted((name, entry["sha256"]) for name, entry in files.items() if name.startswith(f"{component}/"))
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+
+def module_bytes(module: torch.nn.Module) -> int:
+    return sum(t.numel() * t.element_size() for t in itertools.chain(module.parameters(), module.buffers()))
+
+
+class _SharedComponent:
+    def __init__(self, module: torch.nn.Module):
+        self.module = module
+        self.refs = 0
+        self.bytes = module_bytes(module)
+
+
+class ModelRegistry:
+    """Loaded pipelines by name with LRU eviction against a memory budget
+
+    ``load_pipeline(path, components)`` builds a pipeline, using the given
+    already-loaded modules in place of reading those components from disk.
+    Identical components (by ``component_fingerprint``) are loaded once and
+    shared; the budget counts each shared module once. A model is evicted
+    only to make room for another, and is reloaded on its next ``get``.
+    """
+
+    def __init__(
+        self,
+        load_pipeline: Callable[[Path, Dict[str, torch.nn.Module]], object],
+        memory_budget_bytes: int = 0,
+        fingerprint_suffix: str = "",
+        on_evict: Optional[Callable[[str], None]] = None
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.load_pipeline = load_pipeline
+        # 0 means no limit
+        self.memory_budget_bytes = max(0, int(memory_budget_bytes))
+        # Distinguishes e.g. int8 modules from full-precision ones with the same files
+        self.fingerprint_suffix = fingerprint_suffix
+        self.on_evict = on_evict
+
+        self._paths: Dict[str, Path] = {}
+        self._resident: "OrderedDict[str, object]" = OrderedDict()
+        self._fingerprints: Dict[str, Dict[str, str]] = {}
+        self._components: Dict[str, _SharedComponent] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, path: Path):
+        with self._lock:
+            self._paths[name] = Path(path)
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._paths)
+
+    def path(self, name: str) -> Path:
+        with self._lock:
+            if name not in self._paths:
+                raise KeyError(f"Unknown model: {name} (available: {', '.join(self._paths)})")
+            return self._paths[name]
+
+    def resident(self) -> List[str]:
+        """Loaded models, least recently used first"""
+        with self._lock:
+            return list(self._resident)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(component.bytes for component in self._components.values())
+
+    def get(self, name: str):
+        """Return the pipeline for ``name``, loading it (and evicting others) if needed"""
+        with self._lock:
+            if name in self._resident:
+                self._resident.move_to_end(name)
+                return self._resident[name]
+
+            path = self.path(name)
+            fingerprints = {
+                component: component_fingerprint(path, component) + self.fingerprint_suffix
+                for component in SHARED_COMPONENTS
+                if (path / component).is_dir()
+            }
+            shared = {
+                component: self._components[fingerprint].module
+                for component, fingerprint in fingerprints.items()
+                if fingerprint in self._components
+            }
+            if shared:
+                self.logger.info(f"Model {name} reuses loaded {', '.join(shared)}")
+
+            # Make room first, using the components we can't share as the estimate
+            incoming = sum(
+                self._weights_size(path / component)
+                for component, fingerprint in fingerprints.items()
+                if fingerprint not in self._components
+            )
+            self._evict_for(incoming, keep=set(fingerprints.values()))
+
+            pipeline = self.load_pipeline(path, shared)
+            for component, fingerprint in fingerprints.items():
+                module = getattr(pipeline, component, None)
+                if module is None:
+                    continue
+                entry = self._components.get(fingerprint)
+                if entry is None:
+                    entry = self._components[fingerprint] = _SharedComponent(module)
+                entry.refs += 1
+            self._fingerprints[name] = fingerprints
+            self._resident[name] = pipeline
+
+            used = self.resident_bytes()
+            self.logger.info(f"Loaded model {name}; {len(self._resident)} resident, {used / (1024 ** 2):.0f} MB")
+            if self.memory_budget_bytes and used > self.memory_budget_bytes:
+                self.logger.warning(f"Model {name} alone exceeds the {self.memory_budget_bytes / (1024 ** 2):.0f} MB model budget")
+            return pipeline
+
+    @staticmethod
+    def _weights_size(component_dir: Path) -> int:
+        # Full-precision shards only; "model.fp16.safetensors"-style variants aren't loaded
+        return sum(path.stat().st_size for path in component_dir.glob("*.safetensors") if len(path.name.split(".")) == 2)
+
+    def _evict_for(self, incoming: int, keep: set):
+        """Evict least recently used models until ``incoming`` more bytes fit"""
+        if not self.memory_budget_bytes:
+            return
+        while self._resident and self.resident_bytes() + incoming > self.memory_budget_bytes:
+            self.evict(next(iter(self._resident)), keep=keep)
+
+    def evict(self, name: str, keep: Optional[set] = None) -> int:
+        """Drop a model; returns the bytes released by components nothing else uses"""
+        keep = keep or set()
+        with self._lock:
+            if name not in self._resident:
+                return 0
+            del self._resident[name]
+            freed = 0
+            for fingerprint in self._fingerprints.pop(name).values():
+                entry = self._components.get(fingerprint)
+                if entry is None:
+                    continue
+                entry.refs -= 1
+                if entry.refs <= 0 and fingerprint not in keep:
+                    freed += entry.bytes
+                    del self._components[fingerprint]
+            self.logger.info(f"Evicted model {name}, released {freed / (1024 ** 2):.0f} MB")
+        if self.on_evict is not None:
+            self.on_evict(name)
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        return freed
+
+    def clear(self):
+        for name in self.resident():
+            self.evict(name)
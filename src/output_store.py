@@ -0,0 +1,266 @@
+import argparse
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+INDEX_NAME = "index.sqlite3"
+THUMBNAIL_SIZE = 256
+# Age-based retention is checked at most this often
+AGE_CHECK_INTERVAL_S = 600.0
+# Records removed per transaction while enforcing the age and size limits
+EVICT_BATCH = 200
+SIZE_EVICT_BATCH = 10
+LEGACY_PATTERNS = ("*.png", "*.webp", "*.jpg")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 TEXT PRIMARY KEY,
+    extension TEXT NOT NULL,
+    bytes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    prompt TEXT,
+    seed INTEGER,
+    steps INTEGER,
+    guidance_scale REAL,
+    width INTEGER,
+    height INTEGER,
+    model TEXT,
+    adapter TEXT,
+    latency_seconds REAL,
+    encode_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS images_prompt ON images(prompt, id);
+CREATE INDEX IF NOT EXISTS images_created ON images(created_at);
+CREATE INDEX IF NOT EXISTS images_sha256 ON images(sha256);
+"""
+
+METADATA_FIELDS = ("kind", "prompt", "seed", "steps", "guidance_scale", "width", "height", "model", "adapter", "latency_seconds", "encode_seconds")
+
+
+class OutputStore:
+    """Saved images as content-addressed blobs with an SQLite index
+
+    Under ``root``: ``index.sqlite3`` holds one row per saved image (prompt,
+    seed, steps, guidance, size, model, timings) and ``blobs/<aa>/<sha256>.<ext>``
+    the encoded files, stored once however many rows share them.
+    ``thumbs/<aa>/<sha256>.webp`` is a small preview written alongside each
+    blob for browsing. Retention removes the oldest rows once the blobs
+    exceed ``max_bytes`` or rows are older than ``max_age_s`` (0 disables
+    either), and deletes blobs nothing refers to any more.
+    """
+
+    def __init__(self, root: str = "output", max_bytes: int = 0, max_age_s: float = 0.0, thumbnail_size: int = THUMBNAIL_SIZE):
+        self.logger = logging.getLogger(__name__)
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_age_s = max(0.0, float(max_age_s))
+        self.thumbnail_size = int(thumbnail_size)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.root / INDEX_NAME), check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM blobs").fetchone()[0]
+        self._last_age_check = 0.0
+
+    def blob_path(self, sha256: str, extension: str) -> Path:
+        return self.root / "blobs" / sha256[:2] / f"{sha256}.{extension}"
+
+    def thumbnail_path(self, sha256: str) -> Path:
+        return self.root / "thumbs" / sha256[:2] / f"{sha256}.webp"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _encode_thumbnail(self, image: Image.Image) -> bytes:
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail((self.thumbnail_size, self.thumbnail_size))
+        buffer = BytesIO()
+        thumbnail.save(buffer, format="WEBP", quality=80)
+        return buffer.getvalue()
+
+    def add(self, data: bytes, extension: str, image: Optional[Image.Image] = None, metadata: Optional[Dict] = None) -> int:
+        """Store an encoded image and index it; returns the record id"""
+        metadata = {"kind": "generated", **(metadata or {})}
+        sha256 = hashlib.sha256(data).hexdigest()
+        thumbnail = self._encode_thumbnail(image if image is not None else Image.open(BytesIO(data)))
+
+        with self._lock:
+            # Files go to disk before the row that points at them, under the
+            # lock so retention can't delete a blob that's being re-added
+            path = self.blob_path(sha256, extension)
+            if not path.exists():
+                self._write_atomic(path, data)
+            if not self.thumbnail_path(sha256).exists():
+                self._write_atomic(self.thumbnail_path(sha256), thumbnail)
+            with self._db:
+                inserted = self._db.execute(
+                    "INSERT OR IGNORE INTO blobs (sha256, extension, bytes) VALUES (?, ?, ?)",
+                    (sha256, extension, len(data))
+                ).rowcount
+                record_id = self._db.execute(
+                    f"INSERT INTO images (sha256, created_at, {', '.join(METADATA_FIELDS)}) VALUES (?, ?, {', '.join('?' * len(METADATA_FIELDS))})",
+                    (sha256, metadata.get("created_at", time.time()), *(metadata.get(field) for field in METADATA_FIELDS))
+                ).lastrowid
+            if inserted:
+                self._bytes += len(data)
+        self.enforce_retention()
+        return record_id
+
+    def _record(self, row: sqlite3.Row) -> Dict:
+        record = dict(row)
+        record["path"] = str(self.blob_path(record["sha256"], record.pop("extension")))
+        record["thumbnail"] = str(self.thumbnail_path(record["sha256"]))
+        return record
+
+    def get(self, record_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT images.*, blobs.extension FROM images JOIN blobs USING (sha256) WHERE id = ?",
+                (record_id,)
+            ).fetchone()
+        return self._record(row) if row is not None else None
+
+    def query(self, prompt: Optional[str] = None, model: Optional[str] = None, page: int = 0, page_size: int = 24) -> List[Dict]:
+        """One page of records, newest first, optionally for one exact prompt and/or model"""
+        clauses, params = [], []
+        if prompt:
+            clauses.append("prompt = ?")
+            params.append(prompt)
+        if model:
+            clauses.append("model = ?")
+            params.append(model)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT images.*, blobs.extension FROM images JOIN blobs USING (sha256) {where} ORDER BY id DESC LIMIT ? OFFSET ?",
+                (*params, int(page_size), max(0, int(page)) * int(page_size))
+            ).fetchall()
+        return [self._record(row) for row in rows]
+
+    def count(self, prompt: Optional[str] = None) -> int:
+        with self._lock:
+            if prompt:
+                return self._db.execute("SELECT COUNT(*) FROM images WHERE prompt = ?", (prompt,)).fetchone()[0]
+            return self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def _delete_records(self, ids: List[int]) -> int:
+        """Remove records and any blobs left unreferenced; caller holds the lock"""
+        with self._db:
+            marks = ", ".join("?" * len(ids))
+            shas = [row[0] for row in self._db.execute(f"SELECT DISTINCT sha256 FROM images WHERE id IN ({marks})", ids)]
+            self._db.execute(f"DELETE FROM images WHERE id IN ({marks})", ids)
+            orphans = self._db.execute(
+                f"SELECT sha256, extension, bytes FROM blobs WHERE sha256 IN ({', '.join('?' * len(shas))}) "
+                "AND sha256 NOT IN (SELECT sha256 FROM images)",
+                shas
+            ).fetchall()
+            self._db.executemany("DELETE FROM blobs WHERE sha256 = ?", [(row["sha256"],) for row in orphans])
+        freed = 0
+        for row in orphans:
+            for path in (self.blob_path(row["sha256"], row["extension"]), self.thumbnail_path(row["sha256"])):
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+            freed += row["bytes"]
+        self._bytes -= freed
+        return freed
+
+    def enforce_retention(self, force: bool = False) -> int:
+        """Evict the oldest records past the age and size limits; returns records removed"""
+        removed = 0
+        with self._lock:
+            now = time.time()
+            if self.max_age_s and (force or now - self._last_age_check >= AGE_CHECK_INTERVAL_S):
+                self._last_age_check = now
+                while True:
+                    ids = [row[0] for row in self._db.execute(
+                        "SELECT id FROM images WHERE created_at < ? ORDER BY id LIMIT ?",
+                        (now - self.max_age_s, EVICT_BATCH)
+                    )]
+                    if not ids:
+                        break
+                    self._delete_records(ids)
+                    removed += len(ids)
+
+            while self.max_bytes and self._bytes > self.max_bytes:
+                # Oldest first, a few at a time until the blobs fit again
+                ids = [row[0] for row in self._db.execute("SELECT id FROM images ORDER BY id LIMIT ?", (SIZE_EVICT_BATCH,))]
+                if not ids:
+                    break
+                self._delete_records(ids)
+                removed += len(ids)
+        if removed:
+            self.logger.info(f"Retention removed {removed} image(s); store now {self._bytes / (1024 ** 2):.0f} MB")
+        return removed
+
+    def import_legacy(self, directory: Optional[Path] = None) -> int:
+        """Move loose ``generated_*.png``-style files from ``directory`` into the store"""
+        directory = Path(directory or self.root)
+        imported = 0
+        for pattern in LEGACY_PATTERNS:
+            for path in sorted(directory.glob(pattern)):
+                data = path.read_bytes()
+                kind = path.name.split("_", 1)[0] if "_" in path.name else "imported"
+                self.add(data, path.suffix.lstrip("."), metadata={"kind": kind, "created_at": path.stat().st_mtime})
+                path.unlink()
+                imported += 1
+        return imported
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            images = self._db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+            blobs = self._db.execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+            return {"images": images, "blobs": blobs, "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the indexed output store")
+    parser.add_argument("--root", default="output", help="Store directory")
+    parser.add_argument("--max-mb", type=float, default=0, help="Size limit to enforce (0 = none)")
+    parser.add_argument("--max-age-days", type=float, default=0, help="Age limit to enforce (0 = none)")
+    parser.add_argument("--import-legacy", action="store_true", help="Move loose image files in --root into the store (their metadata is unknown)")
+    parser.add_argument("--prompt", default=None, help="List the most recent images for this exact prompt")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    store = OutputStore(args.root, max_bytes=int(args.max_mb * 1024 * 1024), max_age_s=args.max_age_days * 86400)
+    if args.import_legacy:
+        print(f"Imported {store.import_legacy()} file(s)")
+    removed = store.enforce_retention(force=True)
+    if removed:
+        print(f"Removed {removed} image(s)")
+    if args.prompt:
+        for record in store.query(prompt=args.prompt):
+            print(f"{record['id']:>8}  seed {record['seed']}  {record['steps']} steps  {record['width']}x{record['height']}  {record['path']}")
+    print(store.stats())
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+from .tensor_cache import TensorCache
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share an entry"""
+    return " ".join(prompt.split())
+
+
+class PromptEmbeddingCache(TensorCache):
+    """Bounded LRU cache of text-encoder outputs, accounted in bytes
+
+    Keys are ``(text-encoder identity, normalized prompt)``; values are the
+    ``prompt_embeds`` tensors for a single prompt.
+    """
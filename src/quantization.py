@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Supported int8 modes for CPU inference
+QUANTIZATION_MODES = ("dynamic", "weight_only")
+
+# Components whose Linear layers (attention projections, MLPs) get quantized
+QUANTIZED_COMPONENTS = ("unet", "text_encoder")
+
+
+def effective_mode(mode: str) -> str:
+    """The mode that will actually be applied: ``weight_only`` needs torchao, else ``dynamic``
+
+    Resolve a mode through this before using it in a cache path or model
+    identity, so a fallback is never labelled as the mode that was asked for.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unsupported quantization mode: {mode} (expected one of {', '.join(QUANTIZATION_MODES)})")
+    if mode == "weight_only":
+        try:
+            import torchao.quantization  # noqa: F401
+        except ImportError:
+            logger.warning("torchao not installed, using dynamic int8 quantization instead of weight_only")
+            return "dynamic"
+    return mode
+
+
+def quantize_module(module: torch.nn.Module, mode: str) -> torch.nn.Module:
+    """Quantize a module's Linear layers to int8
+
+    ``dynamic`` stores int8 weights and quantizes activations on the fly
+    (torch.ao). ``weight_only`` keeps float activations and needs torchao;
+    pass the mode through ``effective_mode`` first.
+    """
+    if effective_mode(mode) != mode:
+        raise ValueError(f"Quantization mode {mode} is not available here")
+
+    if mode == "weight_only":
+        from torchao.quantization import int8_weight_only, quantize_
+        quantize_(module, int8_weight_only())
+        return module
+
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def _manifest(model_path: Path, mode: str) -> Dict:
+    """What a cached conversion depends on; any change forces a rebuild"""
+    import diffusers
+    sources = {}
+    for name in QUANTIZED_COMPONENTS:
+        for path in sorted((model_path / name).glob("*")):
+            sources[f"{name}/{path.name}"] = path.stat().st_mtime
+    return {
+        "mode": mode,
+        "torch": torch.__version__,
+        "diffusers": diffusers.__version__,
+        "sources": sources
+    }
+
+
+def quantized_dir(model_path: Path, mode: str) -> Path:
+    """Cache location for a mode, next to model_files"""
+    return Path(model_path).parent / "quantized" / mode
+
+
+def load_quantized_components(model_path: Path, mode: str) -> Dict[str, torch.nn.Module]:
+    """Return int8 UNet and text encoder, converting once and caching on disk"""
+    model_path = Path(model_path)
+    mode = effective_mode(mode)
+    cache_dir = quantized_dir(model_path, mode)
+    manifest_path = cache_dir / "manifest.json"
+    manifest = _manifest(model_path, mode)
+
+    if manifest_path.exists():
+        try:
+            with open(manifest_path) as f:
+                if json.load(f) == manifest:
+                    components = {
+                        name: torch.load(cache_dir / f"{name}.pt", map_location="cpu", weights_only=False).eval()
+                        for name in QUANTIZED_COMPONENTS
+                    }
+                    logger.info(f"Loaded {mode} int8 components from {cache_dir}")
+                    return components
+            logger.info("Quantized cache is stale, converting again")
+        except Exception as e:
+            logger.warning(f"Could not load quantized cache, converting again: {str(e)}")
+
+    from diffusers import UNet2DConditionModel
+    from transformers import CLIPTextModel
+
+    logger.info(f"Quantizing UNet and text encoder ({mode} int8)...")
+    components = {
+        "unet": UNet2DConditionModel.from_pretrained(model_path / "unet", torch_dtype=torch.float32),
+        "text_encoder": CLIPTextModel.from_pretrained(model_path / "text_encoder", torch_dtype=torch.float32)
+    }
+    for name, module in components.items():
+        components[name] = quantize_module(module.eval(), mode)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name, module in components.items():
+            tmp_path = cache_dir / f"{name}.pt.tmp"
+            torch.save(module, tmp_path)
+            os.replace(tmp_path, cache_dir / f"{name}.pt")
+        with open(manifest_path, "w") as f:
+            json.dump(manifest, f, indent=2)
+        logger.info(f"Saved quantized components to {cache_dir}")
+    except Exception as e:
+        logger.warning(f"Could not save quantized components: {str(e)}")
+
+    return components
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .scheduler import RequestAbandoned
+
+
+def make_result_key(
+    prompt: str,
+    seed: int,
+    steps: int,
+    guidance_scale: float,
+    width: int,
+    height: int,
+    model: str
+) -> str:
+    """Content address for a fully determined generation"""
+    params = {
+        "prompt": prompt,
+        "seed": int(seed),
+        "steps": int(steps),
+        "guidance_scale": round(float(guidance_scale), 4),
+        "width": int(width),
+        "height": int(height),
+        "model": model
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class _InFlight:
+    """A generation some other caller is already running"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.image: Optional[Image.Image] = None
+        self.error: Optional[str] = None
+        # The owner gave up (cancelled, deadline); a waiter takes the key over
+        self.abandoned = False
+
+
+class ResultCache:
+    """Two-tier (memory + disk) cache of generated images with singleflight
+
+    The memory tier holds up to ``max_memory_items`` images; the disk tier
+    keeps PNGs under ``cache_dir`` and evicts least recently used files once
+    it exceeds ``max_disk_bytes``. Identical keys requested concurrently are
+    generated once and shared. If the caller generating a key abandons it,
+    one of the callers waiting on it generates it instead.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "cache/results",
+        max_memory_items: int = 64,
+        max_disk_bytes: int = 1024 * 1024 * 1024
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_items = int(max_memory_items)
+        self.max_disk_bytes = int(max_disk_bytes)
+
+        self._memory: "OrderedDict[str, Image.Image]" = OrderedDict()
+        self._inflight: Dict[str, _InFlight] = {}
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="imagen-result-cache")
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def path_for(self, key: str) -> Path:
+        """Location of the on-disk copy of a result"""
+        return self.cache_dir / f"{key}.png"
+
+    def _get_memory(self, key: str) -> Optional[Image.Image]:
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+            return image
+
+    def _put_memory(self, key: str, image: Image.Image):
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _get_disk(self, key: str) -> Optional[Image.Image]:
+        path = self.path_for(key)
+        try:
+            image = Image.open(path)
+            image.load()
+            # Refresh mtime so disk eviction stays least-recently-used
+            os.utime(path)
+            return image
+        except (FileNotFoundError, OSError):
+            return None
+
+    def _put_disk(self, key: str, image: Image.Image):
+        path = self.path_for(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            image.save(tmp_path, format="PNG")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f"Error writing cached result {key}: {str(e)}")
+            return
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier fits its budget"""
+        with self._disk_lock:
+            files = []
+            total = 0
+            for path in self.cache_dir.glob("*.png"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            files.sort()
+            while total > self.max_disk_bytes and files:
+                _, size, path = files.pop(0)
+                try:
+                    path.unlink()
+                    total -= size
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key: str) -> Optional[Image.Image]:
+        """Look up a result in memory, then on disk"""
+        image = self._get_memory(key)
+        if image is None:
+            image = self._get_disk(key)
+            if image is not None:
+                self._put_memory(key, image)
+        return image
+
+    def put(self, key: str, image: Image.Image):
+        """Store a result in both tiers; the disk copy is written in the background"""
+        self._put_memory(key, image)
+        self._disk_writer.submit(self._put_disk, key, image)
+
+    def get_or_generate(
+        self,
+        keys: Sequence[str],
+        generate: Callable[[List[int]], Optional[List[Image.Image]]]
+    ) -> List[Tuple[Image.Image, bool]]:
+        """Return an image per key, generating only what nobody else has
+
+        ``generate`` receives the indices of the keys this caller owns and
+        must return one image per index. Returns ``(image, cached)`` pairs,
+        where ``cached`` is True when the image was not generated by this call.
+        """
+        results: List[Optional[Tuple[Image.Image, bool]]] = [None] * len(keys)
+        pending = list(range(len(keys)))
+
+        while pending:
+            owned: Dict[str, List[int]] = {}
+            waiting: Dict[str, Tuple[_InFlight, List[int]]] = {}
+            for i in pending:
+                key = keys[i]
+                image = self.get(key)
+                if image is not None:
+                    with self._lock:
+                        self.hits += 1
+                    results[i] = (image, True)
+                    continue
+                with self._lock:
+                    if key in owned:
+                        owned[key].append(i)
+                    elif key in waiting:
+                        waiting[key][1].append(i)
+                    elif key in self._memory:
+                        # Finished by another caller since the lookup above
+                        self.hits += 1
+                        results[i] = (self._memory[key], True)
+                    elif key in self._inflight:
+                        self.coalesced += 1
+                        waiting[key] = (self._inflight[key], [i])
+                    else:
+                        self.misses += 1
+                        self._inflight[key] = _InFlight()
+                        owned[key] = [i]
+            pending = []
+
+            if owned:
+                owned_keys = list(owned.keys())
+                try:
+                    images = generate([owned[key][0] for key in owned_keys])
+                    if not images or len(images) != len(owned_keys):
+                        raise RuntimeError("Failed to generate images")
+                except RequestAbandoned:
+                    # Our own cancellation is not the waiters' failure
+                    self._finish(owned_keys, None, None, abandoned=True)
+                    raise
+                except Exception as e:
+                    self._finish(owned_keys, None, str(e))
+                    raise
+                self._finish(owned_keys, images, None)
+                for key, image in zip(owned_keys, images):
+                    for i in owned[key]:
+                        results[i] = (image, False)
+
+            for key, (flight, indices) in waiting.items():
+                flight.done.wait()
+                if flight.abandoned:
+                    # Look the key up again: one of us becomes its new owner
+                    pending.extend(indices)
+                    continue
+                if flight.error is not None:
+                    raise RuntimeError(flight.error)
+                for i in indices:
+                    results[i] = (flight.image, True)
+
+        return results
+
+    def _finish(
+        self,
+        keys: List[str],
+        images: Optional[List[Image.Image]],
+        error: Optional[str],
+        abandoned: bool = False
+    ):
+        """Publish owned results to the cache and wake coalesced callers"""
+        for n, key in enumerate(keys):
+            if images is not None:
+                self._put_memory(key, images[n])
+            with self._lock:
+                flight = self._inflight.pop(key)
+            flight.image = images[n] if images is not None else None
+            flight.error = error
+            flight.abandoned = abandoned
+            flight.done.set()
+        # Disk writes happen in the background, off the request path
+        if images is not None:
+            for key, image in zip(keys, images):
+                self._disk_writer.submit(self._put_disk, key, image)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/coalesce counters and memory tier size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "memory_items": len(self._memory)
+            }
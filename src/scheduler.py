@@ -0,0 +1,423 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from .metrics import GENERATIONS_CANCELLED, REQUESTS_REJECTED, observe_stage
+
+
+def request_cost(steps: int, width: int, height: int, count: int) -> float:
+    """Work units of a request: one unit is a single 512x512 denoising step"""
+    return steps * width * height * count / (512 * 512)
+
+
+class QueueFullError(RuntimeError):
+    """The queue is over its cost capacity; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestAbandoned(RuntimeError):
+    """The request was cancelled or passed its deadline before it was served"""
+
+
+class _PendingRequest:
+    """A single caller's share of a micro-batch, and its handle while queued"""
+
+    def __init__(
+        self,
+        prompts: List[str],
+        seeds: List[Optional[int]],
+        cost: float,
+        deadline: Optional[float],
+        step_callback: Optional[Callable] = None
+    ):
+        self.prompts = prompts
+        self.seeds = seeds
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+        self.step_callback = step_callback
+        # generate_variations arguments, for a variation job rather than a text-to-image batch
+        self.variation: Optional[dict] = None
+        self.key: Optional[Tuple] = None
+        self.dispatched = False
+        self.cancelled = False
+        self.done = threading.Event()
+        self.images: Optional[List[Image.Image]] = None
+        self.error: Optional[str] = None
+
+    def __len__(self):
+        return len(self.prompts)
+
+    @property
+    def exclusive(self) -> bool:
+        """Runs in a batch of its own (live previews, variations)"""
+        return self.step_callback is not None or self.variation is not None
+
+    def abandoned(self, now: Optional[float] = None) -> bool:
+        """Cancelled by the caller or past its deadline"""
+        if self.cancelled:
+            return True
+        return self.deadline is not None and (now or time.monotonic()) > self.deadline
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+    def result(self) -> List[Image.Image]:
+        """Block until the images are ready; raises if the request failed"""
+        self.done.wait()
+        if self.error is not None:
+            if self.abandoned():
+                raise RequestAbandoned(self.error)
+            raise RuntimeError(self.error)
+        return self.images
+
+
+class BatchScheduler:
+    """Dynamic micro-batching in front of ImageGenerator.generate_batch
+
+    Requests that share a bucket key (model, adapter, width, height, steps,
+    guidance scale) are held for up to ``max_wait_ms`` and then run as one
+    pipeline batch of at most ``max_batch_size`` images. Among buckets that
+    are ready, those using the adapter already on the UNet go first, unless
+    another has waited more than ``adapter_affinity_ms`` longer. Each caller
+    gets back only its own images. ``num_dispatchers`` batches can be in
+    flight at once, which only helps when the generator is a WorkerPool.
+
+    Admission is bounded by ``max_queue_cost`` (see ``request_cost``;
+    0 disables the limit): ``enqueue`` raises QueueFullError rather than
+    queueing past it. A request that is cancelled or passes its deadline
+    leaves the queue, and a batch whose requests have all been abandoned is
+    aborted at the next denoising step. A request with a ``step_callback``
+    (live previews) is queued and admitted like any other but runs in a
+    batch of its own, so the callback only ever sees its own latents.
+    Variations (``enqueue_variations``) are admitted, queued and cancelled
+    the same way and also run on their own.
+    """
+
+    def __init__(
+        self,
+        generator,
+        max_batch_size: int = 4,
+        max_wait_ms: float = 30.0,
+        num_dispatchers: int = 1,
+        adapter_affinity_ms: float = 250.0,
+        max_queue_cost: float = 0.0
+    ):
+        self.logger = logging.getLogger(__name__)
+        self.generator = generator
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self.num_dispatchers = max(1, int(num_dispatchers))
+        self.adapter_affinity = max(0.0, adapter_affinity_ms) / 1000.0
+        self.max_queue_cost = max(0.0, float(max_queue_cost))
+        # (model, adapter) of the most recent batch, i.e. what's on the UNet now
+        self._last_adapter: Optional[Tuple] = None
+
+        # Per-bucket FIFO queues, kept in bucket creation order
+        self._buckets: "OrderedDict[Tuple, deque]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._running = False
+        self._workers: List[threading.Thread] = []
+        self._queued_cost = 0.0
+        self._inflight_cost = 0.0
+        # Moving average of seconds per cost unit, for wait estimates
+        self._seconds_per_cost: Optional[float] = None
+
+    def start(self):
+        """Start the dispatcher threads"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        for i in range(self.num_dispatchers):
+            worker = threading.Thread(target=self._run, name=f"imagen-batch-scheduler-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        self.logger.info(f"Batch scheduler started (max_batch_size={self.max_batch_size}, max_wait={self.max_wait * 1000:.0f}ms, dispatchers={self.num_dispatchers})")
+
+    def stop(self):
+        """Stop the dispatcher threads, failing anything still queued"""
+        with self._cond:
+            self._running = False
+            for queue in self._buckets.values():
+                for request in queue:
+                    request.error = "Scheduler stopped"
+                    request.done.set()
+            self._buckets.clear()
+            self._queued_cost = 0.0
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+        self.logger.info("Batch scheduler stopped")
+
+    def estimate_wait(self, cost_ahead: float) -> Optional[float]:
+        """Seconds until ``cost_ahead`` units of work are done, once throughput is known"""
+        if self._seconds_per_cost is None:
+            return None
+        return cost_ahead * self._seconds_per_cost / self.num_dispatchers
+
+    def estimate_latency(self, cost: float) -> Optional[float]:
+        """Seconds until a request of ``cost`` would finish if it were queued now"""
+        return self.estimate_wait(self._queued_cost + self._inflight_cost + cost)
+
+    def check_capacity(self, cost: float):
+        """Raise QueueFullError if ``cost`` more work would exceed the queue capacity"""
+        if self.max_queue_cost and self._queued_cost > 0 and self._queued_cost + cost > self.max_queue_cost:
+            REQUESTS_REJECTED.inc()
+            retry_after = self.estimate_wait(self._queued_cost + self._inflight_cost)
+            raise QueueFullError(
+                f"Queue is full ({self._queued_cost:.0f}/{self.max_queue_cost:.0f} units queued)",
+                retry_after=retry_after
+            )
+
+    def enqueue(
+        self,
+        prompts: Sequence[str],
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None,
+        deadline_s: Optional[float] = None,
+        step_callback: Optional[Callable] = None
+    ) -> _PendingRequest:
+        """Queue prompts for batched generation; returns a handle to wait on or cancel
+
+        ``step_callback`` is passed to ``generate_batch`` and called with
+        (step, latents) after every denoising step.
+        """
+        prompts = list(prompts)
+        seeds = list(seeds) if seeds is not None else [None] * len(prompts)
+        if len(seeds) != len(prompts):
+            raise ValueError(f"Got {len(seeds)} seeds for {len(prompts)} prompts")
+
+        cost = request_cost(int(steps), int(width), int(height), len(prompts))
+        deadline = time.monotonic() + deadline_s if deadline_s else None
+        request = _PendingRequest(prompts, seeds, cost, deadline, step_callback)
+        if not prompts:
+            request.images = []
+            request.done.set()
+            return request
+
+        request.key = (model, adapter, int(width), int(height), int(steps), float(guidance_scale))
+        self._admit(request)
+        return request
+
+    def enqueue_variations(
+        self,
+        prompts: Sequence[str],
+        source_seeds: Sequence[int],
+        seeds: Sequence[int],
+        strength: float,
+        variation_steps: int,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None,
+        deadline_s: Optional[float] = None
+    ) -> _PendingRequest:
+        """Queue a ``generate_variations`` call; costs ``variation_steps`` steps per image"""
+        prompts = list(prompts)
+        cost = request_cost(int(variation_steps), int(width), int(height), len(prompts))
+        deadline = time.monotonic() + deadline_s if deadline_s else None
+        request = _PendingRequest(prompts, list(seeds), cost, deadline)
+        request.variation = {
+            "source_seeds": list(source_seeds),
+            "seeds": list(seeds),
+            "strength": strength,
+            "variation_steps": int(variation_steps),
+            "steps": int(steps),
+            "guidance_scale": float(guidance_scale),
+            "width": int(width),
+            "height": int(height),
+            "model": model,
+            "adapter": adapter
+        }
+        request.key = (model, adapter, int(width), int(height), int(steps), float(guidance_scale))
+        self._admit(request)
+        return request
+
+    def _admit(self, request: _PendingRequest):
+        """Queue a request if there is capacity for it"""
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Batch scheduler is not running")
+            # A request bigger than the whole capacity is still let into an empty queue
+            self.check_capacity(request.cost)
+            self._buckets.setdefault(request.key, deque()).append(request)
+            self._queued_cost += request.cost
+            self._cond.notify_all()
+
+    def submit(self, prompts: Sequence[str], seeds: Optional[Sequence[Optional[int]]] = None, **kwargs) -> List[Image.Image]:
+        """Queue prompts for batched generation and wait for their images"""
+        return self.enqueue(prompts, seeds, **kwargs).result()
+
+    def cancel(self, request: _PendingRequest):
+        """Withdraw a request; an in-flight batch stops once all its requests are withdrawn"""
+        with self._cond:
+            if request.done.is_set():
+                return
+            request.cancelled = True
+            if not request.dispatched:
+                self._remove(request, "Cancelled")
+
+    def position(self, request: _PendingRequest) -> Tuple[int, Optional[float]]:
+        """Requests queued ahead of this one, and the estimated seconds until it finishes"""
+        with self._cond:
+            if request.dispatched or request.done.is_set():
+                return 0, self.estimate_wait(request.cost)
+            ahead = [
+                other for queue in self._buckets.values() for other in queue
+                if other.enqueued_at < request.enqueued_at
+            ]
+            cost_ahead = sum(other.cost for other in ahead) + self._inflight_cost + request.cost
+            return len(ahead), self.estimate_wait(cost_ahead)
+
+    def _remove(self, request: _PendingRequest, error: str):
+        """Take a queued request out of its bucket and fail it; caller holds the lock"""
+        queue = self._buckets.get(request.key)
+        if queue is not None and request in queue:
+            queue.remove(request)
+            if not queue:
+                del self._buckets[request.key]
+            self._queued_cost -= request.cost
+        request.error = error
+        request.done.set()
+
+    def _drop_abandoned(self):
+        """Fail queued requests that were cancelled or passed their deadline"""
+        now = time.monotonic()
+        for queue in list(self._buckets.values()):
+            for request in [r for r in queue if r.abandoned(now)]:
+                self._remove(request, "Cancelled" if request.cancelled else "Deadline exceeded")
+                GENERATIONS_CANCELLED.inc(stage="queued")
+
+    def _oldest_bucket(self) -> Optional[Tuple]:
+        """Return the bucket key whose head request has waited longest"""
+        oldest_key, oldest_time = None, None
+        for key, queue in self._buckets.items():
+            if queue and (oldest_time is None or queue[0].enqueued_at < oldest_time):
+                oldest_key, oldest_time = key, queue[0].enqueued_at
+        return oldest_key
+
+    def _is_ready(self, key: Tuple, now: float) -> bool:
+        queue = self._buckets[key]
+        queued = sum(len(request) for request in queue)
+        return queued >= self.max_batch_size or queue[0].enqueued_at + self.max_wait <= now
+
+    def _affine_bucket(self, oldest_key: Tuple, now: float) -> Tuple:
+        """A ready bucket for the current adapter, if the oldest can wait a little longer"""
+        if self._last_adapter is None or oldest_key[:2] == self._last_adapter:
+            return oldest_key
+        oldest_time = self._buckets[oldest_key][0].enqueued_at
+        for key, queue in self._buckets.items():
+            if key[:2] == self._last_adapter and queue and self._is_ready(key, now):
+                if queue[0].enqueued_at - oldest_time <= self.adapter_affinity:
+                    return key
+        return oldest_key
+
+    def _take_batch(self) -> Tuple[Optional[Tuple], List[_PendingRequest]]:
+        """Block until a bucket is full or has waited long enough, then pop it"""
+        with self._cond:
+            while self._running:
+                self._drop_abandoned()
+                key = self._oldest_bucket()
+                if key is None:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                if not self._is_ready(key, now):
+                    self._cond.wait(timeout=self._buckets[key][0].enqueued_at + self.max_wait - now)
+                    continue
+                key = self._affine_bucket(key, now)
+                self._last_adapter = key[:2]
+                queue = self._buckets[key]
+
+                # Requests are never split; an oversized or exclusive one runs on its own
+                batch = [queue.popleft()]
+                size = len(batch[0])
+                while (
+                    queue and not batch[0].exclusive and not queue[0].exclusive
+                    and size + len(queue[0]) <= self.max_batch_size
+                ):
+                    size += len(queue[0])
+                    batch.append(queue.popleft())
+                if not queue:
+                    del self._buckets[key]
+                for request in batch:
+                    request.dispatched = True
+                    self._queued_cost -= request.cost
+                    self._inflight_cost += request.cost
+                return key, batch
+        return None, []
+
+    def _run(self):
+        """Dispatcher loop"""
+        while True:
+            key, batch = self._take_batch()
+            if not batch:
+                return
+            model, adapter, width, height, steps, guidance_scale = key
+            dispatched_at = time.monotonic()
+            for request in batch:
+                observe_stage("queue_wait", dispatched_at - request.enqueued_at)
+            prompts = [prompt for request in batch for prompt in request.prompts]
+            seeds = [seed for request in batch for seed in request.seeds]
+            cost = sum(request.cost for request in batch)
+            self.logger.debug(f"Dispatching {len(batch)} request(s), {len(prompts)} image(s) for bucket {width}x{height}/{steps} steps")
+            # Only a streaming request's own batch carries its callback
+            extra = {"step_callback": batch[0].step_callback} if batch[0].step_callback is not None else {}
+
+            try:
+                if batch[0].variation is not None:
+                    images = self.generator.generate_variations(prompts=prompts, **batch[0].variation)
+                else:
+                    images = self.generator.generate_batch(
+                        prompts=prompts,
+                        seeds=seeds,
+                        steps=steps,
+                        guidance_scale=guidance_scale,
+                        width=width,
+                        height=height,
+                        model=model,
+                        adapter=adapter,
+                        # Checked after every step; stops work nobody is waiting for
+                        should_abort=lambda: all(request.abandoned() for request in batch),
+                        **extra
+                    )
+                error = None if images else "Failed to generate images"
+            except Exception as e:
+                self.logger.error(f"Error running batch: {str(e)}")
+                images, error = None, str(e)
+
+            elapsed = time.monotonic() - dispatched_at
+            with self._cond:
+                self._inflight_cost -= cost
+                if error is None and cost > 0:
+                    sample = elapsed / cost
+                    self._seconds_per_cost = sample if self._seconds_per_cost is None else 0.8 * self._seconds_per_cost + 0.2 * sample
+
+            # Hand each caller back only its own slice of the batch
+            offset = 0
+            for request in batch:
+                if error is None:
+                    request.images = images[offset:offset + len(request)]
+                elif request.abandoned():
+                    request.error = "Cancelled" if request.cancelled else "Deadline exceeded"
+                else:
+                    request.error = error
+                offset += len(request)
+                request.done.set()
@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Order in which startup milestones are reported
+MILESTONES = ["imports", "port_open", "weights_loaded", "ready", "first_image_latency"]
+
+
+def _process_start_time() -> float:
+    """Wall-clock time the interpreter started, falling back to now"""
+    try:
+        import psutil
+        return psutil.Process(os.getpid()).create_time()
+    except Exception:
+        return time.time()
+
+
+class StartupReport:
+    """Records how long each startup milestone took from process start
+
+    Milestones are logged as they happen; the full report is logged and
+    written to ``path`` as JSON when the model is ready and again once the
+    first image has been served.
+    """
+
+    def __init__(self, path: str = "logs/startup.json"):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.started_at = _process_start_time()
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def mark(self, name: str, duration: Optional[float] = None):
+        """Record a milestone (seconds since process start) once
+
+        ``duration`` stores an interval instead, e.g. first_image_latency.
+        """
+        with self._lock:
+            if name in self.marks:
+                return
+            value = duration if duration is not None else time.time() - self.started_at
+            self.marks[name] = value
+        self.logger.info(f"Startup: {name} at {value:.2f}s")
+        if name in ("ready", "first_image_latency"):
+            self.write()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        """Milestone -> seconds, None for milestones not reached yet"""
+        with self._lock:
+            return {name: self.marks.get(name) for name in MILESTONES}
+
+    def write(self):
+        """Log the report and save it as JSON"""
+        summary = self.summary()
+        lines = [f"  {name:<15}{value:>8.2f}s" if value is not None else f"  {name:<15}{'-':>9}" for name, value in summary.items()]
+        self.logger.info("Startup report:\n" + "\n".join(lines))
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w") as f:
+                json.dump(summary, f, indent=2)
+        except OSError as e:
+            self.logger.error(f"Error writing startup report: {str(e)}")
@@ -0,0 +1,74 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Hashable, Optional
+
+if TYPE_CHECKING:
+    import torch
+
+
+class TensorCache:
+    """Bounded LRU cache of tensors, accounted in bytes, with hit/miss counters
+
+    Needs nothing from torch beyond the tensors it is given, so it imports
+    without it.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Hashable, torch.Tensor]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(tensor: "torch.Tensor") -> int:
+        return tensor.element_size() * tensor.nelement()
+
+    def get(self, key: Hashable) -> Optional["torch.Tensor"]:
+        """Return the cached tensor and mark it recently used"""
+        with self._lock:
+            tensor = self._entries.get(key)
+            if tensor is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return tensor
+
+    def put(self, key: Hashable, tensor: "torch.Tensor"):
+        """Insert a tensor, evicting least recently used entries over budget"""
+        size = self._sizeof(tensor)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._sizeof(old)
+            self._entries[key] = tensor
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss/eviction counters and current size"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
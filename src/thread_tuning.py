@@ -0,0 +1,218 @@
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import torch
+
+from .attention import host_key
+
+logger = logging.getLogger(__name__)
+
+# Inter-op pool sizes tried; eager inference rarely benefits from more
+INTEROP_CHOICES = (1, 2)
+# Seconds a single trial process may take before it is abandoned
+TRIAL_TIMEOUT_S = 900.0
+
+
+def allowed_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def physical_core_cpus(cpus: Sequence[int]) -> List[int]:
+    """One logical CPU per physical core (the first SMT sibling), in order"""
+    chosen, seen = [], set()
+    for cpu in cpus:
+        try:
+            siblings = Path(f"/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list").read_text().strip()
+        except OSError:
+            return list(cpus)
+        if siblings not in seen:
+            seen.add(siblings)
+            chosen.append(cpu)
+    return chosen
+
+
+def affinity_cpus(affinity: str, intra: int) -> Optional[List[int]]:
+    """CPUs to pin to for an affinity mode, or None to leave the process unpinned"""
+    if affinity == "physical":
+        return physical_core_cpus(allowed_cpus())[:max(1, intra)]
+    return None
+
+
+def pin_process(cpus: Sequence[int]):
+    """Pin every existing thread of this process; threads created later inherit it"""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        thread_ids = [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        thread_ids = [0]
+    for tid in thread_ids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            # The thread exited in the meantime
+            pass
+
+
+def candidate_configs() -> List[Dict]:
+    """Thread counts around the physical and logical core counts, each unpinned and pinned"""
+    logical = len(allowed_cpus())
+    physical = len(physical_core_cpus(allowed_cpus()))
+    counts = sorted({logical, physical, max(1, physical // 2), max(1, logical // 4)}, reverse=True)
+    configs = []
+    for intra in counts:
+        for inter in INTEROP_CHOICES:
+            configs.append({"intra": intra, "inter": inter, "affinity": "all"})
+            if intra <= physical:
+                configs.append({"intra": intra, "inter": inter, "affinity": "physical"})
+    return configs
+
+
+def _trial(unet_config: Dict, config: Dict, sizes: Sequence[int], steps: int, results):
+    """Trial process: apply one thread configuration and time synthetic UNet steps per size"""
+    try:
+        cpus = affinity_cpus(config["affinity"], config["intra"])
+        if cpus:
+            pin_process(cpus)
+        # Both must be set before the first parallel op, hence a fresh process per trial
+        torch.set_num_interop_threads(config["inter"])
+        torch.set_num_threads(config["intra"])
+
+        from diffusers import UNet2DConditionModel
+        unet = UNet2DConditionModel.from_config(unet_config).eval()
+        timings = {}
+        with torch.inference_mode():
+            for size in sizes:
+                latents = torch.randn(1, unet.config.in_channels, size // 8, size // 8)
+                kwargs = {"encoder_hidden_states": torch.randn(1, 77, unet.config.cross_attention_dim)}
+                if unet.config.time_cond_proj_dim:
+                    # LCM's guidance embedding
+                    kwargs["timestep_cond"] = torch.randn(1, unet.config.time_cond_proj_dim)
+                timestep = torch.tensor([499])
+                unet(latents, timestep, **kwargs)
+                start = time.perf_counter()
+                for _ in range(steps):
+                    unet(latents, timestep, **kwargs)
+                timings[str(size)] = (time.perf_counter() - start) / steps
+        results.put(timings)
+    except Exception as e:
+        results.put({"error": str(e)})
+
+
+class ThreadTuner:
+    """Per-host CPU thread settings tuned on a synthetic UNet step
+
+    Each candidate (intra-op threads, inter-op threads, pinning to one CPU
+    per physical core or not) is timed in its own process, since inter-op
+    threads and affinity can't be changed once PyTorch has started work.
+    Per resolution bucket the fastest intra-op count is kept. Inter-op
+    threads and pinning are process-wide, so they are chosen once, by the
+    lowest total time across buckets. The result is saved in a JSON profile
+    under this host's key and applied on later startups without retuning.
+    """
+
+    def __init__(self, profile_path: str = "cache/thread_profile.json", steps: int = 2):
+        self.profile_path = Path(profile_path)
+        self.steps = max(1, int(steps))
+        self.host = host_key("cpu")
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.profile_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable thread profile {self.profile_path}: {str(e)}")
+            return {}
+
+    def _save(self, entry: Dict):
+        self.profile_path.parent.mkdir(parents=True, exist_ok=True)
+        profile = self._load()
+        profile[self.host] = entry
+        tmp_path = self.profile_path.with_name(f".{self.profile_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profile, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.profile_path)
+
+    def profile(self) -> Optional[Dict]:
+        """This host's saved settings, if it has been tuned"""
+        return self._load().get(self.host)
+
+    def tune(self, unet_config_path: Path, sizes: Sequence[int]) -> Optional[Dict]:
+        """Time every candidate configuration and save the best settings for this host"""
+        with open(unet_config_path, encoding="utf-8") as f:
+            unet_config = json.load(f)
+        sizes = sorted(set(int(size) for size in sizes))
+        context = mp.get_context("spawn")
+        trials = []
+        start = time.perf_counter()
+        for config in candidate_configs():
+            results = context.Queue()
+            process = context.Process(target=_trial, args=(unet_config, config, sizes, self.steps, results), daemon=True)
+            process.start()
+            try:
+                timings = results.get(timeout=TRIAL_TIMEOUT_S)
+            except Exception:
+                timings = {"error": "timed out"}
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+            if "error" in timings:
+                logger.warning(f"Thread trial {config} failed: {timings['error']}")
+                continue
+            logger.info(f"Thread trial {config}: " + ", ".join(f"{size}px {seconds:.3f}s/step" for size, seconds in timings.items()))
+            trials.append({**config, "seconds_per_step": timings})
+        if not trials:
+            logger.error("Thread tuning produced no measurements")
+            return None
+
+        # Process-wide settings: best total over buckets, each at its best intra-op count
+        def total(inter: int, affinity: str) -> float:
+            return sum(
+                min(t["seconds_per_step"][str(size)] for t in trials if (t["inter"], t["affinity"]) == (inter, affinity))
+                for size in sizes
+            )
+        inter, affinity = min({(t["inter"], t["affinity"]) for t in trials}, key=lambda pair: total(*pair))
+        buckets = {}
+        for size in sizes:
+            best = min(
+                (t for t in trials if (t["inter"], t["affinity"]) == (inter, affinity)),
+                key=lambda t: t["seconds_per_step"][str(size)]
+            )
+            buckets[str(size)] = {"intra": best["intra"], "seconds_per_step": round(best["seconds_per_step"][str(size)], 5)}
+        entry = {"inter": inter, "affinity": affinity, "buckets": buckets, "trials": trials}
+        try:
+            self._save(entry)
+        except Exception as e:
+            logger.error(f"Error saving thread profile: {str(e)}")
+        logger.info(f"Thread tuning took {time.perf_counter() - start:.0f}s: inter-op {inter}, affinity {affinity}, " + ", ".join(f"{size}px {b['intra']} threads" for size, b in buckets.items()))
+        return entry
+
+    @staticmethod
+    def apply_process(entry: Dict):
+        """Apply the process-wide settings; must run before PyTorch's first parallel op"""
+        max_intra = max(bucket["intra"] for bucket in entry["buckets"].values())
+        cpus = affinity_cpus(entry["affinity"], max_intra)
+        if cpus:
+            pin_process(cpus)
+        try:
+            torch.set_num_interop_threads(entry["inter"])
+        except RuntimeError as e:
+            logger.warning(f"Inter-op threads already fixed, keeping {torch.get_num_interop_threads()}: {str(e)}")
+        torch.set_num_threads(max_intra)
+        logger.info(f"Thread settings: inter-op {torch.get_num_interop_threads()}, intra-op up to {max_intra}, affinity {entry['affinity']}" + (f" ({len(cpus)} CPUs)" if cpus else ""))
+
+    @staticmethod
+    def intra_threads(entry: Dict, width: int, height: int) -> int:
+        """Intra-op threads for the tuned bucket nearest in pixel count"""
+        pixels = width * height
+        size = min(entry["buckets"], key=lambda s: abs(int(s) ** 2 - pixels))
+        return entry["buckets"][size]["intra"]
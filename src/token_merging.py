@@ -0,0 +1,186 @@
+import logging
+import math
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Only self-attention at the full latent resolution is merged, where it costs the most
+MAX_DOWNSAMPLE = 1
+# Destination tokens are one per STRIDE x STRIDE cell of the latent grid
+STRIDE = 2
+
+
+def parse_merge_ratios(value: str) -> List[Tuple[int, float]]:
+    """``"0.5"`` (every size) or ``"768:0.3,1024:0.5"`` (ratio from that longer side up)"""
+    ratios = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        size, ratio = entry.split(":", 1) if ":" in entry else ("0", entry)
+        ratios.append((int(size), min(0.9, max(0.0, float(ratio)))))
+    return sorted(ratios)
+
+
+def merge_ratio_for(ratios: List[Tuple[int, float]], width: int, height: int) -> float:
+    """Ratio of the largest threshold at or below the image's longer side"""
+    ratio = 0.0
+    for size, value in ratios:
+        if max(width, height) >= size:
+            ratio = value
+    return ratio
+
+
+def _do_nothing(x: torch.Tensor) -> torch.Tensor:
+    return x
+
+
+def bipartite_soft_matching(
+    metric: torch.Tensor,
+    w: int,
+    h: int,
+    r: int,
+    generator: Optional[torch.Generator] = None
+) -> Tuple[Callable, Callable]:
+    """Merge and unmerge functions that pair ``r`` tokens with their most similar destination
+
+    One random token per STRIDE x STRIDE cell is a destination; each of the
+    other (source) tokens is matched to its most cosine-similar destination,
+    and the ``r`` best-matched sources are averaged into it. ``unmerge``
+    copies each merged result back to every token that went into it.
+    """
+    batch, tokens, _ = metric.shape
+    if r <= 0:
+        return _do_nothing, _do_nothing
+
+    with torch.no_grad():
+        hsy, wsx = h // STRIDE, w // STRIDE
+        rand_idx = torch.randint(STRIDE * STRIDE, size=(hsy, wsx, 1), generator=generator).to(metric.device)
+        idx_buffer_view = torch.zeros(hsy, wsx, STRIDE * STRIDE, device=metric.device, dtype=torch.int64)
+        idx_buffer_view.scatter_(2, rand_idx, -1)
+        idx_buffer_view = idx_buffer_view.view(hsy, wsx, STRIDE, STRIDE).transpose(1, 2).reshape(hsy * STRIDE, wsx * STRIDE)
+        if hsy * STRIDE < h or wsx * STRIDE < w:
+            # Rows/columns left over by an odd grid are always sources
+            idx_buffer = torch.zeros(h, w, device=metric.device, dtype=torch.int64)
+            idx_buffer[:hsy * STRIDE, :wsx * STRIDE] = idx_buffer_view
+        else:
+            idx_buffer = idx_buffer_view
+        # Destinations (-1) sort first
+        idx_buffer = idx_buffer.reshape(1, -1, 1).argsort(dim=1)
+        num_dst = hsy * wsx
+        a_idx = idx_buffer[:, num_dst:, :]
+        b_idx = idx_buffer[:, :num_dst, :]
+
+        def split(x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+            channels = x.shape[-1]
+            src = torch.gather(x, dim=1, index=a_idx.expand(x.shape[0], tokens - num_dst, channels))
+            dst = torch.gather(x, dim=1, index=b_idx.expand(x.shape[0], num_dst, channels))
+            return src, dst
+
+        metric = metric / metric.norm(dim=-1, keepdim=True)
+        a, b = split(metric)
+        scores = a @ b.transpose(-1, -2)
+        r = min(a.shape[1], r)
+        node_max, node_idx = scores.max(dim=-1)
+        edge_idx = node_max.argsort(dim=-1, descending=True)[..., None]
+        unm_idx = edge_idx[..., r:, :]
+        src_idx = edge_idx[..., :r, :]
+        dst_idx = torch.gather(node_idx[..., None], dim=-2, index=src_idx)
+
+    def merge(x: torch.Tensor) -> torch.Tensor:
+        src, dst = split(x)
+        n, t1, c = src.shape
+        unm = torch.gather(src, dim=-2, index=unm_idx.expand(n, t1 - r, c))
+        src = torch.gather(src, dim=-2, index=src_idx.expand(n, r, c))
+        dst = dst.scatter_reduce(-2, dst_idx.expand(n, r, c), src, reduce="mean")
+        return torch.cat([unm, dst], dim=1)
+
+    def unmerge(x: torch.Tensor) -> torch.Tensor:
+        unm_len = unm_idx.shape[1]
+        unm, dst = x[..., :unm_len, :], x[..., unm_len:, :]
+        c = unm.shape[-1]
+        src = torch.gather(dst, dim=-2, index=dst_idx.expand(batch, r, c))
+        out = torch.zeros(batch, tokens, c, device=x.device, dtype=x.dtype)
+        out.scatter_(dim=-2, index=b_idx.expand(batch, num_dst, c), src=dst)
+        a_all = a_idx.expand(batch, a_idx.shape[1], 1)
+        out.scatter_(dim=-2, index=torch.gather(a_all, dim=1, index=unm_idx).expand(batch, unm_len, c), src=unm)
+        out.scatter_(dim=-2, index=torch.gather(a_all, dim=1, index=src_idx).expand(batch, r, c), src=src)
+        return out
+
+    return merge, unmerge
+
+
+class TokenMerging:
+    """Token merging (ToMe) around the UNet's full-resolution self-attention
+
+    The ``attn1`` of every transformer block is wrapped: its input tokens
+    are merged by ``bipartite_soft_matching`` down by ``ratio``, attention
+    runs on the smaller set, and the output is split back to the full token
+    count. Destination tokens come from a generator seeded the same way on
+    every call, so a seeded image stays reproducible. Installed for the
+    length of one pipeline call.
+    """
+
+    def __init__(self, unet: torch.nn.Module, width: int, height: int, ratio: float, seed: int = 0):
+        self.unet = unet
+        self.latent_w = width // 8
+        self.latent_h = height // 8
+        self.ratio = ratio
+        self.generator = torch.Generator().manual_seed(seed)
+        self.merged_calls = 0
+        self._originals = []
+
+    def _grid(self, tokens: int) -> Optional[Tuple[int, int]]:
+        """(w, h) of the token grid at this block's resolution, if it is merged"""
+        downsample = round(math.sqrt(self.latent_w * self.latent_h / tokens))
+        if downsample > MAX_DOWNSAMPLE:
+            return None
+        w, h = math.ceil(self.latent_w / downsample), math.ceil(self.latent_h / downsample)
+        return (w, h) if w * h == tokens else None
+
+    def _wrap(self, module: torch.nn.Module):
+        self._originals.append((module, module.__dict__.get("forward")))
+        original = module.forward
+
+        def forward(hidden_states, *args, encoder_hidden_states=None, **kwargs):
+            grid = None if encoder_hidden_states is not None else self._grid(hidden_states.shape[1])
+            if grid is None:
+                return original(hidden_states, *args, encoder_hidden_states=encoder_hidden_states, **kwargs)
+            merge, unmerge = bipartite_soft_matching(
+                hidden_states, grid[0], grid[1], int(hidden_states.shape[1] * self.ratio), self.generator
+            )
+            self.merged_calls += 1
+            return unmerge(original(merge(hidden_states), *args, **kwargs))
+
+        module.forward = forward
+
+    def install(self):
+        for name, module in self.unet.named_modules():
+            if name.endswith("attn1"):
+                self._wrap(module)
+
+    def remove(self):
+        for module, forward in self._originals:
+            if forward is None:
+                del module.forward
+            else:
+                module.forward = forward
+        self._originals = []
+
+
+@contextmanager
+def token_merging(unet: torch.nn.Module, width: int, height: int, ratio: float):
+    """ToMe on ``unet``'s self-attention for the duration of the block; a no-op for ``ratio`` 0"""
+    if ratio <= 0:
+        yield None
+        return
+    merging = TokenMerging(unet, width, height, ratio)
+    merging.install()
+    try:
+        yield merging
+    finally:
+        merging.remove()
+        logger.debug(f"Token merging: {merging.merged_calls} self-attention call(s) merged at ratio {ratio}")
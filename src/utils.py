@@ -1,6 +1,8 @@
 import logging
 import os
+import queue
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 
 def setup_logging():
     """Setup logging configuration for the application."""
@@ -20,6 +22,30 @@ def setup_logging():
     
     return logging.getLogger(__name__)
 
+def setup_queue_logging(log_file: str = 'debug.log', level: int = logging.INFO) -> QueueListener:
+    """Route all logging through a queue so file and console writes happen
+    on a background thread instead of the caller's (e.g. inference) thread.
+    
+    Replaces any root handlers, so each record is written exactly once.
+    Call ``stop()`` on the returned listener to flush at shutdown.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+    listener.start()
+    return listener
+
 def ensure_directory(directory: str):
     """Ensure that a directory exists, create it if it doesn't."""
     if not os.path.exists(directory):
@@ -0,0 +1,50 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rough live activation footprint of the SD VAE decoder per output pixel and
+# bytes-per-element: ~128 channels at full resolution, about 3 tensors alive
+# at once (input, output, residual) in the last up block.
+_DECODER_CHANNELS = 128
+_LIVE_TENSORS = 3
+
+# Tile edges tried (largest first) when a single image doesn't fit the budget
+_TILE_SIZES = (512, 384, 256)
+
+
+def estimate_decode_bytes(width: int, height: int, batch: int = 1, element_size: int = 4) -> int:
+    """Approximate peak activation memory of a full VAE decode"""
+    return width * height * batch * _DECODER_CHANNELS * _LIVE_TENSORS * element_size
+
+
+def configure_vae_decode(vae, width: int, height: int, batch: int, budget_bytes: int) -> str:
+    """Pick full, sliced or tiled decoding so the decode stays under budget
+
+    - ``full``: the whole batch decodes at once.
+    - ``sliced``: one image at a time (diffusers VAE slicing).
+    - ``tiled``: one image at a time in overlapping tiles that are blended
+      at the seams (diffusers VAE tiling), with the largest tile that fits.
+
+    The VAE's slicing/tiling flags are set in place, so call this while
+    holding the pipeline lock.
+    """
+    element_size = next(vae.parameters()).element_size()
+    if estimate_decode_bytes(width, height, batch, element_size) <= budget_bytes:
+        vae.disable_slicing()
+        vae.disable_tiling()
+        return "full"
+
+    vae.enable_slicing()
+    if estimate_decode_bytes(width, height, 1, element_size) <= budget_bytes:
+        vae.disable_tiling()
+        return "sliced"
+
+    tile = _TILE_SIZES[-1]
+    for size in _TILE_SIZES:
+        if estimate_decode_bytes(size, size, 1, element_size) <= budget_bytes:
+            tile = size
+            break
+    vae.enable_tiling()
+    vae.tile_sample_min_size = tile
+    vae.tile_latent_min_size = tile // (2 ** (len(vae.config.block_out_channels) - 1))
+    return "tiled"
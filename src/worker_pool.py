@@ -0,0 +1,353 @@
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from PIL import Image
+
+from .metrics import REGISTRY
+
+# Seconds between checks that every worker process is still running
+LIVENESS_CHECK_S = 1.0
+
+
+def _split_cores(num_workers: int) -> List[List[int]]:
+    """Partition the cores this process may use into contiguous per-worker sets"""
+    if hasattr(os, "sched_getaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+    else:
+        cores = list(range(os.cpu_count() or 1))
+    per_worker = max(1, len(cores) // num_workers)
+    return [cores[i * per_worker:(i + 1) * per_worker] or cores for i in range(num_workers)]
+
+
+def _worker_main(index: int, cores: List[int], requests, results, load_options: Dict):
+    """Worker process: pin to cores, load the model once, serve requests"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    os.environ["OMP_NUM_THREADS"] = str(len(cores))
+    # Thread counts and pinning come from the pool's core split, not the per-host tuner
+    os.environ["IMAGEN_THREAD_TUNING"] = "off"
+
+    from .utils import setup_queue_logging
+    setup_queue_logging('debug.log')
+
+    # Stage timings and counters go back to the parent with each reply, for its /metrics
+    from .metrics import drain_updates, record_updates
+    record_updates()
+
+    import torch
+    torch.set_num_threads(len(cores))
+    torch.set_num_interop_threads(1)
+
+    from .generator import ImageGenerator
+    generator = ImageGenerator()
+    if not generator.load_model(mmap_weights=True, **load_options):
+        results.put((index, None, False, "Failed to load model", drain_updates()))
+        return
+    results.put((index, None, True, generator.model_identity(), drain_updates()))
+
+    while True:
+        message = requests.get()
+        if message is None:
+            break
+        job_id, method, kwargs = message
+        try:
+            payload = getattr(generator, method)(**kwargs)
+            results.put((index, job_id, payload is not None, payload, drain_updates()))
+        except Exception as e:
+            results.put((index, job_id, False, str(e), drain_updates()))
+    generator.cleanup()
+
+
+class _Job:
+    """Parent-side handle for a request sent to a worker"""
+
+    def __init__(self, worker: int, load: int):
+        self.worker = worker
+        self.load = load
+        self.done = threading.Event()
+        self.ok = False
+        self.payload = None
+
+
+class WorkerPool:
+    """Pool of model-serving processes sharing memory-mapped weights
+
+    Each worker is pinned to its own slice of cores with a matching
+    intra-op thread count and runs its own ImageGenerator. Requests go to
+    the worker with the fewest images outstanding. A worker process that
+    exits fails its outstanding requests and gets no new ones. Exposes the
+    same generate/warm-up methods as ImageGenerator so callers can use either.
+    """
+
+    def __init__(self, num_workers: int, **load_options):
+        self.logger = logging.getLogger(__name__)
+        self.num_workers = max(1, int(num_workers))
+        # Extra ImageGenerator.load_model arguments, e.g. optimize=True
+        self.load_options = load_options
+        self.model = None
+
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._requests = []
+        self._processes = []
+        self._outstanding = [0] * self.num_workers
+        self._dead = set()
+        self._stopping = False
+        self._jobs: Dict[int, _Job] = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._collector: Optional[threading.Thread] = None
+        self._identity: Optional[str] = None
+        self._identities: Dict[str, str] = {}
+
+    def load_model(self) -> bool:
+        """Start the workers and wait until each has loaded the model"""
+        try:
+            for index, cores in enumerate(_split_cores(self.num_workers)):
+                requests = self._ctx.Queue()
+                process = self._ctx.Process(
+                    target=_worker_main,
+                    args=(index, cores, requests, self._results, self.load_options),
+                    name=f"imagen-worker-{index}",
+                    daemon=True
+                )
+                process.start()
+                self._requests.append(requests)
+                self._processes.append(process)
+                self.logger.info(f"Started worker {index} on cores {cores}")
+
+            ready = set()
+            while len(ready) < self.num_workers:
+                try:
+                    index, _, ok, payload, updates = self._results.get(timeout=LIVENESS_CHECK_S)
+                except queue.Empty:
+                    # A worker killed while loading (OOM, segfault) never replies
+                    dead = [i for i, process in enumerate(self._processes) if i not in ready and not process.is_alive()]
+                    if dead:
+                        self.logger.error(f"Worker {dead[0]} exited with code {self._processes[dead[0]].exitcode} while loading")
+                        self.cleanup()
+                        return False
+                    continue
+                REGISTRY.replay(updates)
+                if not ok:
+                    self.logger.error(f"Worker {index} failed: {payload}")
+                    self.cleanup()
+                    return False
+                ready.add(index)
+                self._identity = payload
+
+            self._collector = threading.Thread(target=self._collect, name="imagen-worker-results", daemon=True)
+            self._collector.start()
+            self.model = self._identity
+            self.logger.info(f"Worker pool ready with {self.num_workers} worker(s)")
+            return True
+
+        except Exception as e:
+            self.logger.error(f"Error starting worker pool: {str(e)}")
+            self.logger.error("Full traceback:", exc_info=True)
+            self.cleanup()
+            return False
+
+    def model_identity(self, name: Optional[str] = None) -> str:
+        """Identity of a model's weights (the default model if ``name`` is omitted)"""
+        if name is None:
+            return self._identity
+        if name not in self._identities:
+            # Every worker has the same registry, so any of them can answer
+            identity = self._call(self._any_worker(), 0, "model_identity", name=name)
+            if identity is None:
+                raise KeyError(f"Unknown model: {name}")
+            self._identities[name] = identity
+        return self._identities[name]
+
+    def list_models(self) -> List[str]:
+        """Names of the checkpoints the workers can serve"""
+        if self.model is None:
+            return []
+        return self._call(self._any_worker(), 0, "list_models") or []
+
+    def _live_workers(self) -> List[int]:
+        with self._lock:
+            return [i for i in range(self.num_workers) if i not in self._dead]
+
+    def _any_worker(self) -> int:
+        live = self._live_workers()
+        return live[0] if live else 0
+
+    def _check_workers(self):
+        """Fail the outstanding jobs of workers whose process has exited"""
+        if self._stopping:
+            return
+        for index, process in enumerate(self._processes):
+            if index in self._dead or process.is_alive():
+                continue
+            self.logger.error(f"Worker {index} exited with code {process.exitcode}; no longer routing to it")
+            with self._lock:
+                self._dead.add(index)
+                failed = [job_id for job_id, job in self._jobs.items() if job.worker == index]
+                jobs = [self._jobs.pop(job_id) for job_id in failed]
+                self._outstanding[index] = 0
+            for job in jobs:
+                job.payload = f"Worker {index} exited"
+                job.done.set()
+
+    def _collect(self):
+        """Route worker replies back to the waiting callers, watching for dead workers"""
+        last_check = time.monotonic()
+        while True:
+            try:
+                message = self._results.get(timeout=LIVENESS_CHECK_S)
+            except queue.Empty:
+                message = ()
+            if time.monotonic() - last_check >= LIVENESS_CHECK_S:
+                self._check_workers()
+                last_check = time.monotonic()
+            if message is None:
+                return
+            if not message:
+                continue
+            index, job_id, ok, payload, updates = message
+            REGISTRY.replay(updates)
+            with self._lock:
+                job = self._jobs.pop(job_id, None)
+                if job is None:
+                    continue
+                self._outstanding[job.worker] -= job.load
+            job.ok = ok
+            job.payload = payload
+            job.done.set()
+
+    def _call(self, worker: int, load: int, method: str, **kwargs):
+        with self._lock:
+            if worker in self._dead:
+                self.logger.error(f"Worker {worker} {method} failed: worker has exited")
+                return None
+            job_id = next(self._job_ids)
+            job = _Job(worker, load)
+            self._jobs[job_id] = job
+            self._outstanding[worker] += load
+        self._requests[worker].put((job_id, method, kwargs))
+        job.done.wait()
+        if not job.ok:
+            self.logger.error(f"Worker {worker} {method} failed: {job.payload}")
+            return None
+        return job.payload
+
+    def generate_batch(
+        self,
+        prompts: Sequence[str],
+        seeds: Optional[Sequence[Optional[int]]] = None,
+        steps: int = 4,
+        guidance_scale: float = 1.0,
+        width: int = 512,
+        height: int = 512,
+        model: Optional[str] = None,
+        adapter: Optional[str] = None,
+        should_abort=None
+    ) -> List[Image.Image]:
+        """Run a batch on the least-loaded worker
+        
+        ``should_abort`` can't cross the process boundary, so a batch sent to
+        a worker always runs to completion.
+        """
+        if self.model is None:
+            self.logger.error("Worker pool not started")
+            return None
+        with self._lock:
+            live = [i for i in range(self.num_workers) if i not in self._dead]
+            if not live:
+                self.logger.error("No worker processes left")
+                return None
+            worker = min(live, key=lambda i: self._outstanding[i])
+        return self._call(
+            worker,
+            len(prompts),
+            "generate_batch",
+            prompts=list(prompts),
+            seeds=list(seeds) if seeds is not None else None,
+            steps=steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height,
+            model=model,
+            adapter=adapter
+        )
+
+    def has_latents(self, prompts: Sequence[str], seeds: Sequence[int], **kwargs) -> bool:
+        """Whether any worker still holds the latents of these results"""
+        if self.model is None:
+            return False
+        return any(self._broadcast("has_latents", prompts=list(prompts), seeds=list(seeds), **kwargs))
+
+    def generate_variations(self, prompts: Sequence[str], source_seeds: Sequence[int], **kwargs) -> List[Image.Image]:
+        """Run variations on the worker that holds the source latents"""
+        if self.model is None:
+            self.logger.error("Worker pool not started")
+            return None
+        lookup = {key: kwargs[key] for key in ("steps", "guidance_scale", "width", "height", "model", "adapter") if key in kwargs}
+        held = self._broadcast("has_latents", prompts=list(prompts), seeds=list(source_seeds), **lookup)
+        if not any(held):
+            self.logger.error("No worker holds the source latents for these variations")
+            return None
+        worker = held.index(True)
+        return self._call(worker, len(prompts), "generate_variations", prompts=list(prompts), source_seeds=list(source_seeds), **kwargs)
+
+    def _broadcast(self, method: str, **kwargs) -> List:
+        """Call a method on every live worker in parallel; exited workers give None"""
+        results = [None] * self.num_workers
+        
+        def call(worker: int):
+            results[worker] = self._call(worker, 0, method, **kwargs)
+        
+        threads = [threading.Thread(target=call, args=(i,)) for i in self._live_workers()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def warm_prompt_cache(self, prompts: Sequence[str]) -> int:
+        """Warm every worker's prompt-embedding cache"""
+        if self.model is None:
+            return 0
+        self._broadcast("warm_prompt_cache", prompts=list(prompts))
+        return len(prompts)
+
+    def warm_up(self, sizes: Sequence[int] = (256, 512, 768), steps: Sequence[int] = (4,)) -> bool:
+        """Run the per-resolution warm-up on every worker"""
+        if self.model is None:
+            return False
+        results = self._broadcast("warm_up", sizes=list(sizes), steps=list(steps))
+        return all(results[i] for i in self._live_workers())
+
+    def cleanup(self):
+        """Stop all workers"""
+        self._stopping = True
+        for requests in self._requests:
+            requests.put(None)
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join()
+            self._collector = None
+        with self._lock:
+            for job in self._jobs.values():
+                job.payload = "Worker pool stopped"
+                job.done.set()
+            self._jobs.clear()
+            self._outstanding = [0] * self.num_workers
+            self._dead = set()
+        self._stopping = False
+        self._requests = []
+        self._processes = []
+        self.model = None
+        self.logger.info("Worker pool stopped")
@@ -0,0 +1,70 @@
+import pytest
+
+pytest.importorskip("PIL")
+
+from src.adaptive_quality import AdaptiveQuality, QualityDecision, scale_size
+
+
+def per_unit(seconds: float):
+    """Latency estimate of ``seconds`` per 512x512 step, with nothing else queued"""
+    return lambda cost: cost * seconds
+
+
+def test_zero_target_keeps_requested_quality():
+    quality = AdaptiveQuality(per_unit(10.0), target_p95_s=0)
+    decision = quality.choose(30, 512, 512, 1, allow_resize=True)
+    assert (decision.steps, decision.width, decision.height) == (30, 512, 512)
+    assert not decision.reduced
+
+
+def test_unknown_throughput_keeps_requested_quality():
+    quality = AdaptiveQuality(lambda cost: None, target_p95_s=5)
+    assert not quality.choose(30, 512, 512, 1).reduced
+
+
+def test_quiet_server_runs_full_quality():
+    quality = AdaptiveQuality(per_unit(0.1), target_p95_s=10)
+    decision = quality.choose(30, 512, 512, 1)
+    assert not decision.reduced
+    assert decision.predicted_s == pytest.approx(3.0)
+
+
+def test_steps_drop_until_the_prediction_fits():
+    quality = AdaptiveQuality(per_unit(1.0), target_p95_s=10)
+    decision = quality.choose(20, 512, 512, 1)
+    assert (decision.steps, decision.width, decision.height) == (10, 512, 512)
+    assert decision.requested_steps == 20
+    assert decision.reduced
+
+
+def test_steps_never_drop_below_the_floor():
+    quality = AdaptiveQuality(per_unit(1.0), target_p95_s=1, min_steps=4)
+    decision = quality.choose(20, 512, 512, 1)
+    assert (decision.steps, decision.width, decision.height) == (4, 512, 512)
+    # A request for fewer steps than the floor is never raised to it
+    assert quality.choose(2, 512, 512, 1).steps == 2
+
+
+def test_resolution_drops_only_when_allowed():
+    quality = AdaptiveQuality(per_unit(1.0), target_p95_s=1, min_steps=4, min_scale=0.5)
+    decision = quality.choose(20, 512, 768, 1, allow_resize=True)
+    assert decision.steps == 4
+    assert (decision.width, decision.height) == scale_size(512, 768, 0.5) == (256, 384)
+
+
+def test_p95_over_target_tightens_the_budget():
+    quality = AdaptiveQuality(per_unit(1.0), target_p95_s=10)
+    for _ in range(20):
+        quality.record(QualityDecision(10, 512, 512, 20, 512, 512), 20.0)
+    assert quality.p95() == 20.0
+    # Budget shrinks to target * target / p95 = 5s
+    assert quality.choose(20, 512, 512, 1).steps == 5
+
+
+def test_underestimates_are_calibrated_away():
+    quality = AdaptiveQuality(per_unit(1.0), target_p95_s=100)
+    decision = quality.choose(10, 512, 512, 1)
+    assert decision.predicted_s == pytest.approx(10.0)
+    quality.record(decision, 20.0)
+    assert quality.stats()["calibration"] == pytest.approx(1.2)
+    assert quality.choose(10, 512, 512, 1).predicted_s == pytest.approx(12.0)
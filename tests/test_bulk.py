@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.bulk import MANIFEST_NAME, BulkRunner, iter_items, read_completed
+
+DEFAULTS = {"steps": 4, "guidance_scale": 1.0, "width": 512, "height": 512}
+
+
+class FakeGenerator:
+    """Returns a tiny image per prompt, or None for the batches listed in ``fail``"""
+
+    def __init__(self, fail=()):
+        self.calls = []
+        self.fail = set(fail)
+
+    def generate_batch(self, prompts, seeds, steps, guidance_scale, width, height, model=None, adapter=None):
+        self.calls.append(list(prompts))
+        if len(self.calls) - 1 in self.fail:
+            return None
+        return [Image.new("RGB", (8, 8)) for _ in prompts]
+
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+def manifest_lines(output_dir):
+    with open(output_dir / MANIFEST_NAME, encoding="utf-8") as f:
+        return sorted(json.loads(raw)["line"] for raw in f if raw.strip())
+
+
+def test_bad_lines_are_skipped(tmp_path):
+    input_path = write_lines(tmp_path / "prompts.jsonl", [
+        json.dumps({"prompt": "a cat"}),
+        "not json",
+        json.dumps(["a", "list"]),
+        json.dumps("a string"),
+        json.dumps({"prompt": "a dog", "seed": None}),
+        json.dumps({"prompt": "a fox", "steps": "many"}),
+        json.dumps({"no_prompt": "here"}),
+        "",
+        json.dumps({"prompt": "a bird", "seed": 7, "width": 768})
+    ])
+    items = list(iter_items(input_path, "prompt", DEFAULTS, 100, set()))
+
+    assert [(item.line, item.prompt) for item in items] == [(0, "a cat"), (8, "a bird")]
+    # Seeds default to base seed + line number, so a resumed run repeats them
+    assert [item.seed for item in items] == [100, 7]
+    assert items[1].bucket == (None, None, 768, 512, 4, 1.0)
+
+
+def test_torn_manifest_line_is_not_counted(tmp_path):
+    manifest = tmp_path / MANIFEST_NAME
+    manifest.write_text(json.dumps({"line": 0}) + "\n" + json.dumps([1]) + "\n" + '{"line": 2, "pa', encoding="utf-8")
+
+    assert read_completed(manifest) == {0}
+
+
+def test_run_resumes_where_it_stopped(tmp_path):
+    input_path = write_lines(tmp_path / "prompts.jsonl", [json.dumps({"prompt": f"prompt {i}"}) for i in range(5)])
+    output_dir = tmp_path / "out"
+
+    first = BulkRunner(FakeGenerator(), str(output_dir), batch_size=2, shard_size=2)
+    assert first.run(str(input_path), limit=3) == {"generated": 3, "failed": 0, "skipped": 0}
+    assert manifest_lines(output_dir) == [0, 1, 2]
+
+    generator = FakeGenerator()
+    second = BulkRunner(generator, str(output_dir), batch_size=2, shard_size=2)
+    assert second.run(str(input_path)) == {"generated": 2, "failed": 0, "skipped": 3}
+    assert generator.calls == [["prompt 3", "prompt 4"]]
+    assert manifest_lines(output_dir) == [0, 1, 2, 3, 4]
+    assert (output_dir / "shard_00002" / "00000004.png").exists()
+
+
+def test_failed_batch_is_retried_on_resume(tmp_path):
+    input_path = write_lines(tmp_path / "prompts.jsonl", [json.dumps({"prompt": f"prompt {i}"}) for i in range(4)])
+    output_dir = tmp_path / "out"
+
+    first = BulkRunner(FakeGenerator(fail={0}), str(output_dir), batch_size=2)
+    assert first.run(str(input_path)) == {"generated": 2, "failed": 2, "skipped": 0}
+    assert manifest_lines(output_dir) == [2, 3]
+
+    generator = FakeGenerator()
+    second = BulkRunner(generator, str(output_dir), batch_size=2)
+    assert second.run(str(input_path)) == {"generated": 2, "failed": 0, "skipped": 2}
+    assert generator.calls == [["prompt 0", "prompt 1"]]
@@ -0,0 +1,103 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from src import metrics
+from src.metrics import Registry, drain_updates, record_updates, start_metrics_server
+
+
+def test_counter_renders_per_label_set():
+    registry = Registry()
+    counter = registry.counter("imagen_things_total", "Things")
+    counter.inc()
+    counter.inc(2, kind="b")
+    counter.inc(kind="b")
+    assert registry.render().splitlines() == [
+        "# HELP imagen_things_total Things",
+        "# TYPE imagen_things_total counter",
+        "imagen_things_total 1.0",
+        'imagen_things_total{kind="b"} 3.0'
+    ]
+
+
+def test_registering_a_name_twice_returns_the_same_metric():
+    registry = Registry()
+    assert registry.counter("c", "C") is registry.counter("c", "C")
+    assert registry.histogram("h", "H") is registry.histogram("h", "H")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("imagen_stage_seconds", "Stages", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, stage="decode")
+    lines = registry.render().splitlines()
+    assert lines[1] == "# TYPE imagen_stage_seconds histogram"
+    assert lines[2:] == [
+        'imagen_stage_seconds_bucket{stage="decode",le="0.1"} 1',
+        'imagen_stage_seconds_bucket{stage="decode",le="1.0"} 3',
+        'imagen_stage_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'imagen_stage_seconds_sum{stage="decode"} 6.05',
+        'imagen_stage_seconds_count{stage="decode"} 4'
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    registry.counter("c", "C").inc(prompt='say "hi"\\\n')
+    assert registry.render().splitlines()[-1] == 'c{prompt="say \\"hi\\"\\\\\\n"} 1.0'
+
+
+def test_gauge_callbacks_are_read_at_render_time():
+    registry = Registry()
+    sizes = {"entries": 1}
+    registry.gauge_callback("imagen_cache", "Cache", lambda: {(("counter", name),): value for name, value in sizes.items()})
+    assert 'imagen_cache{counter="entries"} 1' in registry.render()
+    sizes["entries"] = 5
+    assert 'imagen_cache{counter="entries"} 5' in registry.render()
+
+
+def test_failing_gauge_callback_is_left_out():
+    registry = Registry()
+    registry.counter("c", "C").inc()
+    registry.gauge_callback("broken", "Broken", lambda: 1 / 0)
+    assert "broken" not in registry.render()
+    assert "c 1.0" in registry.render()
+
+
+def test_recorded_updates_replay_into_another_registry(monkeypatch):
+    monkeypatch.setattr(metrics, "_recorded", None)
+    worker = Registry()
+    worker.counter("c", "C").inc(kind="x")
+    assert drain_updates() == []
+
+    record_updates()
+    worker.counter("c", "C").inc(kind="x")
+    worker.histogram("h", "H", buckets=(1.0,)).observe(0.5, stage="unet_step")
+    updates = drain_updates()
+    assert updates == [("c", 1.0, {"kind": "x"}), ("h", 0.5, {"stage": "unet_step"})]
+    assert drain_updates() == []
+
+    parent = Registry()
+    parent.counter("c", "C")
+    parent.histogram("h", "H", buckets=(1.0,))
+    parent.replay(updates + [("unknown", 1.0, {})])
+    rendered = parent.render()
+    assert 'c{kind="x"} 1.0' in rendered
+    assert 'h_count{stage="unet_step"} 1' in rendered
+
+
+def test_server_exposes_the_registry_on_metrics():
+    server = start_metrics_server(port=0, host="127.0.0.1")
+    assert server is not None
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert "# TYPE imagen_stage_seconds histogram" in response.read().decode("utf-8")
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"{base}/other", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,122 @@
+import hashlib
+
+import pytest
+
+pytest.importorskip("requests")
+
+import model_downloader
+from model_downloader import download_file
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: bytes = b""):
+        self.status_code = status_code
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise model_downloader.requests.HTTPError(f"HTTP {self.status_code}")
+
+    def iter_content(self, chunk_size: int):
+        for start in range(0, len(self.body), chunk_size):
+            yield self.body[start:start + chunk_size]
+
+
+class FakeMirror:
+    """Serves ``files`` by URL suffix, honouring Range headers unless told not to"""
+
+    def __init__(self, files, ranges: bool = True):
+        self.files = files
+        self.ranges = ranges
+        self.requests = []
+
+    def session(self):
+        return self
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append((url, headers))
+        body = self.files.get(url.rsplit("/", 1)[-1])
+        if body is None:
+            return FakeResponse(404)
+        if self.ranges and "Range" in headers:
+            offset = int(headers["Range"][len("bytes="):-1])
+            return FakeResponse(206, body[offset:])
+        return FakeResponse(200, body)
+
+
+DATA = bytes(range(256)) * 40
+
+
+def expected(data: bytes = DATA, sha256: bool = True):
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest() if sha256 else None}
+
+
+@pytest.fixture
+def mirror(monkeypatch):
+    mirror = FakeMirror({"weights.bin": DATA})
+    monkeypatch.setattr(model_downloader.requests, "Session", mirror.session)
+    monkeypatch.setattr(model_downloader, "CHUNK_SIZE", 1000)
+    monkeypatch.setattr(model_downloader.time, "sleep", lambda seconds: None)
+    return mirror
+
+
+def test_downloads_and_verifies(mirror, tmp_path):
+    digest = download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert digest == hashlib.sha256(DATA).hexdigest()
+    assert (tmp_path / "weights.bin").read_bytes() == DATA
+    assert not (tmp_path / ".weights.bin.part").exists()
+
+
+def test_resumes_a_partial_download(mirror, tmp_path):
+    (tmp_path / ".weights.bin.part").write_bytes(DATA[:3000])
+    digest = download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert digest == hashlib.sha256(DATA).hexdigest()
+    assert (tmp_path / "weights.bin").read_bytes() == DATA
+    assert mirror.requests[-1][1] == {"Range": "bytes=3000-"}
+
+
+def test_restarts_when_the_server_ignores_range(mirror, tmp_path):
+    mirror.ranges = False
+    (tmp_path / ".weights.bin.part").write_bytes(DATA[:3000])
+    download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert (tmp_path / "weights.bin").read_bytes() == DATA
+
+
+def test_complete_part_file_is_finished_without_a_request(mirror, tmp_path):
+    (tmp_path / ".weights.bin.part").write_bytes(DATA)
+    download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert (tmp_path / "weights.bin").read_bytes() == DATA
+    assert mirror.requests == []
+
+
+def test_existing_file_is_kept_when_it_matches(mirror, tmp_path):
+    (tmp_path / "weights.bin").write_bytes(DATA)
+    download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert mirror.requests == []
+
+
+def test_existing_file_with_the_wrong_hash_is_replaced(mirror, tmp_path):
+    (tmp_path / "weights.bin").write_bytes(bytes(len(DATA)))
+    download_file("http://mirror", "weights.bin", expected(), tmp_path)
+    assert (tmp_path / "weights.bin").read_bytes() == DATA
+
+
+def test_checksum_mismatch_fails_and_discards_the_download(mirror, tmp_path):
+    corrupt = dict(expected(), sha256=hashlib.sha256(b"something else").hexdigest())
+    with pytest.raises(IOError, match="SHA-256 mismatch"):
+        download_file("http://mirror", "weights.bin", corrupt, tmp_path)
+    assert not (tmp_path / "weights.bin").exists()
+    assert not (tmp_path / ".weights.bin.part").exists()
+    assert len(mirror.requests) == model_downloader.RETRIES
+
+
+def test_size_only_entries_skip_the_hash_check(mirror, tmp_path):
+    digest = download_file("http://mirror", "weights.bin", expected(sha256=False), tmp_path)
+    assert digest == hashlib.sha256(DATA).hexdigest()
@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+from src.model_files import (
+    LEGACY_REQUIRED_FILES,
+    MANIFEST_NAME,
+    build_manifest,
+    discover_adapters,
+    discover_models,
+    read_manifest,
+    sha256_file,
+    verify_model_files,
+    write_manifest
+)
+
+
+def make_model(root):
+    (root / "unet").mkdir(parents=True)
+    (root / "model_index.json").write_text("{}")
+    (root / "unet" / "weights.bin").write_bytes(b"\x01" * 100)
+    write_manifest(root, build_manifest(root))
+    return root
+
+
+def test_manifest_lists_every_file_but_itself(tmp_path):
+    model = make_model(tmp_path / "model")
+    (model / ".weights.bin.part").write_bytes(b"partial")
+    files = build_manifest(model)
+    assert sorted(files) == ["model_index.json", "unet/weights.bin"]
+    assert files["unet/weights.bin"] == {"size": 100, "sha256": sha256_file(model / "unet" / "weights.bin")}
+    assert read_manifest(model) == files
+    assert json.loads((model / MANIFEST_NAME).read_text())["version"] == 1
+
+
+def test_intact_model_verifies(tmp_path):
+    model = make_model(tmp_path / "model")
+    assert verify_model_files(model) == []
+    assert verify_model_files(model, check_hashes=True) == []
+
+
+def test_missing_and_truncated_files_are_reported(tmp_path):
+    model = make_model(tmp_path / "model")
+    (model / "model_index.json").unlink()
+    (model / "unet" / "weights.bin").write_bytes(b"\x01" * 10)
+    assert verify_model_files(model) == ["missing model_index.json", "unet/weights.bin: size 10, expected 100"]
+
+
+def test_corruption_is_found_only_when_hashing(tmp_path):
+    model = make_model(tmp_path / "model")
+    (model / "unet" / "weights.bin").write_bytes(b"\x02" * 100)
+    assert verify_model_files(model) == []
+    assert verify_model_files(model, check_hashes=True) == ["unet/weights.bin: SHA-256 mismatch"]
+
+
+def test_directory_without_a_manifest_checks_config_files(tmp_path):
+    assert read_manifest(tmp_path) is None
+    assert verify_model_files(tmp_path) == [f"missing {name}" for name in LEGACY_REQUIRED_FILES]
+
+
+def test_models_are_discovered_by_directory_name(tmp_path, monkeypatch):
+    monkeypatch.delenv("IMAGEN_MODELS", raising=False)
+    for name in ("lcm", "turbo"):
+        (tmp_path / name / "model_files").mkdir(parents=True)
+        (tmp_path / name / "model_files" / "model_index.json").write_text("{}")
+    # Not a pipeline: no model_index.json
+    (tmp_path / "partial" / "model_files").mkdir(parents=True)
+    assert discover_models(str(tmp_path)) == {
+        "lcm": tmp_path / "lcm" / "model_files",
+        "turbo": tmp_path / "turbo" / "model_files"
+    }
+
+
+def test_imagen_models_adds_and_overrides_entries(tmp_path, monkeypatch):
+    (tmp_path / "lcm" / "model_files").mkdir(parents=True)
+    (tmp_path / "lcm" / "model_files" / "model_index.json").write_text("{}")
+    monkeypatch.setenv("IMAGEN_MODELS", " lcm = /data/lcm , sdxl=/data/sdxl,ignored")
+    assert discover_models(str(tmp_path)) == {"lcm": Path("/data/lcm"), "sdxl": Path("/data/sdxl")}
+    assert discover_models(str(tmp_path / "missing")) == {"lcm": Path("/data/lcm"), "sdxl": Path("/data/sdxl")}
+
+
+def test_adapters_are_discovered_by_file_stem(tmp_path):
+    (tmp_path / "watercolor.safetensors").write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("")
+    assert discover_adapters(tmp_path) == {"watercolor": tmp_path / "watercolor.safetensors"}
+    assert discover_adapters(tmp_path / "missing") == {}
@@ -0,0 +1,104 @@
+import hashlib
+import time
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.output_store import OutputStore
+
+
+def png_bytes(value: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (16, 16), (value, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def blob_files(store: OutputStore, data: bytes):
+    sha256 = hashlib.sha256(data).hexdigest()
+    return store.blob_path(sha256, "png"), store.thumbnail_path(sha256)
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        store = OutputStore(str(tmp_path / "store"), **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_identical_images_share_one_blob(make_store):
+    store = make_store()
+    data = png_bytes(1)
+    first = store.add(data, "png", metadata={"prompt": "a cat", "seed": 1})
+    second = store.add(data, "png", metadata={"prompt": "a cat", "seed": 1})
+
+    assert first != second
+    assert store.stats() == {"images": 2, "blobs": 1, "bytes": len(data), "max_bytes": 0}
+    assert store.get(first)["path"] == store.get(second)["path"]
+    assert all(path.exists() for path in blob_files(store, data))
+
+
+def test_query_filters_by_prompt_newest_first(make_store):
+    store = make_store()
+    cat = store.add(png_bytes(1), "png", metadata={"prompt": "a cat"})
+    store.add(png_bytes(2), "png", metadata={"prompt": "a dog"})
+    newer_cat = store.add(png_bytes(3), "png", metadata={"prompt": "a cat"})
+
+    assert [record["id"] for record in store.query(prompt="a cat")] == [newer_cat, cat]
+    assert store.count(prompt="a cat") == 2
+
+
+def test_size_limit_evicts_oldest_and_deletes_their_files(make_store):
+    images = [png_bytes(value) for value in range(1, 6)]
+    store = make_store(max_bytes=sum(len(data) for data in images[-2:]))
+    ids = [store.add(data, "png") for data in images]
+
+    remaining = [record["id"] for record in store.query()]
+    assert ids[0] not in remaining
+    assert ids[-1] in remaining
+    assert store.stats()["bytes"] <= store.max_bytes
+    assert not any(path.exists() for path in blob_files(store, images[0]))
+    for record in store.query():
+        assert Path(record["path"]).exists()
+        assert Path(record["thumbnail"]).exists()
+
+
+def test_age_limit_deletes_only_orphaned_blobs(make_store):
+    store = make_store(max_age_s=3600)
+    shared, unique = png_bytes(1), png_bytes(2)
+    old = time.time() - 7200
+    # The first add runs the age check; the next ones fall inside AGE_CHECK_INTERVAL_S
+    recent_shared = store.add(shared, "png")
+    old_shared = store.add(shared, "png", metadata={"created_at": old})
+    old_unique = store.add(unique, "png", metadata={"created_at": old})
+    assert store.stats()["images"] == 3
+
+    assert store.enforce_retention(force=True) == 2
+    assert store.get(old_shared) is None
+    assert store.get(old_unique) is None
+    # The recent record still refers to the shared blob; the unique one is an orphan
+    assert store.get(recent_shared) is not None
+    assert all(path.exists() for path in blob_files(store, shared))
+    assert not any(path.exists() for path in blob_files(store, unique))
+    assert store.stats() == {"images": 1, "blobs": 1, "bytes": len(shared), "max_bytes": 0}
+
+
+def test_index_survives_reopening(make_store):
+    store = make_store()
+    record_id = store.add(png_bytes(1), "png", metadata={"prompt": "a cat", "steps": 4})
+    store.close()
+
+    reopened = make_store()
+    record = reopened.get(record_id)
+    assert record["prompt"] == "a cat"
+    assert record["steps"] == 4
+    assert reopened.stats()["bytes"] == len(png_bytes(1))
@@ -0,0 +1,62 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.prompt_cache import PromptEmbeddingCache, normalize_prompt
+
+
+def test_whitespace_variants_normalize_to_one_prompt():
+    assert normalize_prompt("  a cat\n on  a\tmat ") == "a cat on a mat"
+    assert normalize_prompt("a cat") == normalize_prompt("a   cat ")
+
+
+def test_case_and_punctuation_are_kept():
+    assert normalize_prompt("A Cat") != normalize_prompt("a cat")
+    assert normalize_prompt("a cat, 8k") != normalize_prompt("a cat 8k")
+
+
+class FakeEmbeds:
+    def element_size(self) -> int:
+        return 4
+
+    def nelement(self) -> int:
+        return 77 * 768
+
+
+def test_entries_are_per_identity():
+    cache = PromptEmbeddingCache()
+    embeds = FakeEmbeds()
+    cache.put(("model-a", normalize_prompt("a cat")), embeds)
+
+    assert cache.get(("model-a", normalize_prompt(" a  cat"))) is embeds
+    assert cache.get(("model-b", normalize_prompt("a cat"))) is None
+
+
+def _generator_state(**overrides):
+    state = {
+        "device": "cpu",
+        "model_path": Path("models/example/model_files"),
+        "registry": None,
+        "quantize": None,
+        "deep_cache_interval": 0,
+        "deep_cache_min_steps": 8,
+        "token_merge_ratios": [],
+        "token_merge_setting": ""
+    }
+    state.update(overrides)
+    return SimpleNamespace(**state)
+
+
+def test_text_encoder_identity_ignores_unet_only_options():
+    pytest.importorskip("torch")
+    pytest.importorskip("diffusers")
+    from src.generator import ImageGenerator
+
+    plain = _generator_state()
+    unet_tweaks = _generator_state(deep_cache_interval=3, token_merge_ratios=[(0, 0.5)], token_merge_setting="0.5")
+    quantized = _generator_state(quantize="dynamic")
+
+    assert ImageGenerator.text_encoder_identity(plain) == ImageGenerator.text_encoder_identity(unet_tweaks)
+    assert ImageGenerator.model_identity(plain) != ImageGenerator.model_identity(unet_tweaks)
+    assert ImageGenerator.text_encoder_identity(plain) != ImageGenerator.text_encoder_identity(quantized)
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+from src.result_cache import ResultCache, make_result_key
+from src.scheduler import RequestAbandoned
+
+
+def make_image(value: int = 0):
+    return Image.new("RGB", (8, 8), (value, value, value))
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+class BlockingGenerate:
+    """A ``generate`` callback that holds until released, then returns or raises"""
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, indices):
+        self.calls.append(list(indices))
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [make_image(i) for i in indices]
+
+
+def run_in_thread(target):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResultCache(str(tmp_path / "results"), max_memory_items=8)
+    yield cache
+    cache._disk_writer.shutdown(wait=True)
+
+
+def test_key_depends_on_every_parameter():
+    base = make_result_key("a cat", 1, 4, 1.0, 512, 512, "m")
+    assert base == make_result_key("a cat", 1, 4, 1.0, 512, 512, "m")
+    assert base != make_result_key("a cat", 2, 4, 1.0, 512, 512, "m")
+    assert base != make_result_key("a cat", 1, 4, 1.0, 512, 512, "other")
+
+
+def test_second_request_is_served_from_cache(cache):
+    generate = BlockingGenerate()
+    generate.release.set()
+    assert [cached for _, cached in cache.get_or_generate(["k"], generate)] == [False]
+    assert [cached for _, cached in cache.get_or_generate(["k"], generate)] == [True]
+    assert generate.calls == [[0]]
+
+
+def test_result_survives_on_disk(cache, tmp_path):
+    cache.put("k", make_image(7))
+    cache._disk_writer.shutdown(wait=True)
+
+    reopened = ResultCache(str(tmp_path / "results"))
+    image = reopened.get("k")
+    assert image is not None and image.getpixel((0, 0)) == (7, 7, 7)
+
+
+def test_concurrent_requests_generate_once(cache):
+    owner_generate = BlockingGenerate()
+    waiter_generate = BlockingGenerate()
+    owner, owner_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], owner_generate))
+    assert owner_generate.started.wait(5)
+    waiter, waiter_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], waiter_generate))
+    wait_for(lambda: cache.stats()["coalesced"] == 1)
+
+    owner_generate.release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert owner_outcome["result"][0][1] is False
+    assert waiter_outcome["result"][0][1] is True
+    assert waiter_generate.calls == []
+
+
+def test_owner_generation_failure_is_shared(cache):
+    owner_generate = BlockingGenerate(RuntimeError("out of memory"))
+    waiter_generate = BlockingGenerate()
+    owner, owner_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], owner_generate))
+    assert owner_generate.started.wait(5)
+    waiter, waiter_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], waiter_generate))
+    wait_for(lambda: cache.stats()["coalesced"] == 1)
+
+    owner_generate.release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert str(owner_outcome["error"]) == "out of memory"
+    assert str(waiter_outcome["error"]) == "out of memory"
+    assert waiter_generate.calls == []
+    # The failure is not cached: the next caller generates again
+    retry = BlockingGenerate()
+    retry.release.set()
+    assert cache.get_or_generate(["k"], retry)[0][1] is False
+
+
+def test_abandoned_owner_hands_the_key_to_a_waiter(cache):
+    owner_generate = BlockingGenerate(RequestAbandoned("Cancelled"))
+    waiter_generate = BlockingGenerate()
+    waiter_generate.release.set()
+    owner, owner_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], owner_generate))
+    assert owner_generate.started.wait(5)
+    waiter, waiter_outcome = run_in_thread(lambda: cache.get_or_generate(["k"], waiter_generate))
+    wait_for(lambda: cache.stats()["coalesced"] == 1)
+
+    owner_generate.release.set()
+    owner.join(5)
+    waiter.join(5)
+    assert isinstance(owner_outcome["error"], RequestAbandoned)
+    assert "error" not in waiter_outcome
+    assert waiter_generate.calls == [[0]]
+    assert waiter_outcome["result"][0][1] is False
+
+
+def test_duplicate_keys_in_one_call_generate_once(cache):
+    generate = BlockingGenerate()
+    generate.release.set()
+    results = cache.get_or_generate(["k", "other", "k"], generate)
+
+    assert generate.calls == [[0, 1]]
+    assert results[0][0] is results[2][0]
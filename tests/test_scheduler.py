@@ -0,0 +1,204 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("PIL")
+
+from src.scheduler import BatchScheduler, QueueFullError, RequestAbandoned, request_cost
+
+
+class FakeGenerator:
+    """Records each batch and returns one string "image" per prompt"""
+
+    def __init__(self, gate: threading.Event = None):
+        self.calls = []
+        self.gate = gate
+        self.started = threading.Event()
+
+    def generate_batch(self, prompts, seeds, steps, guidance_scale, width, height, model=None, adapter=None, should_abort=None, step_callback=None):
+        self.calls.append({"prompts": list(prompts), "seeds": list(seeds), "width": width, "height": height, "steps": steps})
+        self.started.set()
+        if step_callback is not None:
+            for step in range(1, steps + 1):
+                step_callback(step, f"latents {step}")
+        if self.gate is not None:
+            while not self.gate.wait(0.01):
+                if should_abort is not None and should_abort():
+                    return None
+        return [f"{prompt}/{seed}" for prompt, seed in zip(prompts, seeds)]
+
+    def generate_variations(self, prompts, source_seeds, seeds, strength, variation_steps, **kwargs):
+        self.calls.append({"prompts": list(prompts), "variation_steps": variation_steps, **kwargs})
+        return [f"{prompt}/{source}~{seed}" for prompt, source, seed in zip(prompts, source_seeds, seeds)]
+
+
+@pytest.fixture
+def make_scheduler():
+    schedulers = []
+
+    def make(generator, **kwargs):
+        scheduler = BatchScheduler(generator, **kwargs)
+        scheduler.start()
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield make
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def test_request_cost_is_in_512px_steps():
+    assert request_cost(4, 512, 512, 1) == 4
+    assert request_cost(2, 1024, 512, 3) == 12
+
+
+def test_same_bucket_requests_share_one_batch(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=200)
+    first = scheduler.enqueue(["a", "b"], seeds=[1, 2])
+    second = scheduler.enqueue(["c", "d"], seeds=[3, 4])
+
+    assert first.result() == ["a/1", "b/2"]
+    assert second.result() == ["c/3", "d/4"]
+    assert len(generator.calls) == 1
+    assert generator.calls[0]["prompts"] == ["a", "b", "c", "d"]
+
+
+def test_different_sizes_run_as_separate_batches(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=50)
+    small = scheduler.enqueue(["a"], seeds=[1], width=512, height=512)
+    large = scheduler.enqueue(["b"], seeds=[2], width=768, height=768)
+
+    assert small.result() == ["a/1"]
+    assert large.result() == ["b/2"]
+    assert sorted(call["width"] for call in generator.calls) == [512, 768]
+
+
+def test_full_batch_dispatches_without_waiting(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=2, max_wait_ms=10000)
+    request = scheduler.enqueue(["a", "b"], seeds=[1, 2])
+
+    assert request.wait(5)
+    assert request.result() == ["a/1", "b/2"]
+
+
+def test_streaming_request_runs_alone_with_its_callback(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=200)
+    steps_seen = []
+    plain = scheduler.enqueue(["a"], seeds=[1])
+    streaming = scheduler.enqueue(["b"], seeds=[2], step_callback=lambda step, latents: steps_seen.append(step))
+    other = scheduler.enqueue(["c"], seeds=[3])
+
+    assert plain.result() == ["a/1"]
+    assert streaming.result() == ["b/2"]
+    assert other.result() == ["c/3"]
+    assert ["b"] in [call["prompts"] for call in generator.calls]
+    assert steps_seen == [1, 2, 3, 4]
+
+
+def test_variations_are_queued_and_run_on_their_own(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=200)
+    plain = scheduler.enqueue(["a"], seeds=[1])
+    variations = scheduler.enqueue_variations(["a"], [1], [9], strength=0.4, variation_steps=2)
+
+    assert plain.result() == ["a/1"]
+    assert variations.result() == ["a/1~9"]
+    assert len(generator.calls) == 2
+    assert variations.cost == request_cost(2, 512, 512, 1)
+
+
+def test_variations_count_against_capacity(make_scheduler):
+    scheduler = make_scheduler(FakeGenerator(), max_batch_size=4, max_wait_ms=10000, max_queue_cost=3)
+    queued = scheduler.enqueue_variations(["a"], [1], [9], strength=0.4, variation_steps=2)
+
+    with pytest.raises(QueueFullError):
+        scheduler.enqueue_variations(["a"], [1], [10], strength=0.4, variation_steps=2)
+    scheduler.cancel(queued)
+
+
+def test_queue_over_capacity_is_rejected(make_scheduler):
+    generator = FakeGenerator()
+    # A long wait keeps the first request queued while the second arrives
+    scheduler = make_scheduler(generator, max_batch_size=8, max_wait_ms=10000, max_queue_cost=6)
+    queued = scheduler.enqueue(["a"], seeds=[1], steps=4)
+
+    with pytest.raises(QueueFullError) as excinfo:
+        scheduler.enqueue(["b"], seeds=[2], steps=4)
+    # No batch has finished yet, so there is no throughput to estimate a retry from
+    assert excinfo.value.retry_after is None
+
+    scheduler.cancel(queued)
+    with pytest.raises(RequestAbandoned):
+        queued.result()
+
+
+def test_oversized_request_is_admitted_into_an_empty_queue(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=8, max_wait_ms=10, max_queue_cost=1)
+    request = scheduler.enqueue(["a"], seeds=[1], steps=4)
+
+    assert request.result() == ["a/1"]
+
+
+def test_cancelled_queued_request_is_never_generated(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=10000)
+    request = scheduler.enqueue(["a"], seeds=[1])
+    scheduler.cancel(request)
+
+    with pytest.raises(RequestAbandoned, match="Cancelled"):
+        request.result()
+    assert generator.calls == []
+
+
+def test_request_past_its_deadline_leaves_the_queue(make_scheduler):
+    generator = FakeGenerator()
+    scheduler = make_scheduler(generator, max_batch_size=4, max_wait_ms=1000)
+    request = scheduler.enqueue(["a"], seeds=[1], deadline_s=0.05)
+
+    with pytest.raises(RequestAbandoned, match="Deadline exceeded"):
+        request.result()
+    assert generator.calls == []
+
+
+def test_cancelling_every_request_aborts_the_running_batch(make_scheduler):
+    gate = threading.Event()
+    generator = FakeGenerator(gate)
+    scheduler = make_scheduler(generator, max_batch_size=1, max_wait_ms=0)
+    request = scheduler.enqueue(["a"], seeds=[1])
+    assert generator.started.wait(5)
+
+    scheduler.cancel(request)
+    assert request.wait(5)
+    with pytest.raises(RequestAbandoned, match="Cancelled"):
+        request.result()
+    gate.set()
+
+
+def test_generation_failure_is_not_reported_as_abandoned(make_scheduler):
+    class FailingGenerator(FakeGenerator):
+        def generate_batch(self, *args, **kwargs):
+            raise RuntimeError("out of memory")
+
+    scheduler = make_scheduler(FailingGenerator(), max_batch_size=1, max_wait_ms=0)
+    request = scheduler.enqueue(["a"], seeds=[1])
+
+    with pytest.raises(RuntimeError, match="out of memory") as excinfo:
+        request.result()
+    assert not isinstance(excinfo.value, RequestAbandoned)
+
+
+def test_stop_fails_queued_requests(make_scheduler):
+    scheduler = make_scheduler(FakeGenerator(), max_batch_size=4, max_wait_ms=10000)
+    request = scheduler.enqueue(["a"], seeds=[1])
+    start = time.monotonic()
+    scheduler.stop()
+
+    with pytest.raises(RuntimeError, match="Scheduler stopped"):
+        request.result()
+    assert time.monotonic() - start < 5
@@ -0,0 +1,55 @@
+from src.prompt_cache import PromptEmbeddingCache
+from src.tensor_cache import TensorCache
+
+
+class FakeTensor:
+    """Stands in for a torch tensor: only the size is looked at"""
+
+    def __init__(self, nbytes: int):
+        self.nbytes = nbytes
+
+    def element_size(self) -> int:
+        return 1
+
+    def nelement(self) -> int:
+        return self.nbytes
+
+
+def test_least_recently_used_is_evicted_over_budget():
+    cache = TensorCache(max_bytes=100)
+    cache.put("a", FakeTensor(40))
+    cache.put("b", FakeTensor(40))
+    assert cache.get("a") is not None
+    cache.put("c", FakeTensor(40))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["bytes"] == 80
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_entry_is_not_stored():
+    cache = TensorCache(max_bytes=10)
+    cache.put("big", FakeTensor(11))
+
+    assert cache.get("big") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_replacing_a_key_keeps_the_byte_count_right():
+    cache = TensorCache(max_bytes=100)
+    cache.put("a", FakeTensor(30))
+    cache.put("a", FakeTensor(50))
+
+    assert cache.stats()["bytes"] == 50
+    assert cache.stats()["entries"] == 1
+
+
+def test_caches_keep_separate_counters():
+    prompts, latents = PromptEmbeddingCache(), TensorCache()
+    prompts.put("p", FakeTensor(1))
+    prompts.get("p")
+    latents.get("missing")
+
+    assert (prompts.stats()["hits"], prompts.stats()["misses"]) == (1, 0)
+    assert (latents.stats()["hits"], latents.stats()["misses"]) == (0, 1)